@@ -0,0 +1,223 @@
+################################################################################
+# ANALYTICS
+################################################################################
+
+import numpy as np
+
+# Timestamps are seconds since 1970-01-01 00:00 in the local time of the readings, so every day is 86400 seconds
+SECONDS_PER_HOUR = 3600
+SECONDS_PER_DAY = 86400
+
+# Profiles of a range: the length of a bucket, the number of buckets and the bucket of a timestamp. 1970-01-01 was a
+# Thursday, so 3 days are added to number the days of the week from Monday (0) like datetime.weekday().
+PROFILES = {
+    'hour_of_day': (SECONDS_PER_HOUR, 24, lambda seconds: (seconds // SECONDS_PER_HOUR) % 24),
+    'day_of_week': (SECONDS_PER_DAY, 7, lambda seconds: (seconds // SECONDS_PER_DAY + 3) % 7),
+}
+
+
+def daily_window_seconds(seconds, hours=None):
+    """
+    Function that counts the seconds up to every timestamp that fall within the hours of the day of the selection, so
+    the selected time between two timestamps is the difference of their counts.
+
+    Parameters:
+    - seconds: An array of timestamps in seconds.
+    - hours: A tuple (first_hour, last_hour) with the selected hours of the day, last_hour not included. A window that
+      wraps around midnight, like (22, 6), is allowed. None selects the whole day.
+
+    Returns:
+    - An array with the number of selected seconds up to every timestamp.
+    """
+    if hours is None:
+        return seconds
+
+    first_hour, last_hour = hours
+    if first_hour > last_hour:
+        # A window around midnight is everything except the hours in between
+        return seconds - daily_window_seconds(seconds, (last_hour, first_hour))
+
+    window_length = (last_hour - first_hour) * SECONDS_PER_HOUR
+    days, time_of_day = np.divmod(seconds, SECONDS_PER_DAY)
+    return days * window_length + np.clip(time_of_day - first_hour * SECONDS_PER_HOUR, 0, window_length)
+
+
+class BucketSeries:
+    """
+    A metric as the time-weighted integrals of its rollup buckets: per bucket the integral of the value over the time it
+    was held and the number of seconds it was held. Every statistic weighs a value by the time it was held within the
+    selection (a range, optionally limited to some hours of the day) instead of counting readings, so a burst of readings
+    does not outweigh a quiet hour. Within a bucket the held time is taken to be spread evenly, so the selection and the
+    intervals of the moving average are exact at the edges of the buckets.
+
+    The running integrals are kept per bucket, so the mean over any part of the range is two lookups and a difference,
+    for any number of parts at once.
+    """
+
+    def __init__(self, bucket_starts, value_seconds, held_seconds, minimums, maximums, bucket_length, start, end,
+                 hours=None):
+        """
+        Parameters:
+        - bucket_starts: An array with the start of every bucket in seconds.
+        - value_seconds: An array with the integral of the value over the held time of every bucket.
+        - held_seconds: An array with the number of seconds a value was held in every bucket.
+        - minimums: An array with the lowest value of every bucket.
+        - maximums: An array with the highest value of every bucket.
+        - bucket_length: The length of a bucket in seconds.
+        - start: The start of the range in seconds.
+        - end: The end of the range in seconds.
+        - hours: The selected hours of the day, see daily_window_seconds.
+        """
+        order = np.argsort(bucket_starts, kind='stable')
+        self.bucket_starts = np.asarray(bucket_starts, dtype=float)[order]
+        self.bucket_length = bucket_length
+        self.start = start
+        self.end = end
+        self.hours = hours
+        self.minimums = np.asarray(minimums, dtype=float)[order]
+        self.maximums = np.asarray(maximums, dtype=float)[order]
+
+        # Selected part of every bucket, its held time and integral, and the running integrals before every bucket
+        self.selected_before = self.selected_seconds(self.bucket_starts)
+        fractions = (self.selected_seconds(self.bucket_starts + bucket_length) - self.selected_before) / bucket_length
+        value_seconds = np.asarray(value_seconds, dtype=float)[order] * fractions
+        self.weights = np.asarray(held_seconds, dtype=float)[order] * fractions
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.values = np.where(self.weights > 0, value_seconds / self.weights, np.nan)
+        self.value_integrals = np.concatenate(([0.0], np.cumsum(value_seconds)))
+        self.weight_integrals = np.concatenate(([0.0], np.cumsum(self.weights)))
+
+    def selected_seconds(self, seconds):
+        """
+        Function that counts the selected seconds up to every timestamp, only time within the range counts.
+        """
+        return daily_window_seconds(np.clip(seconds, self.start, self.end), self.hours)
+
+    def integrals(self, points):
+        """
+        Function that calculates the integral of the values and the selected held time up to every point.
+
+        Parameters:
+        - points: An array of timestamps in seconds.
+
+        Returns:
+        - A tuple of two arrays: the integral of the values and the number of selected seconds with a value.
+        """
+        points = np.asarray(points, dtype=float)
+        if len(self.bucket_starts) == 0:
+            return np.zeros(len(points)), np.zeros(len(points))
+
+        # The bucket every point is in (or after), -1 before the first bucket
+        index = np.searchsorted(self.bucket_starts, points, side='right') - 1
+        bucket = np.maximum(index, 0)
+
+        # Part of the selected time of the bucket up to the point, the buckets before it are in the running integrals
+        bucket_ends = self.bucket_starts[bucket] + self.bucket_length
+        selected_after = self.selected_seconds(bucket_ends) - self.selected_before[bucket]
+        partial = self.selected_seconds(np.minimum(points, bucket_ends)) - self.selected_before[bucket]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            share = np.where((index >= 0) & (selected_after > 0), np.maximum(partial, 0) / selected_after, 0)
+
+        bucket_values = self.value_integrals[bucket + 1] - self.value_integrals[bucket]
+        value_integrals = np.where(index >= 0, self.value_integrals[bucket] + share * bucket_values, 0)
+        weight_integrals = np.where(index >= 0, self.weight_integrals[bucket] + share * self.weights[bucket], 0)
+        return value_integrals, weight_integrals
+
+    def interval_means(self, starts, ends):
+        """
+        Function that calculates the time-weighted mean of every interval from starts to ends.
+
+        Returns:
+        - A tuple of two arrays: the mean of every interval (NaN when no value was held in it) and the held seconds.
+        """
+        start_values, start_weights = self.integrals(starts)
+        end_values, end_weights = self.integrals(ends)
+        weights = end_weights - start_weights
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(weights > 0, (end_values - start_values) / weights, np.nan)
+        return means, weights
+
+    def held_seconds(self):
+        """
+        Function that returns the number of selected seconds with a value.
+        """
+        return float(self.weight_integrals[-1])
+
+    def mean(self):
+        """
+        Function that calculates the time-weighted mean over the selection.
+
+        Returns:
+        - The mean, or None when no value was held in the selection.
+        """
+        if self.weight_integrals[-1] <= 0:
+            return None
+        return float(self.value_integrals[-1] / self.weight_integrals[-1])
+
+    def extremes(self):
+        """
+        Function that returns the lowest and highest value of the buckets with a value in the selection, None when there
+        is none.
+        """
+        held = self.weights > 0
+        minimums = self.minimums[held & ~np.isnan(self.minimums)]
+        maximums = self.maximums[held & ~np.isnan(self.maximums)]
+        if len(minimums) == 0 or len(maximums) == 0:
+            return None, None
+        return float(minimums.min()), float(maximums.max())
+
+    def percentiles(self, percentiles):
+        """
+        Function that calculates time-weighted percentiles of the mean values of the buckets: the p-th percentile is the
+        lowest bucket mean that was held for at least p percent of the selected time or less.
+
+        Parameters:
+        - percentiles: A list of percentiles between 0 and 100.
+
+        Returns:
+        - A list with the value of every percentile, None when no value was held in the selection.
+        """
+        held = self.weights > 0
+        if not held.any():
+            return [None for percentile in percentiles]
+
+        order = np.argsort(self.values[held], kind='stable')
+        values = self.values[held][order]
+        cumulative_weights = np.cumsum(self.weights[held][order])
+        positions = np.asarray(percentiles, dtype=float) / 100 * cumulative_weights[-1]
+        indices = np.minimum(np.searchsorted(cumulative_weights, positions, side='left'), len(values) - 1)
+        return [float(value) for value in values[indices]]
+
+    def moving_average(self, points, window):
+        """
+        Function that calculates the time-weighted moving average at every point, over the window seconds before it.
+
+        Returns:
+        - An array with the moving average at every point, NaN when no value was held in the window.
+        """
+        points = np.asarray(points, dtype=float)
+        return self.interval_means(points - window, points)[0]
+
+    def profile(self, name):
+        """
+        Function that calculates the time-weighted mean per hour of the day or per day of the week over the range.
+
+        Parameters:
+        - name: "hour_of_day" or "day_of_week".
+
+        Returns:
+        - An array with the mean of every hour (0-23) or day (Monday is 0), NaN for a bucket without values.
+        """
+        bucket_length, number_of_buckets, bucket_of = PROFILES[name]
+
+        # Integrals at the boundaries of every bucket in the range
+        first = np.floor(self.start / bucket_length) * bucket_length
+        boundaries = np.append(np.arange(first, self.end, bucket_length), self.end)
+        value_integrals, weight_integrals = self.integrals(boundaries)
+
+        # Add up the buckets of the same hour or day
+        buckets = bucket_of(boundaries[:-1]).astype(int)
+        values = np.bincount(buckets, weights=np.diff(value_integrals), minlength=number_of_buckets)
+        weights = np.bincount(buckets, weights=np.diff(weight_integrals), minlength=number_of_buckets)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(weights > 0, values / weights, np.nan)
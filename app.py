@@ -1,8 +1,31 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context, g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, timedelta, timezone
-from sqlalchemy import or_, and_, func, DateTime
-import traceback, csv, io
+import click
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from sqlalchemy import func, insert, select, delete, event, DateTime
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from downsampling import DOWNSAMPLING_MODES, downsample_indices
+from analytics import BucketSeries, PROFILES
+from metrics import Registry, COUNT_BUCKETS
+from logs import setup_logging, log_event
+
+# pyarrow is optional, without it the columnar export uses the typed binary format
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+# brotli is optional, without it JSON responses are only compressed with gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+import numpy as np
+import logging, csv, io, json, os, queue, threading, time, atexit, sqlite3, hashlib, collections, zlib, struct, array, sys, bisect, math
 from json.decoder import JSONDecodeError
 
 ################################################################################
@@ -10,9 +33,32 @@ from json.decoder import JSONDecodeError
 ################################################################################
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///passenger_tracking.db'
+# Database, a relative sqlite path is stored in the instance folder
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('MOLDASH_DATABASE_URI', 'sqlite:///passenger_tracking.db')
 db = SQLAlchemy(app)
 
+# Logging: minimum level, "logfmt" or "json" records, and the maximum number of records per second of every event that
+# happens for every reading or poll (the rest is counted in "suppressed"). Records are written by a background thread.
+LOG_LEVEL = os.environ.get('MOLDASH_LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.environ.get('MOLDASH_LOG_FORMAT', 'logfmt')
+LOG_SAMPLED_PER_SECOND = int(os.environ.get('MOLDASH_LOG_SAMPLED_PER_SECOND', 10))
+logger = setup_logging('moldash', LOG_LEVEL, LOG_FORMAT, LOG_SAMPLED_PER_SECOND)
+
+# SQLite connection profile, applied to every new connection. WAL lets the dashboard read while ingest writes.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('MOLDASH_SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('MOLDASH_SQLITE_SYNCHRONOUS', 'NORMAL'),
+    # Bytes of the database file that are memory mapped
+    'mmap_size': int(os.environ.get('MOLDASH_SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    # Page cache per connection, a negative value is a size in KiB
+    'cache_size': int(os.environ.get('MOLDASH_SQLITE_CACHE_SIZE', -64000)),
+    # Milliseconds a connection waits for a lock before it fails with "database is locked"
+    'busy_timeout': int(os.environ.get('MOLDASH_SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'temp_store': os.environ.get('MOLDASH_SQLITE_TEMP_STORE', 'MEMORY'),
+}
+
+# Seat sensors of the default waiting area and their status before the first reading, used when no area configuration
+# file is given. The current status of every sensor is kept in the SeatState table.
 seat_sensor_dict = {
     'druksensor': "UIT",
     'druksensor_1': "UIT",
@@ -27,9 +73,183 @@ seat_sensor_dict = {
     'druksensor_10': "UIT",
 }
 
+# Status of a seat sensor when the seat is occupied
+SEAT_OCCUPIED_STATUS = "AAN"
+
 number_of_seats_in_waiting_area = 10
 
-CHART_TIME_FRAME = timedelta(minutes=1)
+
+def load_area_config(path):
+    """
+    Function that loads the areas (gates) of the dashboard. Every area has its own waiting room with seat sensors and
+    its own customs hall, and all readings, seat state and rollups are stored per area.
+
+    The configuration file is a JSON object with one entry per area id, for example:
+    {"gate_d4": {"name": "Gate D4", "total_seats": 40, "seat_sensors": ["d4_seat_1", "d4_seat_2"]}}
+    "seat_sensors" is a list of sensor ids (starting as "UIT") or an object with the starting status of every sensor.
+    Readings of other sensors are stored without counting as a seat, unless "reject_unknown_sensors" is true.
+
+    Parameters:
+    - path: The path of the configuration file, None uses a single area "main" with seat_sensor_dict.
+
+    Returns:
+    - A dictionary with per area id a dictionary with "name", "total_seats", "seat_sensors" and
+      "reject_unknown_sensors".
+    """
+    if not path:
+        return {'main': {'name': 'Main', 'total_seats': number_of_seats_in_waiting_area,
+                         'seat_sensors': dict(seat_sensor_dict), 'reject_unknown_sensors': False}}
+
+    with open(path) as config_file:
+        config = json.load(config_file)
+
+    areas = {}
+    for area_id, area in config.items():
+        seat_sensors = area.get('seat_sensors', {})
+        if isinstance(seat_sensors, list):
+            seat_sensors = {sensor_id: "UIT" for sensor_id in seat_sensors}
+        areas[area_id] = {
+            'name': area.get('name', area_id),
+            'total_seats': int(area.get('total_seats', len(seat_sensors))),
+            'seat_sensors': seat_sensors,
+            'reject_unknown_sensors': bool(area.get('reject_unknown_sensors', False)),
+        }
+        # The estimates divide by the number of seats, so an area without seats is a configuration error
+        if areas[area_id]['total_seats'] < 1:
+            raise ValueError(f"area {area_id} in {path} must have at least one seat")
+    if not areas:
+        raise ValueError(f"{path} does not contain any area")
+    return areas
+
+
+# Areas of the dashboard, loaded from the JSON file in MOLDASH_AREAS_FILE (see load_area_config)
+AREAS = load_area_config(os.environ.get('MOLDASH_AREAS_FILE'))
+# Area used by readings and requests that do not name an area, and for the readings stored before there were areas
+DEFAULT_AREA = os.environ.get('MOLDASH_DEFAULT_AREA', next(iter(AREAS)))
+# Area of every configured seat sensor, so a Waiting Area reading does not have to name its area
+SENSOR_AREAS = {sensor_id: area_id for area_id, area in AREAS.items() for sensor_id in area['seat_sensors']}
+if DEFAULT_AREA not in AREAS:
+    raise ValueError(f"MOLDASH_DEFAULT_AREA {DEFAULT_AREA} is not a configured area")
+
+# How long raw readings are kept before the retention pruner deletes them, in days per table. 0 (the default) keeps the
+# readings of a table forever, so nothing is deleted unless a retention period is configured
+RETENTION_DAYS = {
+    'waiting_area': int(os.environ.get('MOLDASH_RETENTION_DAYS_WAITING_AREA', 0)),
+    'customs_area': int(os.environ.get('MOLDASH_RETENTION_DAYS_CUSTOMS_AREA', 0)),
+}
+RETENTION_PERIODS = {table: timedelta(days=days) for table, days in RETENTION_DAYS.items() if days > 0}
+# Seconds between two pruning passes, 0 disables the scheduled pruner (use "flask --app app prune" instead)
+RETENTION_INTERVAL_SECONDS = int(os.environ.get('MOLDASH_RETENTION_INTERVAL_SECONDS', 3600))
+# Maximum number of rows deleted per transaction, so the write lock is only held for a short time
+RETENTION_CHUNK_SIZE = int(os.environ.get('MOLDASH_RETENTION_CHUNK_SIZE', 5000))
+# Compaction after pruning: "none", "incremental" (PRAGMA incremental_vacuum) or "full" (VACUUM)
+RETENTION_VACUUM = os.environ.get('MOLDASH_RETENTION_VACUUM', 'none').lower()
+
+# Maximum number of readings accepted in a single request on the batch routes
+MAX_BATCH_SIZE = 5000
+
+# Largest count a reading can contain, the largest integer SQLite can store
+MAX_READING_COUNT = 2 ** 63 - 1
+
+# Write-behind ingest: when enabled, "/waiting_area" and "/customs_area" put validated readings in an in-memory queue
+# and answer with 202, a background writer stores the queue in group commits
+INGEST_WRITE_BEHIND = os.environ.get('MOLDASH_INGEST_WRITE_BEHIND', 'false').lower() in ('1', 'true', 'yes')
+# Maximum number of readings waiting in the queue, when the queue is full the routes answer with 429
+INGEST_QUEUE_SIZE = int(os.environ.get('MOLDASH_INGEST_QUEUE_SIZE', 10000))
+# The writer commits at least every INGEST_FLUSH_INTERVAL_MS milliseconds, or sooner when INGEST_FLUSH_ROWS readings are waiting
+INGEST_FLUSH_INTERVAL_MS = int(os.environ.get('MOLDASH_INGEST_FLUSH_INTERVAL_MS', 200))
+INGEST_FLUSH_ROWS = int(os.environ.get('MOLDASH_INGEST_FLUSH_ROWS', 500))
+
+# Granularities of the rollup tables, from fine to coarse, with the strftime format of the start of a bucket
+ROLLUP_GRANULARITIES = {
+    'minute': '%Y-%m-%d %H:%M:00.000000',
+    'hour': '%Y-%m-%d %H:00:00.000000',
+    'day': '%Y-%m-%d 00:00:00.000000',
+}
+ROLLUP_BUCKET_SIZES = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+# Chart ranges up to ROLLUP_RAW_MAX_RANGE use the raw readings, longer ranges use the coarsest rollup that still
+# gives at least ROLLUP_MIN_POINTS points
+ROLLUP_RAW_MAX_RANGE = timedelta(hours=int(os.environ.get('MOLDASH_ROLLUP_RAW_MAX_RANGE_HOURS', 24)))
+ROLLUP_MIN_POINTS = int(os.environ.get('MOLDASH_ROLLUP_MIN_POINTS', 200))
+
+# Timezone of the dashboard, an IANA name like "Europe/Amsterdam", by default the timezone of the server. Readings are
+# stored as naive times in this timezone, and "today" and the live windows follow it (see local_now)
+DASHBOARD_TIMEZONE = ZoneInfo(os.environ['MOLDASH_TIMEZONE']) if os.environ.get('MOLDASH_TIMEZONE') else None
+
+
+def local_now():
+    """
+    Function that returns the current time as a naive datetime in DASHBOARD_TIMEZONE, like the stored timestamps.
+    """
+    return datetime.now(DASHBOARD_TIMEZONE).replace(tzinfo=None)
+
+
+def get_today_start():
+    """
+    Function that returns midnight of today in DASHBOARD_TIMEZONE, like the stored timestamps.
+    """
+    return local_now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+# Time frames of the live charts on "/waiting_area_data" and "/customs_area_data"
+WAITING_AREA_LIVE_WINDOW = timedelta(minutes=5)
+CUSTOMS_AREA_LIVE_WINDOW = timedelta(hours=24)
+
+# Live window buffers: the latest readings of every area are kept in fixed size in-memory ring buffers, so the live charts
+# are served without a query of the window. Readings stored by other processes are caught up on every read by comparing
+# the highest id of the table (see sync_live_buffers). The sizes are the maximum number of readings per area.
+LIVE_BUFFER_ENABLED = os.environ.get('MOLDASH_LIVE_BUFFER', 'true').lower() in ('1', 'true', 'yes')
+WAITING_AREA_LIVE_BUFFER_ROWS = int(os.environ.get('MOLDASH_WAITING_AREA_LIVE_BUFFER_ROWS', 10000))
+CUSTOMS_AREA_LIVE_BUFFER_ROWS = int(os.environ.get('MOLDASH_CUSTOMS_AREA_LIVE_BUFFER_ROWS', 100000))
+
+# Streaming wait time and turnaround time estimator of the Customs Area: the current estimate follows roughly the last
+# CUSTOMS_ESTIMATE_WINDOW, and a gap between two readings longer than CUSTOMS_ESTIMATE_MAX_GAP means the counters were
+# down, so the gap is left out. Run "flask --app app rebuild-rollups" after changing the maximum gap.
+CUSTOMS_ESTIMATE_WINDOW = timedelta(minutes=int(os.environ.get('MOLDASH_CUSTOMS_ESTIMATE_WINDOW_MINUTES', 15)))
+CUSTOMS_ESTIMATE_MAX_GAP = timedelta(minutes=int(os.environ.get('MOLDASH_CUSTOMS_ESTIMATE_MAX_GAP_MINUTES', 15)))
+
+# Live stream on "/stream": number of events buffered per client before a slow client is disconnected, maximum number
+# of connected clients and seconds between keep-alive messages
+STREAM_CLIENT_BUFFER = int(os.environ.get('MOLDASH_STREAM_CLIENT_BUFFER', 256))
+STREAM_MAX_CLIENTS = int(os.environ.get('MOLDASH_STREAM_MAX_CLIENTS', 200))
+STREAM_KEEPALIVE_SECONDS = int(os.environ.get('MOLDASH_STREAM_KEEPALIVE_SECONDS', 15))
+
+# Response cache of "/get_date_range" and "/get_statistics": maximum number of cached responses and seconds a response
+# is kept for a range that includes today (RESPONSE_CACHE_LIVE_TTL) or lies entirely in the past (RESPONSE_CACHE_PAST_TTL)
+RESPONSE_CACHE_SIZE = int(os.environ.get('MOLDASH_RESPONSE_CACHE_SIZE', 512))
+RESPONSE_CACHE_LIVE_TTL = int(os.environ.get('MOLDASH_RESPONSE_CACHE_LIVE_TTL', 30))
+RESPONSE_CACHE_PAST_TTL = int(os.environ.get('MOLDASH_RESPONSE_CACHE_PAST_TTL', 24 * 3600))
+
+# Compression of JSON responses: a response of at least RESPONSE_COMPRESSION_MIN_BYTES is compressed with brotli (when it
+# is installed) or gzip, as accepted by the client. Disable it when a proxy in front of the dashboard already compresses.
+RESPONSE_COMPRESSION_ENABLED = os.environ.get('MOLDASH_RESPONSE_COMPRESSION', 'true').lower() in ('1', 'true', 'yes')
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.environ.get('MOLDASH_RESPONSE_COMPRESSION_MIN_BYTES', 1024))
+RESPONSE_GZIP_LEVEL = int(os.environ.get('MOLDASH_RESPONSE_GZIP_LEVEL', 5))
+RESPONSE_BROTLI_QUALITY = int(os.environ.get('MOLDASH_RESPONSE_BROTLI_QUALITY', 5))
+
+# Seconds a browser may keep the chart styles of "/chart_styles" before asking again
+CHART_STYLES_MAX_AGE = 24 * 3600
+
+# Points per chart of the snapshot of today that is embedded in the dashboard page, CHART_MAX_POINTS in javascript.js
+DASHBOARD_MAX_POINTS = 500
+
+# Analytics on "/analytics": a reading is held until the next reading, a gap longer than ANALYTICS_MAX_HOLD means the
+# sensor or gateway was down and counts as no data. The default percentiles, and the default window and number of points
+# of the moving average.
+ANALYTICS_MAX_HOLD = timedelta(minutes=int(os.environ.get('MOLDASH_ANALYTICS_MAX_HOLD_MINUTES', 60)))
+ANALYTICS_PERCENTILES = (50, 90, 95, 99)
+ANALYTICS_WINDOW_MINUTES = 60
+ANALYTICS_MAX_POINTS = 200
+
+# Number of readings written per transaction by the bulk import ("flask --app app import-readings")
+IMPORT_CHUNK_ROWS = int(os.environ.get('MOLDASH_IMPORT_CHUNK_ROWS', 100000))
+
+# Number of rows read from the database per chunk of a data export
+EXPORT_CHUNK_ROWS = int(os.environ.get('MOLDASH_EXPORT_CHUNK_ROWS', 10000))
 
 
 ################################################################################
@@ -37,703 +257,4054 @@ CHART_TIME_FRAME = timedelta(minutes=1)
 ################################################################################
 
 class WaitingArea(db.Model):
+    # Every read filters on the area and a time range
+    __table_args__ = (db.Index('ix_waiting_area_area_id_timestamp', 'area_id', 'timestamp'),)
+
     id = db.Column(db.Integer, primary_key=True)
+    area_id = db.Column(db.String(50), nullable=False, server_default=DEFAULT_AREA)
     total_seats = db.Column(db.Integer)
     taken_seats = db.Column(db.Integer)
     free_seats = db.Column(db.Integer)
     total_people = db.Column(db.Integer)
-    sensor_id = db.Column(db.String(50), nullable=False)
+    sensor_id = db.Column(db.String(50), nullable=False, index=True)
     status = db.Column(db.String(10), nullable=False)
-    timestamp = db.Column(DateTime, default=datetime.utcnow)
+    timestamp = db.Column(DateTime, default=datetime.utcnow, index=True)
 
 
 class CustomsArea(db.Model):
+    # Every read filters on the area and a time range
+    __table_args__ = (db.Index('ix_customs_area_area_id_timestamp', 'area_id', 'timestamp'),)
+
     id = db.Column(db.Integer, primary_key=True)
+    area_id = db.Column(db.String(50), nullable=False, server_default=DEFAULT_AREA)
     entrance_point = db.Column(db.Integer)
     before_passport_point = db.Column(db.Integer)
     after_passport_point = db.Column(db.Integer)
     exit_point = db.Column(db.Integer)
     current_people_count = db.Column(db.Integer)
-    timestamp = db.Column(DateTime, default=datetime.utcnow)
+    timestamp = db.Column(DateTime, default=datetime.utcnow, index=True)
 
 
-with app.app_context():
-    db.create_all()
-
+class WaitingAreaRollup(db.Model):
+    """
+    Count, sum, minimum and maximum of the WaitingArea readings per area and minute, hour and day, plus the sum of the
+    integrals of the analytics metric (see ANALYTICS_INTEGRALS).
+    """
+    __table_args__ = (db.UniqueConstraint('area_id', 'granularity', 'bucket_start'),)
+    metrics = ('taken_seats', 'free_seats', 'total_seats', 'total_people')
+    integrals = ()
 
-################################################################################
-# FUNCTIONS CALCULATIONS
-################################################################################
+    id = db.Column(db.Integer, primary_key=True)
+    area_id = db.Column(db.String(50), nullable=False)
+    granularity = db.Column(db.String(10), nullable=False)
+    bucket_start = db.Column(DateTime, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    taken_seats_sum = db.Column(db.Integer)
+    taken_seats_min = db.Column(db.Integer)
+    taken_seats_max = db.Column(db.Integer)
+    free_seats_sum = db.Column(db.Integer)
+    free_seats_min = db.Column(db.Integer)
+    free_seats_max = db.Column(db.Integer)
+    total_seats_sum = db.Column(db.Integer)
+    total_seats_min = db.Column(db.Integer)
+    total_seats_max = db.Column(db.Integer)
+    total_people_sum = db.Column(db.Integer)
+    total_people_min = db.Column(db.Integer)
+    total_people_max = db.Column(db.Integer)
+    analytics_value_seconds_sum = db.Column(db.Float)
+    analytics_held_seconds_sum = db.Column(db.Float)
+
+
+class CustomsAreaRollup(db.Model):
+    """
+    Count, sum, minimum and maximum of the CustomsArea readings per area and minute, hour and day, plus the sum of the
+    integrals of the number of people over time (see CUSTOMS_INTEGRALS), of the departures (see count_departures) and
+    of the analytics metric (see ANALYTICS_INTEGRALS).
+    """
+    __table_args__ = (db.UniqueConstraint('area_id', 'granularity', 'bucket_start'),)
+    metrics = ('entrance_point', 'before_passport_point', 'after_passport_point', 'exit_point', 'current_people_count')
+    integrals = ('people_seconds', 'waiting_seconds', 'departures')
 
-def calculate_free_seats(taken_seats, total_seats=number_of_seats_in_waiting_area):
+    id = db.Column(db.Integer, primary_key=True)
+    area_id = db.Column(db.String(50), nullable=False)
+    granularity = db.Column(db.String(10), nullable=False)
+    bucket_start = db.Column(DateTime, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    entrance_point_sum = db.Column(db.Integer)
+    entrance_point_min = db.Column(db.Integer)
+    entrance_point_max = db.Column(db.Integer)
+    before_passport_point_sum = db.Column(db.Integer)
+    before_passport_point_min = db.Column(db.Integer)
+    before_passport_point_max = db.Column(db.Integer)
+    after_passport_point_sum = db.Column(db.Integer)
+    after_passport_point_min = db.Column(db.Integer)
+    after_passport_point_max = db.Column(db.Integer)
+    exit_point_sum = db.Column(db.Integer)
+    exit_point_min = db.Column(db.Integer)
+    exit_point_max = db.Column(db.Integer)
+    current_people_count_sum = db.Column(db.Integer)
+    current_people_count_min = db.Column(db.Integer)
+    current_people_count_max = db.Column(db.Integer)
+    people_seconds_sum = db.Column(db.Float)
+    waiting_seconds_sum = db.Column(db.Float)
+    departures_sum = db.Column(db.Float)
+    analytics_value_seconds_sum = db.Column(db.Float)
+    analytics_held_seconds_sum = db.Column(db.Float)
+
+
+class SeatState(db.Model):
     """
-    Function that calculates the number of unoccupied seats.
+    Current status of every seat sensor per area and the time of the reading that last changed it.
+    """
+    area_id = db.Column(db.String(50), primary_key=True)
+    sensor_id = db.Column(db.String(50), primary_key=True)
+    occupied = db.Column(db.Boolean, nullable=False)
+    changed_at = db.Column(DateTime, nullable=False)
 
-    Parameters:
-    - taken_seats: The number of seats that are currently occupied.
-    - total_seats: The total number of seats available in the waiting area (default value obtained from a predefined constant).
 
-    Returns:
-    - calculate_free_seats: The number of unoccupied seats.
+class SeatCounter(db.Model):
     """
-    calculate_free_seats = total_seats - taken_seats
-    return calculate_free_seats
+    Running number of occupied seats per area, changed only when a seat sensor flips.
+    """
+    area_id = db.Column(db.String(50), primary_key=True)
+    taken_seats = db.Column(db.Integer, nullable=False)
 
 
-def calculate_total_people_in_waiting_area(taken_seats, total_seats=number_of_seats_in_waiting_area, multiplier=1.3):
+class CustomsEstimate(db.Model):
     """
-    Function to calculate the total number of people in the space, assuming not every person in the space is seated (standing, leaning, walking, sitting on the floor).
+    State of the streaming wait time and turnaround time estimator per area: the last reading, and the exponentially
+    decayed integrals of the number of people over time and of the number of people that left.
+    """
+    area_id = db.Column(db.String(50), primary_key=True)
+    last_timestamp = db.Column(DateTime)
+    last_people = db.Column(db.Integer, nullable=False)
+    last_waiting = db.Column(db.Integer, nullable=False)
+    last_exit = db.Column(db.Integer)
+    people_seconds = db.Column(db.Float, nullable=False)
+    waiting_seconds = db.Column(db.Float, nullable=False)
+    departures = db.Column(db.Float, nullable=False)
 
-    Parameters:
-    - taken_seats: The number of seats that are currently occupied.
-    - total_seats: The total number of seats available in the waiting area (default value obtained from a predefined constant).
-    - multiplier: A factor to estimate the total number of people based on the number of taken seats (default value is 1.3, which is an empirical multiplier).
 
-    Returns:
-    - estimated_people_with_multiplier: The estimated total number of people in the waiting area, considering the multiplier.
+class DataVersion(db.Model):
     """
-    percentage_taken = (taken_seats / total_seats) * 100
-    estimated_people = int((percentage_taken / 100) * total_seats)
-    estimated_people_with_multiplier = int(estimated_people * multiplier)
-    return estimated_people_with_multiplier
+    Version of the past data of every area, raised by every write that changes a day before today (backfills, imports,
+    rollup rebuilds and pruning). It is part of the cache key of past ranges, so every process sees the change.
+    """
+    area_id = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+
 
+# The rollup table of every raw table
+ROLLUP_MODELS = {
+    WaitingArea: WaitingAreaRollup,
+    CustomsArea: CustomsAreaRollup,
+}
+
+# The metric of every table that is analysed on "/analytics", as an SQL expression on the raw table and on the minimum
+# and maximum columns of the rollup table: the occupancy of the Waiting Area in percent and the number of people in the
+# Customs Area. A Waiting Area reading without seats has no occupancy and is left out.
+ANALYTICS_METRICS = {
+    WaitingArea: ('occupancy_percent', 'taken_seats * 100.0 / NULLIF(total_seats, 0)',
+                  'taken_seats_min * 100.0 / NULLIF(total_seats_max, 0)',
+                  'taken_seats_max * 100.0 / NULLIF(total_seats_min, 0)'),
+    CustomsArea: ('people', 'current_people_count', 'current_people_count_min', 'current_people_count_max'),
+}
+
+# Integrals of the analytics metric in the rollups of both tables: the metric of a reading is held until the next
+# reading of its area, nothing for a gap longer than ANALYTICS_MAX_HOLD, and the metric times the seconds it was held
+# ("analytics_value_seconds") and those seconds ("analytics_held_seconds") are added to the bucket of the reading whose
+# metric was held.
+ANALYTICS_INTEGRALS = ('analytics_value_seconds', 'analytics_held_seconds')
 
-def calculate_average_occupancy(data_points):
+
+@event.listens_for(Engine, 'connect')
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
     """
-    Calculate the average occupancy over multiple data points.
+    Function that applies the SQLITE_PRAGMAS connection profile to every new SQLite connection.
     """
-    # Check if data_points is None, empty, or an empty string
-    if data_points is None or data_points == "":
-        return ""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
 
-    # Sum up taken seats and total seats from data points
-    total_taken_seats = sum(entry.taken_seats for entry in data_points)
-    total_total_seats = sum(entry.total_seats for entry in data_points)
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma} = {value}")
+    cursor.close()
 
-    # Check if the total total seats is zero to avoid division by zero
-    if total_total_seats == 0:
-        return 0
 
-    # Calculate the average occupancy
-    average_occupancy = (total_taken_seats / total_total_seats) * 100
-    return round(average_occupancy, 1)
+# Tables that are calculated from the readings. When their columns changed they are dropped and created again, and
+# filled from the readings on startup.
+DERIVED_TABLES = ('waiting_area_rollup', 'customs_area_rollup', 'seat_state', 'seat_counter', 'customs_estimate')
 
 
-def calculate_peak_occupancy(data_points):
+def migrate_database():
     """
-    Function to calculate the peak occupancy over multiple data points.
+    Function that brings an existing database up to date with the models. db.create_all() only creates missing tables,
+    so columns and indexes that were added to the models later are created here for tables that already exist. Columns
+    are added with their server default, which puts the readings stored before there were areas in DEFAULT_AREA.
     """
-    # Check if data_points is None, empty, or an empty list
-    if data_points is None or data_points == "" or data_points == []:
-        return ""
+    inspector = db.inspect(db.engine)
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            missing_columns = [column for column in table.columns if column.name not in existing_columns]
 
-    # Calculate occupancies from data points
-    occupancies = [(entry.taken_seats / entry.total_seats) *
-                   100 for entry in data_points if entry.total_seats != 0]
+            if missing_columns and table.name in DERIVED_TABLES:
+                table.drop(bind=connection)
+                table.create(bind=connection)
+                continue
 
-    # Check if occupancies list is empty
-    if not occupancies:
-        return ""
+            for column in missing_columns:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                default = f" NOT NULL DEFAULT '{column.server_default.arg}'" if column.server_default is not None else ""
+                connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{default}")
 
-    # Find the maximum occupancy
-    max_occupancy = max(occupancies)
-    return round(max_occupancy, 1)
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
 
 
-def get_average_occupancy_custom(data_points):
+################################################################################
+# FUNCTIONS METRICS
+################################################################################
+
+# Metrics of this process, exposed on "/metrics" in the Prometheus text exposition format
+metrics_registry = Registry('moldash')
+
+http_requests = metrics_registry.counter(
+    'http_requests', 'Number of handled requests per route, method and status code.', ('route', 'method', 'status'))
+http_request_duration = metrics_registry.histogram(
+    'http_request_duration_seconds', 'Time until the response is returned per route and method, a streamed body is '
+    'not included.', ('route', 'method'))
+request_db_queries = metrics_registry.histogram(
+    'request_db_queries', 'Number of database queries per request per route.', ('route',), buckets=COUNT_BUCKETS)
+request_db_duration = metrics_registry.histogram(
+    'request_db_duration_seconds', 'Time spent in database queries per request per route.', ('route',))
+db_queries = metrics_registry.counter(
+    'db_queries', 'Number of database queries, including the background threads.')
+db_query_seconds = metrics_registry.counter(
+    'db_query_seconds', 'Time spent in database queries, including the background threads.')
+db_commit_duration = metrics_registry.histogram(
+    'db_commit_duration_seconds', 'Time of the commit of stored readings per table.', ('table',))
+ingest_rows = metrics_registry.counter(
+    'ingest_rows', 'Number of stored readings per table and area, rate() gives the rows per second.',
+    ('table', 'area'))
+ingest_rows_dropped = metrics_registry.counter(
+    'ingest_rows_dropped', 'Number of queued readings per table that the write-behind writer could not store on their own '
+    'and dropped.', ('table',))
+ingest_unknown_sensors = metrics_registry.counter(
+    'ingest_unknown_sensors', 'Number of stored Waiting Area readings per area of sensors that are not a seat sensor of '
+    'the area.', ('area',))
+metrics_registry.gauge(
+    'ingest_queue_depth', 'Number of readings waiting in the write-behind queue.',
+    lambda: ingest_queue.depth() if INGEST_WRITE_BEHIND else 0)
+metrics_registry.gauge(
+    'response_cache_entries', 'Number of responses in the response cache.',
+    lambda: response_cache.stats()['entries'])
+metrics_registry.function_counter(
+    'response_cache_hits', 'Number of response cache lookups that found a response, rate() gives the hits per second.',
+    lambda: response_cache.stats()['hits'])
+metrics_registry.function_counter(
+    'response_cache_misses', 'Number of response cache lookups that did not find a response.',
+    lambda: response_cache.stats()['misses'])
+metrics_registry.gauge(
+    'response_cache_hit_ratio', 'Share of the response cache lookups that found a response.',
+    lambda: response_cache.stats()['hit_ratio'])
+metrics_registry.gauge(
+    'stream_clients', 'Number of connected "/stream" clients.', lambda: len(event_hub.clients))
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(connection, cursor, statement, parameters, context, executemany):
     """
-    Function to calculate the occupancy rate in the Customs Area
+    Function that remembers the start time of a database query.
     """
-    # Check if data_points is None, empty, or an empty list
-    if data_points is None or data_points == "" or data_points == []:
-        return ""
-
-    # Calculate the total occupancy using SQLAlchemy aggregate function
-    total_occupancy = db.session.query(
-        func.avg(CustomsArea.current_people_count)).scalar()
-    return total_occupancy
+    connection.info['query_start'] = time.perf_counter()
 
 
-def get_peak_occupancy_custom(data_points):
+@event.listens_for(Engine, 'after_cursor_execute')
+def stop_query_timer(connection, cursor, statement, parameters, context, executemany):
     """
-    Function to calculate the peak occupancy rate in the Customs Area
+    Function that counts a finished database query, for the process and for the request it belongs to.
     """
-    # Check if data_points is None, empty, or an empty list
-    if data_points is None or data_points == "" or data_points == []:
-        return ""
+    duration = time.perf_counter() - connection.info.pop('query_start', time.perf_counter())
+    db_queries.inc()
+    db_query_seconds.inc(amount=duration)
 
-    # Calculate the peak occupancy using SQLAlchemy aggregate function
-    peak_occupancy = db.session.query(
-        func.max(CustomsArea.current_people_count)).scalar()
-    return peak_occupancy
+    if has_request_context() and 'db_queries' in g:
+        g.db_queries += 1
+        g.db_seconds += duration
 
 
-def calculate_taken_seats_dict(sensor_id, sensor_status, dictionary=seat_sensor_dict):
+@app.before_request
+def start_request_timer():
     """
-    Function to calculate how many seats are taken inside the Waiting Area
+    Function that starts the latency timer and the database counters of a request.
     """
-    # Print sensor_id and sensor_status for debugging purposes
-    print(f"Sensor ID: {sensor_id}")
-    print(f"Sensor Status: {sensor_status}")
+    g.request_start = time.perf_counter()
+    g.db_queries = 0
+    g.db_seconds = 0.0
 
-    # Update the dictionary with sensor_id and sensor_status
-    dictionary[sensor_id] = sensor_status
 
-    # Count the number of seats that are "AAN" (occupied) in the dictionary
-    taken_seats = sum(1 for value in dictionary.values() if value == "AAN")
+@app.after_request
+def record_request_metrics(response):
+    """
+    Function that records the latency, status code and database use of a request.
+    """
+    if 'request_start' not in g:
+        return response
 
-    # Print the updated dictionary and the number of taken seats for debugging purposes
-    print(f"Updated seat_sensor_dict: {dictionary}")
-    print(f"Taken Seats: {taken_seats}")
-    return taken_seats
+    # The route pattern keeps the number of label values small, unknown urls are counted together
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    http_requests.inc((route, request.method, str(response.status_code)))
+    http_request_duration.observe(time.perf_counter() - g.request_start, (route, request.method))
+    request_db_queries.observe(g.db_queries, (route,))
+    request_db_duration.observe(g.db_seconds, (route,))
+    return response
 
 
 ################################################################################
-# APP ROUTES
+# FUNCTIONS SEAT OCCUPANCY
 ################################################################################
 
-@app.route('/')
-def main_page():
+def update_seat_state(area_id, sensor_id, sensor_status, timestamp):
     """
-    Function that provides a route to the "main_page". This page contains the graphs, and this function ensures that the correct data is displayed in the appropriate graphs. 
-    It retrieves the necessary data from the corresponding database.
+    Function that applies a seat sensor reading to the seat state of its area and returns the number of taken seats.
+    Only the seat sensors configured for the area count, a reading of any other sensor leaves the seats unchanged.
+
+    The state lives in the database instead of in the memory of the process, so every worker process sees the same
+    seats. The first statement is a write, which makes SQLite serialize concurrent readings of all workers. The counter
+    is only changed when the sensor actually flips, so a reading costs the same no matter how many sensors there are.
+    A reading older than the last flip of its sensor does not change the state. The changes are committed together
+    with the reading in store_rows, see apply_seat_states.
+
+    Parameters:
+    - area_id: The area of the seat sensor.
+    - sensor_id: The ID of the seat sensor.
+    - sensor_status: The status of the sensor, "AAN" when the seat is occupied.
+    - timestamp: The time of the reading.
+
+    Returns:
+    - taken_seats: The number of taken seats in the area after the reading.
     """
+    occupied = sensor_status == SEAT_OCCUPIED_STATUS
+
+    # A sensor that is not a seat of the area does not change the seats
+    if sensor_id not in AREAS[area_id]['seat_sensors']:
+        log_event(logger, logging.WARNING, 'unknown_seat_sensor', sampled=True, area=area_id, sensor=sensor_id)
+        ingest_unknown_sensors.inc((area_id,))
+        return db.session.execute(
+            select(SeatCounter.taken_seats).where(SeatCounter.area_id == area_id)).scalar_one()
+
+    # A sensor that was never seen before starts as free
+    db.session.execute(sqlite_insert(SeatState).values(
+        area_id=area_id, sensor_id=sensor_id, occupied=False, changed_at=timestamp).on_conflict_do_nothing())
+
+    # Flip the sensor only when its status changes
+    flipped = db.session.execute(
+        SeatState.__table__.update()
+        .where(SeatState.area_id == area_id, SeatState.sensor_id == sensor_id, SeatState.occupied != occupied,
+               SeatState.changed_at <= timestamp)
+        .values(occupied=occupied, changed_at=timestamp)).rowcount
+
+    if flipped:
+        # Move the running counter of the area by one seat
+        taken_seats = db.session.execute(
+            SeatCounter.__table__.update()
+            .where(SeatCounter.area_id == area_id)
+            .values(taken_seats=SeatCounter.taken_seats + (1 if occupied else -1))
+            .returning(SeatCounter.taken_seats)).scalar_one()
+    else:
+        taken_seats = db.session.execute(
+            select(SeatCounter.taken_seats).where(SeatCounter.area_id == area_id)).scalar_one()
+
+    log_event(logger, logging.DEBUG, 'seat_state', sampled=True,
+              area=area_id, sensor=sensor_id, status=sensor_status, flipped=bool(flipped), taken_seats=taken_seats)
+    return taken_seats
 
-    # Set the timezone to CET (Central European Time)
-    cet_timezone = timezone(timedelta(hours=1))
 
-    # Get the current time in the Netherlands timezone
-    current_time = datetime.now(cet_timezone)
+def apply_seat_states(rows):
+    """
+    Function that applies Waiting Area readings to the seat state in the order they were received and fills in the seat
+    columns of their rows. Called by store_rows in the transaction that stores the readings, so in write-behind mode the
+    seat state is written by the background writer in its group commit and not in the request.
+
+    Parameters:
+    - rows: A list of rows as returned by build_waiting_area_row, their seat columns are filled in.
+    """
+    for row in rows:
+        # Never more taken seats than there are seats
+        total_seats = row['total_seats']
+        taken_seats = min(update_seat_state(area_id=row['area_id'], sensor_id=row['sensor_id'],
+                                            sensor_status=row['status'], timestamp=row['timestamp']), total_seats)
+        row['taken_seats'] = taken_seats
+        row['free_seats'] = calculate_free_seats(taken_seats, total_seats)
+        row['total_people'] = calculate_total_people_in_waiting_area(taken_seats, total_seats)
 
-    # Set start_time to midnight of today
-    start_time = current_time.replace(
-        hour=0, minute=0, second=0, microsecond=0)
 
-    # Set end_time to the current time
-    end_time = current_time
+def load_seat_state():
+    """
+    Function that loads the seat state on startup. Configured sensors without a state (a new database or a new area)
+    get the status of their last stored reading, or their starting status from the area configuration when they have no
+    readings. Readings of sensors that are not configured, like old sensors still in the database, are ignored and the
+    state of sensors that were removed from the configuration is dropped. The running counter of every area is then
+    recounted from the state so it always matches the sensors.
+    """
+    configured_sensors = {(area_id, sensor_id) for area_id, area in AREAS.items() for sensor_id in area['seat_sensors']}
+
+    # Drop the state of sensors that are no longer configured, so they do not count anymore
+    stale_sensors = [
+        (area_id, sensor_id) for area_id, sensor_id in db.session.execute(select(SeatState.area_id, SeatState.sensor_id))
+        if (area_id, sensor_id) not in configured_sensors
+    ]
+    for area_id, sensor_id in stale_sensors:
+        db.session.execute(delete(SeatState).where(SeatState.area_id == area_id, SeatState.sensor_id == sensor_id))
+
+    known_sensors = set(db.session.execute(select(SeatState.area_id, SeatState.sensor_id)).all())
+    seat_states = {
+        (area_id, sensor_id): {'area_id': area_id, 'sensor_id': sensor_id,
+                               'occupied': status == SEAT_OCCUPIED_STATUS, 'changed_at': datetime.min}
+        for area_id, area in AREAS.items() for sensor_id, status in area['seat_sensors'].items()
+        if (area_id, sensor_id) not in known_sensors
+    }
 
-    # Query the WaitingArea table in the database for data within the time frame from start_time to end_time
-    waiting_area_data = WaitingArea.query.filter(
-        WaitingArea.timestamp.between(start_time, end_time)).all()
+    if seat_states or not known_sensors:
+        # Last reading of every configured sensor
+        last_ids = select(func.max(WaitingArea.id)).where(WaitingArea.sensor_id.in_(SENSOR_AREAS)) \
+            .group_by(WaitingArea.area_id, WaitingArea.sensor_id)
+        last_readings = db.session.execute(
+            select(WaitingArea.area_id, WaitingArea.sensor_id, WaitingArea.status, WaitingArea.timestamp)
+            .where(WaitingArea.id.in_(last_ids))).all()
 
-    # Query the CustomsArea table in the database for data within the time frame from start_time to end_time
-    customs_area_data = CustomsArea.query.filter(
-        CustomsArea.timestamp.between(start_time, end_time)).all()
+        for area_id, sensor_id, status, timestamp in last_readings:
+            if (area_id, sensor_id) in configured_sensors and (area_id, sensor_id) not in known_sensors:
+                seat_states[(area_id, sensor_id)] = {'area_id': area_id, 'sensor_id': sensor_id,
+                                                     'occupied': status == SEAT_OCCUPIED_STATUS,
+                                                     'changed_at': timestamp}
+        if seat_states:
+            db.session.execute(insert(SeatState), list(seat_states.values()))
 
-    # Render the dashboard.html template, passing the waiting_area_data and customs_area_data to be used in the template
-    return render_template('dashboard.html', waiting_area=waiting_area_data, customs_area=customs_area_data)
+    recount_seat_counters()
 
 
-@app.route('/waiting_area', methods=['POST'])
-def receive_waiting_area_data():
+def recount_seat_counters():
     """
-    Function for receiving data on route: "/waiting_area". This function receives the data, calls other functions to perform necessary calculations, 
-    and inserts the correct data into the Waiting area database.
+    Function that sets the running counter of every area to the number of occupied sensors in the seat state. Only used
+    on startup and after a bulk import, the ingest changes the counters one flip at a time.
     """
-    try:
-        # Receive JSON data from the request
-        data = request.json
-        print(f"Binnengekomen Data op /waiting_area:\n    {data}\n")
+    taken_seats = dict(db.session.execute(
+        select(SeatState.area_id, func.count()).where(SeatState.occupied).group_by(SeatState.area_id)).all())
+    for area_id in AREAS:
+        db.session.execute(sqlite_insert(SeatCounter).values(
+            area_id=area_id, taken_seats=taken_seats.get(area_id, 0)).on_conflict_do_update(
+            index_elements=['area_id'], set_={'taken_seats': taken_seats.get(area_id, 0)}))
+    db.session.commit()
 
-        # Get the current time
-        current_time = datetime.now()
-
-        # Add timestamp to the received data
-        data['timestamp'] = current_time
-
-        # Extract sensor ID and status from the received data
-        sensor_id = data['Sensor']
-        status = data.get('Status', '').upper()
-
-        # Calculate taken seats based on sensor data
-        taken_seats = calculate_taken_seats_dict(
-            sensor_id=sensor_id, sensor_status=status, dictionary=seat_sensor_dict)
-
-        # Create a new WaitingArea object with calculated data
-        new_sensor_data = WaitingArea(
-            total_seats=number_of_seats_in_waiting_area,
-            taken_seats=taken_seats,
-            free_seats=calculate_free_seats(taken_seats),
-            total_people=calculate_total_people_in_waiting_area(taken_seats),
-            sensor_id=sensor_id,
-            status=status,
-            timestamp=current_time
-        )
 
-        # Add new data to the database
-        db.session.add(new_sensor_data)
-        db.session.commit()
+################################################################################
+# FUNCTIONS CUSTOMS ESTIMATOR
+################################################################################
 
-        # Clean up old data
-        earliest_time_to_keep = current_time - CHART_TIME_FRAME
-        WaitingArea.query.filter(
-            WaitingArea.timestamp < earliest_time_to_keep).delete()
-        db.session.commit()
+# Counts of the Customs Area that are integrated over time: everybody in the Customs Area for the turnaround time, the
+# people that have not passed passport control yet for the wait time. Every reading gets the integral of the counts of
+# the previous reading of its area over the time in between, as "<name>" in the rollup rows.
+CUSTOMS_INTEGRALS = {
+    'people_seconds': lambda row: row['current_people_count'],
+    'waiting_seconds': lambda row: row['entrance_point'] + row['before_passport_point'],
+}
 
-        # Return success message
-        return jsonify({'message': 'Waiting Area data received successfully'}), 201
+# Columns of the estimator state besides the area
+CUSTOMS_ESTIMATE_COLUMNS = ('last_timestamp', 'last_people', 'last_waiting', 'last_exit', 'people_seconds',
+                            'waiting_seconds', 'departures')
 
-    except ValueError as ve:
-        db.session.rollback()  # Rollback in case of error
-        print(f"ValueError occurred: {ve}")
-        return jsonify({'message': 'Error processing the Waiting Area data'}), 400
-    except Exception as e:
-        db.session.rollback()  # Rollback in case of error
-        print(f"An error occurred: {e}")
-        return jsonify({'message': 'Error processing the Waiting Area data'}), 500
 
+def count_departures(exit_point, last_exit):
+    """
+    Function that calculates the number of people that left since the previous reading from the cumulative counter of
+    the exit point. A counter that went down was reset, so everybody it counted since the reset left.
+
+    Parameters:
+    - exit_point: The exit point counter of the reading.
+    - last_exit: The exit point counter of the previous reading, None when there is no previous reading.
 
-@app.route('/customs_area', methods=['POST'])
-def receive_customs_area_data():
+    Returns:
+    - The number of people that left since the previous reading.
     """
-    Function for receiving data on route: "/customs_area". This function receives the data, calls other functions to perform necessary calculations, 
-    and inserts the correct data into the Customs Area database.
+    if last_exit is None:
+        return 0
+    if exit_point < last_exit:
+        return exit_point
+    return exit_point - last_exit
+
+
+def update_customs_estimates(rows):
     """
-    try:
-        # Receive JSON data from the request
-        data = request.json
-        print(f"Binnengekomen Data op /customs_area:\n    {data}\n")
+    Function that feeds new Customs Area readings to the streaming estimator of their area. By Little's law the average
+    time people spend in the Customs Area is the integral of the number of people over time divided by the number of
+    people that left, so the estimator only keeps the last reading and three running totals per area. The totals decay
+    exponentially with CUSTOMS_ESTIMATE_WINDOW, which makes them an estimate of the current situation. The exit point
+    is a cumulative counter, the departures are the difference with the previous reading (see count_departures).
 
-        # Get the current time
-        current_time = datetime.now()
-
-        # Add timestamp to the received data
-        data['timestamp'] = current_time
-
-        # Calculate the total number of people currently in the customs area
-        current_people_count = data['entrance_point'] + \
-            data['before_passport_point'] + data['after_passport_point']
-
-        # Create a new CustomsArea object and commit it to the database
-        customs_area_data = CustomsArea(
-            entrance_point=data['entrance_point'],
-            before_passport_point=data['before_passport_point'],
-            after_passport_point=data['after_passport_point'],
-            exit_point=data['exit_point'],
-            current_people_count=current_people_count,
-            timestamp=current_time
-        )
-
-        db.session.add(customs_area_data)
-        db.session.commit()
+    Called in the transaction that inserts the readings, after the insert, so SQLite serializes the updates of all
+    worker processes. A reading older than the last reading of its area adds nothing, its departures are part of the
+    counter of the later reading. Its integrals are filled in when the rollups are rebuilt.
 
-        # Clean up old data
-        earliest_time_to_keep = current_time - CHART_TIME_FRAME
-        CustomsArea.query.filter(
-            CustomsArea.timestamp < earliest_time_to_keep).delete()
-        db.session.commit()
+    Parameters:
+    - rows: A list of dictionaries with the column values of the new CustomsArea readings.
 
-        # Return success message
-        return jsonify({'message': 'Customs Area data received successfully'}), 201
+    Returns:
+    - The rows with the integrals of CUSTOMS_INTEGRALS added, for update_rollups.
+    """
+    max_gap = CUSTOMS_ESTIMATE_MAX_GAP.total_seconds()
+    window = CUSTOMS_ESTIMATE_WINDOW.total_seconds()
+
+    area_rows = {}
+    for row in rows:
+        area_rows.setdefault(row['area_id'], []).append(row)
+
+    rollup_rows = []
+    for area_id, readings in area_rows.items():
+        state = db.session.execute(
+            select(*[getattr(CustomsEstimate, column) for column in CUSTOMS_ESTIMATE_COLUMNS])
+            .where(CustomsEstimate.area_id == area_id)).one_or_none()
+        if state is not None:
+            state = state._asdict()
+        else:
+            state = {'last_timestamp': None, 'last_people': 0, 'last_waiting': 0, 'last_exit': None,
+                     'people_seconds': 0.0, 'waiting_seconds': 0.0, 'departures': 0.0}
+
+        for row in sorted(readings, key=lambda reading: reading['timestamp']):
+            integrals = dict.fromkeys((*CUSTOMS_INTEGRALS, 'departures'), 0.0)
+            if state['last_timestamp'] is not None and row['timestamp'] < state['last_timestamp']:
+                rollup_rows.append({**row, **integrals})
+                continue
+
+            # The counts of the previous reading were held until this reading, and the departures since the previous
+            # reading only count when the time in between counts as well
+            gap = None
+            if state['last_timestamp'] is not None:
+                gap = (row['timestamp'] - state['last_timestamp']).total_seconds()
+            if gap is not None and gap <= max_gap:
+                integrals['people_seconds'] = state['last_people'] * gap
+                integrals['waiting_seconds'] = state['last_waiting'] * gap
+                integrals['departures'] = count_departures(row['exit_point'], state['last_exit'])
+
+            decay = math.exp(-gap / window) if gap is not None else 1.0
+            state['people_seconds'] = state['people_seconds'] * decay + integrals['people_seconds']
+            state['waiting_seconds'] = state['waiting_seconds'] * decay + integrals['waiting_seconds']
+            state['departures'] = state['departures'] * decay + integrals['departures']
+            state['last_timestamp'] = row['timestamp']
+            state['last_people'] = CUSTOMS_INTEGRALS['people_seconds'](row)
+            state['last_waiting'] = CUSTOMS_INTEGRALS['waiting_seconds'](row)
+            state['last_exit'] = row['exit_point']
+            rollup_rows.append({**row, **integrals})
+
+        db.session.execute(sqlite_insert(CustomsEstimate).values(area_id=area_id, **state).on_conflict_do_update(
+            index_elements=['area_id'], set_=state))
+    return rollup_rows
+
+
+def load_customs_estimates():
+    """
+    Function that creates the estimator state of every area without one on startup, starting from the last stored
+    reading of the area. The running totals start at zero.
+    """
+    known_areas = set(db.session.execute(select(CustomsEstimate.area_id)).scalars())
+    missing_areas = [area_id for area_id in AREAS if area_id not in known_areas]
+    if not missing_areas:
+        return
+
+    last_ids = select(func.max(CustomsArea.id)).where(CustomsArea.area_id.in_(missing_areas)).group_by(
+        CustomsArea.area_id)
+    last_readings = {reading.area_id: reading for reading in db.session.execute(
+        select(CustomsArea).where(CustomsArea.id.in_(last_ids))).scalars()}
+
+    for area_id in missing_areas:
+        state = CustomsEstimate(area_id=area_id, last_timestamp=None, last_people=0, last_waiting=0,
+                                people_seconds=0.0, waiting_seconds=0.0, departures=0.0)
+        reading = last_readings.get(area_id)
+        if reading is not None:
+            state.last_timestamp = reading.timestamp
+            state.last_people = reading.current_people_count or 0
+            state.last_waiting = (reading.entrance_point or 0) + (reading.before_passport_point or 0)
+            state.last_exit = reading.exit_point
+        db.session.add(state)
+    db.session.commit()
+
+
+def replay_customs_estimates(area_ids):
+    """
+    Function that calculates the estimator state of areas again from the stored readings, after readings were written
+    without the estimator (see import_readings). The readings of the last ten CUSTOMS_ESTIMATE_WINDOW before the last
+    reading of an area are fed to update_customs_estimates, older readings have decayed to nothing. The caller commits.
 
-    except JSONDecodeError:
-        # Return error message for invalid JSON format
-        return jsonify({'message': 'Invalid JSON format'}), 400
+    Parameters:
+    - area_ids: The areas whose estimator state is calculated again.
+    """
+    for area_id in area_ids:
+        last_timestamp = db.session.execute(
+            select(func.max(CustomsArea.timestamp)).where(CustomsArea.area_id == area_id)).scalar()
+        db.session.execute(delete(CustomsEstimate).where(CustomsEstimate.area_id == area_id))
+        if last_timestamp is None:
+            continue
+
+        columns = IMPORT_COLUMNS[CustomsArea]
+        readings = db.session.execute(
+            select(*[getattr(CustomsArea, column) for column in columns]).where(
+                CustomsArea.area_id == area_id, CustomsArea.timestamp >= last_timestamp - 10 * CUSTOMS_ESTIMATE_WINDOW)
+            .order_by(CustomsArea.timestamp, CustomsArea.id))
+        update_customs_estimates([reading._asdict() for reading in readings])
+
+
+def get_current_customs_estimates(area_id):
+    """
+    Function that returns the current estimate of the wait time and the turnaround time of an area from the state of
+    the streaming estimator, a single primary key lookup.
 
-    except Exception as e:
-        # Handle other exceptions and return error message
-        print(f"An error has occurred: {e}")
-        return jsonify({'message': 'Error'}), 500
+    Returns:
+    - A dictionary with the current wait time and turnaround time in minutes, empty strings when nobody left the
+      Customs Area recently.
+    """
+    estimates = {'current_wait_time_custom': "", 'current_passenger_turnaround_time': ""}
+    state = db.session.get(CustomsEstimate, area_id)
+    if state is None or state.departures < 1:
+        return estimates
 
+    estimates['current_wait_time_custom'] = round(state.waiting_seconds / state.departures / 60, 1)
+    estimates['current_passenger_turnaround_time'] = round(state.people_seconds / state.departures / 60, 1)
+    return estimates
 
-@app.route('/waiting_area_data')
-def waiting_area_data():
+
+################################################################################
+# FUNCTIONS RESPONSE CACHE
+################################################################################
+
+class ResponseCache:
     """
-    Route for javascript to get Waiting Area data.
+    Bounded LRU cache with a time-to-live per entry for computed responses. Every entry remembers the area and time
+    range it was computed for, so ingest can drop exactly the entries its readings belong to, and the version of the
+    data it was computed from. A newer version replaces the entry of the same key instead of adding one.
     """
-    # Call function to get data for the Waiting Area
-    data = get_waiting_area_data()
-    return jsonify(data)
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, version=None):
+        """
+        Function that returns a cached value, or None when the key is not cached, expired or computed from another
+        version of the data.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic() or entry[4] != version:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[5]
+
+    def put(self, key, value, area_id, start_datetime, end_datetime, ttl, version=None):
+        """
+        Function that caches a value computed for the range start_datetime - end_datetime of an area from a version of
+        the data for ttl seconds.
+        """
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, area_id, start_datetime, end_datetime, version, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_range(self, area_id, first_timestamp, last_timestamp):
+        """
+        Function that drops every entry of an area whose range overlaps first_timestamp - last_timestamp.
+        """
+        with self.lock:
+            stale_keys = [
+                key for key, (expires, entry_area_id, start_datetime, end_datetime, version, value)
+                in self.entries.items()
+                if entry_area_id == area_id and start_datetime <= last_timestamp and first_timestamp <= end_datetime
+            ]
+            for key in stale_keys:
+                del self.entries[key]
+            self.invalidations += len(stale_keys)
+
+    def clear(self):
+        """
+        Function that drops every entry, used after data is deleted or rebuilt.
+        """
+        with self.lock:
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+
+    def stats(self):
+        """
+        Function that returns the counters of the cache.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+response_cache = ResponseCache(max_entries=RESPONSE_CACHE_SIZE)
+
+
+def range_includes_today(end_datetime):
+    """
+    Function that checks whether a range can still receive new readings, because it does not end before today.
+    """
+    return end_datetime > get_today_start()
 
 
-@app.route('/customs_area_data')
-def customs_area_data():
+def bump_data_versions(area_ids):
     """
-    Route for javascript to get Customs Area data.
+    Function that raises the past data version of areas in the current transaction, after a write that changed a day
+    before today. The caller commits.
     """
-    # Call function to get data for the Customs Area
-    data = get_customs_area_data()
-    return jsonify(data)
+    if not area_ids:
+        return
+    db.session.execute(sqlite_insert(DataVersion).values(
+        [{'area_id': area_id, 'version': 1} for area_id in area_ids]).on_conflict_do_update(
+        index_elements=['area_id'], set_={'version': DataVersion.version + 1}))
 
 
-@app.route('/get_statistics', methods=['GET'])
-def get_statistics():
+def get_past_data_version(area_id):
     """
-    Function to send the statistics to the webpage. This function is called by our Javascript file
+    Function that returns the past data version of an area, a lookup of one row by primary key. 0 when it was never raised.
     """
-    try:
-        # Get start_date and end_date from the query parameters
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
+    version = db.session.execute(select(DataVersion.version).where(DataVersion.area_id == area_id)).scalar()
+    return str(version or 0)
 
-        # Convert start_date and end_date to datetime objects
-        start_datetime = datetime.strptime(start_date, '%Y-%m-%d')
-        # Add one day to include the end_date
-        end_datetime = datetime.strptime(
-            end_date, '%Y-%m-%d') + timedelta(days=1)
 
-        print(f"Start Date: {start_datetime}")
-        print(f"End Date: {end_datetime}")
-
-        # Query the CustomsArea table in the database for data within the specified range
-        customs_area_data = CustomsArea.query.filter(
-            or_(
-                and_(CustomsArea.timestamp >= start_datetime,
-                     CustomsArea.timestamp < end_datetime),
-                and_(CustomsArea.timestamp >= start_datetime,
-                     CustomsArea.timestamp < end_datetime)
-            )
-        ).all()
-
-        # Sort the customs area data based on timestamp
-        customs_area_data = sorted(
-            customs_area_data, key=lambda entry: entry.timestamp)
-
-        # Query the WaitingArea table in the database for data within the specified range
-        waiting_area_data = WaitingArea.query.filter(
-            or_(
-                and_(WaitingArea.timestamp >= start_datetime,
-                     WaitingArea.timestamp < end_datetime),
-                and_(WaitingArea.timestamp >= start_datetime,
-                     WaitingArea.timestamp < end_datetime)
-            )
-        ).all()
-
-        # Sort the waiting area data based on timestamp
-        waiting_area_data = sorted(
-            waiting_area_data, key=lambda entry: entry.timestamp)
-
-        # Initialize variables to store statistics
-        avg_occupancy_waiting = peak_occupancy_waiting = avg_wait_time_waiting = ""
-        avg_occupancy_custom = peak_occupancy_custom = avg_passenger_turnaround_time_custom = avg_wait_time_custom = ""
-
-        # Calculate statistics for waiting area if data is available
-        if waiting_area_data:
-            avg_occupancy_waiting = calculate_average_occupancy(
-                waiting_area_data)
-            peak_occupancy_waiting = calculate_peak_occupancy(
-                waiting_area_data)
-
-        # Calculate statistics for customs area if data is available
-        if customs_area_data:
-            avg_occupancy_custom = get_average_occupancy_custom(
-                customs_area_data)
-            peak_occupancy_custom = get_peak_occupancy_custom(
-                customs_area_data)
-
-        # Return the statistics as JSON response
-        return jsonify({
-            'avg_occupancy_waiting': avg_occupancy_waiting,
-            'peak_occupancy_waiting': peak_occupancy_waiting,
-            'avg_occupancy_custom': avg_occupancy_custom,
-            'peak_occupancy_custom': peak_occupancy_custom,
-            'avg_passenger_turnaround_time': avg_passenger_turnaround_time_custom,
-            'avg_wait_time_custom': avg_wait_time_custom,
-        })
+def get_cached_response(route, area_id, start_datetime, end_datetime, parameters, compute, versions=()):
+    """
+    Function that returns a response payload from the cache, or computes and caches it.
 
-    except Exception as e:
-        # Handle any exceptions and return an error message
-        print(f"An error occurred: {str(e)}")
-        traceback.print_exc()
-        return jsonify({'error': 'Internal Server Error'}), 500
+    Ranges that include today are cached for RESPONSE_CACHE_LIVE_TTL seconds with the data versions, so a worker
+    process never serves a response older than the readings another worker stored. Ranges entirely in the past are
+    cached for RESPONSE_CACHE_PAST_TTL seconds with the past data version of the area (see DataVersion), which every
+    process raises when it writes to a day before today. The versions are not part of the key, so a response of newer
+    data replaces the entry of the same request. Ingest of readings in a cached range of the same area also drops the
+    entry of the process itself.
+
+    Parameters:
+    - route: The name of the route.
+    - area_id: The area of the payload.
+    - start_datetime: Start of the range.
+    - end_datetime: End of the range.
+    - parameters: A tuple with the other query parameters the payload depends on.
+    - compute: A function without arguments that computes the payload.
+    - versions: The data versions of the tables the payload is computed from, see get_data_version. Only used for
+      ranges that include today.
+    """
+    live = range_includes_today(end_datetime)
+    if not live:
+        versions = (get_past_data_version(area_id),)
+    key = (route, area_id, start_datetime, end_datetime, parameters)
+    versions = tuple(versions)
+
+    payload = response_cache.get(key, versions)
+    if payload is None:
+        payload = compute()
+        ttl = RESPONSE_CACHE_LIVE_TTL if live else RESPONSE_CACHE_PAST_TTL
+        response_cache.put(key, payload, area_id, start_datetime, end_datetime, ttl, versions)
+    return payload
 
 
 ################################################################################
-# FUNCTIONS AND ROUTES FOR ChartJS
+# FUNCTIONS RESPONSE COMPRESSION
 ################################################################################
 
-def get_waiting_area_data():
+def choose_content_encoding():
     """
-    Function that retrieves data from the database for the "Waiting Area" and displays it in a graph on the web application.
+    Function that picks the compression of a response from the Accept-Encoding header of the request. With the same
+    preference brotli is picked over gzip, it makes smaller JSON for the same CPU time.
+
+    Returns:
+    - "br", "gzip" or None when the client accepts neither.
     """
-    # Set the timezone to CET (Central European Time)
-    cet_timezone = timezone(timedelta(hours=1))
+    encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(encodings)
+
 
-    # Get the current time in the CET timezone
-    current_time = datetime.now(cet_timezone)
+def compress_body(data, encoding):
+    """
+    Function that compresses a response body with brotli ("br") or gzip.
+    """
+    if encoding == 'br':
+        return brotli.compress(data, quality=RESPONSE_BROTLI_QUALITY)
+    compressor = zlib.compressobj(RESPONSE_GZIP_LEVEL, wbits=31)
+    return compressor.compress(data) + compressor.flush()
 
-    # Set the end time to the current time
-    end_time = current_time
 
-    # Set the start time to 5 minutes before the current time
-    start_time = end_time - timedelta(minutes=5)
+@app.after_request
+def compress_response(response):
+    """
+    Function that compresses JSON responses when the client accepts it. Streamed responses, like the exports and
+    "/stream", are left alone. The ETag of a compressed response becomes weak, the JSON it stands for is the same.
+    """
+    if (not RESPONSE_COMPRESSION_ENABLED or response.mimetype != 'application/json' or response.is_streamed
+            or response.direct_passthrough or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers):
+        return response
 
-    # Query the WaitingArea table in the database for data within the time frame from start_time to end_time
-    waiting_area_data = WaitingArea.query.filter(
-        WaitingArea.timestamp.between(start_time, end_time)).all()
+    # Caches between the dashboard and the server must keep a response per encoding
+    response.vary.add('Accept-Encoding')
 
-    # Sort the waiting area data based on timestamp
-    waiting_area_data = sorted(
-        waiting_area_data, key=lambda entry: entry.timestamp)
+    # Small responses do not become noticeably smaller
+    data = response.get_data()
+    encoding = choose_content_encoding()
+    if encoding is None or len(data) < RESPONSE_COMPRESSION_MIN_BYTES:
+        return response
 
-    # Prepare data for the graph
-    data = {
-        'labels': [entry.timestamp.strftime('%Y-%m-%d %H:%M:%S') for entry in waiting_area_data],
-        'datasets': [
-            {
-                'label': 'Taken Seats (Waiting Area)',
-                'data': [entry.taken_seats for entry in waiting_area_data],
-                'borderColor': 'rgba(75, 192, 192, 1)',
-                'borderWidth': 1,
-                'backgroundColor': 'rgba(75, 192, 192, 0.9)',
-                'fill': False
-            },
-            {
-                'label': 'Free Seats (Waiting Area)',
-                'data': [entry.free_seats for entry in waiting_area_data],
-                'borderColor': 'rgba(255, 99, 132, 1)',
-                'borderWidth': 1,
-                'backgroundColor': 'rgba(255, 99, 132, 0.9)',
-                'fill': False
-            },
-            {
-                'label': 'Total Seats (Waiting Area)',
-                'data': [entry.total_seats for entry in waiting_area_data],
-                'borderColor': 'rgba(255, 0, 178, 1)',
-                'borderWidth': 1,
-                'backgroundColor': 'rgba(255, 0, 178, 0.9)',
-                'fill': False
-            },
-            {
-                'label': 'Total People (Waiting Area)',
-                'data': [entry.total_people for entry in waiting_area_data],
-                'borderColor': 'rgba(51, 255, 51, 1)',
-                'borderWidth': 1,
-                'backgroundColor': 'rgba(51, 255, 51, 0.9)',
-                'fill': False
-            },
-        ]
-    }
+    response.set_data(compress_body(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+    return response
 
-    return data
 
+################################################################################
+# FUNCTIONS ROLLUPS
+################################################################################
 
-def get_customs_area_data():
+def truncate_timestamp(timestamp, granularity):
     """
-    Function that retrieves data from the database for the "Customs Area" and displays it in a graph on the web application.
+    Function that returns the start of the rollup bucket a timestamp belongs to.
     """
-    # Set the timezone to CET (Central European Time) and get the current time zone
-    cet_timezone = timezone(timedelta(hours=1))
-    current_time = datetime.now(cet_timezone)
+    if granularity == 'minute':
+        return timestamp.replace(second=0, microsecond=0)
+    if granularity == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
 
-    # Set the end time to the current time
-    end_time = current_time
 
-    # Set the start time to 24 hours before the current time
-    start_time = end_time - timedelta(hours=24)
+def analytics_metric(model, row):
+    """
+    Function that calculates the analytics metric of a new reading (see ANALYTICS_METRICS), None when it has none.
+    """
+    if model is WaitingArea:
+        return row['taken_seats'] * 100.0 / row['total_seats'] if row['total_seats'] else None
+    return row['current_people_count']
 
-    # Query the CustomsArea table in the database for data within the time frame from start_time to end_time
-    customs_area_data = CustomsArea.query.filter(
-        CustomsArea.timestamp.between(start_time, end_time)).all()
 
-    # Sort the customs area data based on timestamp
-    customs_area_data = sorted(
-        customs_area_data, key=lambda entry: entry.timestamp)
+def add_analytics_integrals(model, rows, ids):
+    """
+    Function that adds the analytics integrals of new readings for update_rollups: the metric of the previous reading of
+    the area times the seconds since that reading as "analytics_value_seconds", and those seconds as
+    "analytics_held_seconds". A gap longer than ANALYTICS_MAX_HOLD gets nothing. The integrals belong to the bucket of
+    the previous reading, whose metric was held, so its timestamp is added as "analytics_timestamp".
 
-    # Prepare data for the graph
-    data = {
-        'labels': [entry.timestamp.strftime('%Y-%m-%d %H:%M:%S') for entry in customs_area_data],
-        'datasets': [
-            {
-                'label': 'Exit Point (Customs Area)',
-                'data': [entry.exit_point for entry in customs_area_data],
-                'borderColor': 'rgba(255, 205, 86, 1)',
-                'borderWidth': 1,
-                'fill': False
-            },
-            {
-                'label': 'Current People Count (Customs Area)',
-                'data': [entry.current_people_count for entry in customs_area_data],
-                'borderColor': 'rgba(54, 162, 235, 1)',
-                'borderWidth': 1,
-                'fill': False
-            },
-            {
-                'label': 'Entrance Point Count (Customs Area)',
-                'data': [entry.entrance_point for entry in customs_area_data],
-                'borderColor': 'rgba(255, 99, 71, 1)',
-                'borderWidth': 1,
-                'fill': False
-            },
-        ]
-    }
+    Called in the transaction that inserts the readings, after the insert, so the previous reading of another worker
+    process is already stored. Like in update_customs_estimates a reading older than the last stored reading of its area
+    gets no integrals, they are filled in when the rollups are rebuilt.
 
-    return data
+    Parameters:
+    - model: The database model of the readings (WaitingArea or CustomsArea).
+    - rows: A list of dictionaries with the column values of the new readings, in the order they were inserted.
+    - ids: The ids of the new readings. One insert gets consecutive ids, so they are left out as a range.
 
+    Returns:
+    - The rows with the analytics integrals added.
+    """
+    max_hold = ANALYTICS_MAX_HOLD.total_seconds()
+    metric = db.literal_column(f'({ANALYTICS_METRICS[model][1]})')
+
+    area_rows = {}
+    for row in rows:
+        area_rows.setdefault(row['area_id'], []).append(row)
+
+    rollup_rows = []
+    for area_id, readings in area_rows.items():
+        # The last stored reading of the area besides the new readings, served by the (area_id, timestamp) index
+        last_reading = db.session.execute(
+            select(model.timestamp, metric).where(model.area_id == area_id, ~model.id.between(min(ids), max(ids)))
+            .order_by(model.timestamp.desc(), model.id.desc()).limit(1)).one_or_none()
+        last_timestamp, last_value = last_reading if last_reading is not None else (None, None)
+
+        # Sorting is stable, so readings with the same timestamp stay in the order of their ids
+        for row in sorted(readings, key=lambda reading: reading['timestamp']):
+            integrals = {'analytics_value_seconds': 0.0, 'analytics_held_seconds': 0.0,
+                         'analytics_timestamp': row['timestamp']}
+            if last_timestamp is not None and row['timestamp'] < last_timestamp:
+                rollup_rows.append({**row, **integrals})
+                continue
+
+            # The metric of the previous reading was held until this reading
+            if last_timestamp is not None and last_value is not None:
+                gap = (row['timestamp'] - last_timestamp).total_seconds()
+                if gap <= max_hold:
+                    integrals['analytics_value_seconds'] = last_value * gap
+                    integrals['analytics_held_seconds'] = gap
+                    integrals['analytics_timestamp'] = last_timestamp
+            last_timestamp, last_value = row['timestamp'], analytics_metric(model, row)
+            rollup_rows.append({**row, **integrals})
+    return rollup_rows
+
+
+def update_rollups(model, rows):
+    """
+    Function that adds new readings to the minute, hour and day rollups of their table and area. The readings are first
+    combined per bucket, so every bucket is written with a single upsert. Called inside the transaction that inserts the readings.
 
-@app.route('/get_date_range', methods=['GET'])
-def get_date_range():
+    Parameters:
+    - model: The database model of the readings (WaitingArea or CustomsArea).
+    - rows: A list of dictionaries with the column values of the new readings, plus the integrals of the rollup table
+      and the analytics integrals (see add_analytics_integrals).
     """
-    Function that retrieves the appropriate data for the selected dates. These dates are selected on the web page and can range from a single day to multiple days/weeks/months/years, etc.
+    rollup_model = ROLLUP_MODELS[model]
+    metrics = rollup_model.metrics
+    integrals = rollup_model.integrals + ANALYTICS_INTEGRALS
+
+    def get_bucket(area_id, granularity, timestamp):
+        # A bucket that only gets analytics integrals has no readings and no minimum and maximum
+        key = (area_id, granularity, truncate_timestamp(timestamp, granularity))
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = {'area_id': key[0], 'granularity': key[1], 'bucket_start': key[2], 'count': 0}
+            for metric in metrics:
+                bucket[f'{metric}_sum'] = 0
+                bucket[f'{metric}_min'] = None
+                bucket[f'{metric}_max'] = None
+            for integral in integrals:
+                bucket[f'{integral}_sum'] = 0.0
+        return bucket
+
+    # Combine the readings per (area, granularity, bucket)
+    buckets = {}
+    for row in rows:
+        for granularity in ROLLUP_GRANULARITIES:
+            bucket = get_bucket(row['area_id'], granularity, row['timestamp'])
+            bucket['count'] += 1
+            for metric in metrics:
+                value = row[metric]
+                bucket[f'{metric}_sum'] += value
+                bucket[f'{metric}_min'] = value if bucket['count'] == 1 else min(bucket[f'{metric}_min'], value)
+                bucket[f'{metric}_max'] = value if bucket['count'] == 1 else max(bucket[f'{metric}_max'], value)
+            for integral in rollup_model.integrals:
+                bucket[f'{integral}_sum'] += row[integral]
+
+            # The analytics integrals belong to the bucket of the reading whose metric was held
+            if row['analytics_held_seconds']:
+                bucket = get_bucket(row['area_id'], granularity, row['analytics_timestamp'])
+                for integral in ANALYTICS_INTEGRALS:
+                    bucket[f'{integral}_sum'] += row[integral]
+
+    # Insert new buckets, or add the readings to buckets that already exist. SQLite's min() and max() of NULL are NULL,
+    # so the minimum and maximum of a bucket without readings are replaced instead
+    table = rollup_model.__table__
+    statement = sqlite_insert(table)
+    update_values = {'count': table.c.count + statement.excluded.count}
+    for metric in metrics:
+        current_min, new_min = table.c[f'{metric}_min'], statement.excluded[f'{metric}_min']
+        current_max, new_max = table.c[f'{metric}_max'], statement.excluded[f'{metric}_max']
+        update_values[f'{metric}_sum'] = table.c[f'{metric}_sum'] + statement.excluded[f'{metric}_sum']
+        update_values[f'{metric}_min'] = func.min(func.coalesce(current_min, new_min), func.coalesce(new_min, current_min))
+        update_values[f'{metric}_max'] = func.max(func.coalesce(current_max, new_max), func.coalesce(new_max, current_max))
+    for integral in integrals:
+        update_values[f'{integral}_sum'] = table.c[f'{integral}_sum'] + statement.excluded[f'{integral}_sum']
+    statement = statement.on_conflict_do_update(
+        index_elements=['area_id', 'granularity', 'bucket_start'], set_=update_values)
+
+    db.session.execute(statement, list(buckets.values()))
+
+
+def rebuild_rollups(model, start_date=None, end_date=None):
+    """
+    Function that recalculates the rollups of a table from the raw readings. Rollups of days that are no longer in the
+    raw table (because of the retention period) are only replaced when they are inside the given range.
+
+    Parameters:
+    - model: The database model of the readings (WaitingArea or CustomsArea).
+    - start_date: First day to rebuild, None rebuilds from the first reading.
+    - end_date: Day after the last day to rebuild, None rebuilds up to the last reading.
     """
+    rollup_model = ROLLUP_MODELS[model]
+    metrics = rollup_model.metrics
+
+    # Rebuild whole days, so the minute, hour and day buckets of the range are all complete
+    rollup_filter = []
+    if start_date is not None:
+        start_date = truncate_timestamp(start_date, 'day')
+        rollup_filter.append(rollup_model.bucket_start >= start_date)
+    if end_date is not None:
+        end_date = truncate_timestamp(end_date, 'day')
+        rollup_filter.append(rollup_model.bucket_start < end_date)
+    readings = select_rollup_readings(model, start_date, end_date)
+    intervals = select_analytics_intervals(model, start_date, end_date)
+
     try:
-        # Get start_date and end_date from the query parameters
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
+        db.session.execute(delete(rollup_model).where(*rollup_filter),
+                           execution_options={'synchronize_session': False})
+
+        column_names = ['area_id', 'granularity', 'bucket_start', 'count']
+        for metric in metrics:
+            column_names += [f'{metric}_sum', f'{metric}_min', f'{metric}_max']
+        column_names += [f'{integral}_sum' for integral in rollup_model.integrals + ANALYTICS_INTEGRALS]
+
+        # Let SQLite group the raw readings per area and bucket for every granularity
+        table = rollup_model.__table__
+        for granularity, bucket_format in ROLLUP_GRANULARITIES.items():
+            bucket_start = func.strftime(bucket_format, readings.c.timestamp)
+            columns = [readings.c.area_id, db.literal(granularity), bucket_start, func.count()]
+            for metric in metrics:
+                column = readings.c[metric]
+                columns += [func.coalesce(func.sum(column), 0), func.min(column), func.max(column)]
+            columns += [func.coalesce(func.sum(readings.c[integral]), 0) for integral in rollup_model.integrals]
+            columns += [db.literal(0.0) for integral in ANALYTICS_INTEGRALS]
+            query = select(*columns).group_by(readings.c.area_id, bucket_start)
+            db.session.execute(insert(table).from_select(column_names, query))
+
+            # Add the analytics integrals to the bucket of the reading whose metric was held, which was inserted above
+            bucket_start = func.strftime(bucket_format, intervals.c.timestamp)
+            query = select(intervals.c.area_id, db.literal(granularity), bucket_start, db.literal(0),
+                           *[func.sum(intervals.c[integral]) for integral in ANALYTICS_INTEGRALS]).where(
+                db.true()).group_by(intervals.c.area_id, bucket_start)
+            statement = sqlite_insert(table).from_select(
+                ['area_id', 'granularity', 'bucket_start', 'count', *[f'{integral}_sum' for integral in ANALYTICS_INTEGRALS]],
+                query)
+            db.session.execute(statement.on_conflict_do_update(
+                index_elements=['area_id', 'granularity', 'bucket_start'],
+                set_={f'{integral}_sum': statement.excluded[f'{integral}_sum'] for integral in ANALYTICS_INTEGRALS}))
+
+        # The rebuilt days can be in the past, so the cached past ranges of every process are refreshed
+        bump_data_versions(list(AREAS))
+        db.session.commit()
+        response_cache.clear()
 
-        # Convert start_date and end_date to datetime objects
-        start_datetime = datetime.strptime(start_date, '%Y-%m-%d')
-        # Add one day to include the end_date
-        end_datetime = datetime.strptime(
-            end_date, '%Y-%m-%d') + timedelta(days=1)
+    except Exception:
+        db.session.rollback()  # Rollback in case of error
+        raise
 
-        print(f"Start Date: {start_datetime}")
-        print(f"End Date: {end_datetime}")
-
-        # Query the CustomsArea table in the database for data within the specified range
-        customs_area_data = CustomsArea.query.filter(
-            CustomsArea.timestamp.between(start_datetime, end_datetime)
-        ).all()
-
-        # Sort the customs area data based on timestamp
-        customs_area_data = sorted(
-            customs_area_data, key=lambda entry: entry.timestamp)
-
-        # Query the WaitingArea table in the database for data within the specified range
-        waiting_area_data = WaitingArea.query.filter(
-            WaitingArea.timestamp.between(start_datetime, end_datetime)
-        ).all()
-
-        # Sort the waiting area data based on timestamp
-        waiting_area_data = sorted(
-            waiting_area_data, key=lambda entry: entry.timestamp)
-
-        # Prepare data for the Customs Area chart
-        data_customs_filter_date = {
-            'labels': [entry.timestamp.strftime('%Y-%m-%d %H:%M:%S') for entry in customs_area_data],
-            'datasets': [
-                {
-                    'label': 'Exit Point (Customs Area)',
-                    'data': [entry.exit_point for entry in customs_area_data],
-                    'borderColor': 'rgba(255, 205, 86, 1)',
-                    'borderWidth': 1,
-                    'fill': False
-                },
-                {
-                    'label': 'Current People Count (Customs Area)',
-                    'data': [entry.current_people_count for entry in customs_area_data],
-                    'borderColor': 'rgba(54, 162, 235, 1)',
-                    'borderWidth': 1,
-                    'fill': False
-                },
-                {
-                    'label': 'Entrance Point Count (Customs Area)',
-                    'data': [entry.entrance_point for entry in customs_area_data],
-                    'borderColor': 'rgba(255, 99, 71, 1)',
-                    'borderWidth': 1,
-                    'fill': False
-                },
-            ]
-        }
 
-        # Prepare data for the Waiting Area chart
-        data_waiting_filter_date = {
-            'labels': [entry.timestamp.strftime('%Y-%m-%d %H:%M:%S') for entry in waiting_area_data],
-            'datasets': [
-                {
-                    'label': 'Taken Seats (Waiting Area)',
-                    'data': [entry.taken_seats for entry in waiting_area_data],
-                    'borderColor': 'rgba(75, 192, 192, 1)',
-                    'borderWidth': 1,
-                    'fill': False
-                },
-                {
-                    'label': 'Free Seats (Waiting Area)',
-                    'data': [entry.free_seats for entry in waiting_area_data],
-                    'borderColor': 'rgba(255, 99, 132, 1)',
-                    'borderWidth': 1,
-                    'fill': False
-                },
-                {
-                    'label': 'Total Seats (Waiting Area)',
-                    'data': [entry.total_seats for entry in waiting_area_data],
-                    'borderColor': 'rgba(255, 0, 178, 0.8)',
-                    'borderWidth': 1,
-                    'fill': False
-                },
-                {
-                    'label': 'Total People (Waiting Area)',
-                    'data': [entry.total_people for entry in waiting_area_data],
-                    'borderColor': 'rgba(51, 255, 51, 1)',
-                    'borderWidth': 1,
-                    'fill': False
-                },
-            ]
+def select_rollup_readings(model, start_datetime=None, end_datetime=None, area_id=None):
+    """
+    Function that selects the readings of a range with the columns of their rollup, as a subquery. The integrals of the
+    Customs Area are calculated like on ingest: the counts of CUSTOMS_INTEGRALS of the previous reading of the area times
+    the seconds since that reading and the departures like update_customs_estimates does, nothing for a gap longer than
+    CUSTOMS_ESTIMATE_MAX_GAP.
+    The readings up to the maximum gap before the range are read as well, because they can be the previous reading.
+
+    Parameters:
+    - model: The database model of the readings (WaitingArea or CustomsArea).
+    - start_datetime: Start of the range, None selects from the first reading.
+    - end_datetime: End of the range (not included), None selects up to the last reading.
+    - area_id: Only select the readings of this area, None selects every area.
+
+    Returns:
+    - A subquery with the area_id, timestamp, metrics and integrals of every reading in the range.
+    """
+    rollup_model = ROLLUP_MODELS[model]
+    columns = [model.area_id, model.timestamp] + [getattr(model, metric) for metric in rollup_model.metrics]
+    raw_filter = [model.timestamp.is_not(None)]
+    if area_id is not None:
+        raw_filter.append(model.area_id == area_id)
+    if end_datetime is not None:
+        raw_filter.append(model.timestamp < end_datetime)
+
+    # Seconds since the previous reading of the area, ordered like the readings were fed to the estimator
+    previous = {'partition_by': model.area_id, 'order_by': (model.timestamp, model.id)}
+    gap = (func.julianday(model.timestamp) - func.julianday(func.lag(model.timestamp).over(**previous))) * 86400.0
+    max_gap = timedelta(0)
+
+    # The counts of CUSTOMS_INTEGRALS as SQL expressions
+    if model is CustomsArea:
+        held_counts = {
+            'people_seconds': model.current_people_count,
+            'waiting_seconds': model.entrance_point + model.before_passport_point,
         }
+        columns += [
+            db.case((gap <= CUSTOMS_ESTIMATE_MAX_GAP.total_seconds(), func.lag(count).over(**previous) * gap),
+                    else_=0.0).label(integral) for integral, count in held_counts.items()
+        ]
 
-        # Return the data for both charts as JSON
-        return jsonify({'waiting_area': data_waiting_filter_date, 'customs_area': data_customs_filter_date})
+        # The departures since the previous reading from the cumulative exit point counter, see count_departures
+        previous_exit = func.lag(model.exit_point).over(**previous)
+        departures = db.case((model.exit_point < previous_exit, model.exit_point),
+                             else_=model.exit_point - previous_exit)
+        columns.append(db.case((gap <= CUSTOMS_ESTIMATE_MAX_GAP.total_seconds(), departures),
+                               else_=0.0).label('departures'))
+        max_gap = CUSTOMS_ESTIMATE_MAX_GAP
 
-    except Exception as e:
-        # Handle any exceptions and return an error message
-        print(f"An error occurred in /get_date_range: {str(e)}")
-        return jsonify({'error': 'Internal Server Error'}), 500
+    if start_datetime is not None:
+        raw_filter.append(model.timestamp >= start_datetime - max_gap)
+    readings = select(*columns).where(*raw_filter).subquery()
 
+    if start_datetime is None:
+        return readings
+    return select(readings).where(readings.c.timestamp >= start_datetime).subquery()
 
-################################################################################
-# FUNCTIONS FOR CSV EXPORT
-################################################################################
 
-@app.route('/export_data_to_csv')
-def export_data_to_csv():
-    """
-    Function to export the data to CSV format for further calculations
+def select_analytics_intervals(model, start_datetime=None, end_datetime=None):
     """
-    try:
-        # Get start_date, end_date, and area from the query parameters
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        area = request.args.get('area')
+    Function that selects the analytics integrals of the readings of a range, as a subquery. They are calculated like
+    on ingest (see add_analytics_integrals): the metric of a reading times the seconds until the next reading of its
+    area, nothing for a gap longer than ANALYTICS_MAX_HOLD. The readings up to ANALYTICS_MAX_HOLD after the range are
+    read as well, because they can be the next reading.
 
-        # Convert start_date and end_date to datetime objects
+    Parameters:
+    - model: The database model of the readings (WaitingArea or CustomsArea).
+    - start_datetime: Start of the range, None selects from the first reading.
+    - end_datetime: End of the range (not included), None selects up to the last reading.
+
+    Returns:
+    - A subquery with the area_id, timestamp and ANALYTICS_INTEGRALS of every reading in the range.
+    """
+    raw_filter = [model.timestamp.is_not(None)]
+    if start_datetime is not None:
+        raw_filter.append(model.timestamp >= start_datetime)
+    if end_datetime is not None:
+        raw_filter.append(model.timestamp < end_datetime + ANALYTICS_MAX_HOLD)
+
+    # Seconds until the next reading of the area, in the order the readings are fed to add_analytics_integrals
+    following = {'partition_by': model.area_id, 'order_by': (model.timestamp, model.id)}
+    gap = (func.julianday(func.lead(model.timestamp).over(**following)) - func.julianday(model.timestamp)) * 86400.0
+
+    # The metric of the reading, held until the next reading
+    max_hold = ANALYTICS_MAX_HOLD.total_seconds()
+    metric = db.literal_column(f'({ANALYTICS_METRICS[model][1]})')
+    readings = select(
+        model.area_id, model.timestamp,
+        db.case(((gap <= max_hold) & metric.is_not(None), metric * gap), else_=0.0).label('analytics_value_seconds'),
+        db.case(((gap <= max_hold) & metric.is_not(None), gap), else_=0.0).label('analytics_held_seconds'),
+    ).where(*raw_filter).subquery()
+
+    if end_datetime is None:
+        return readings
+    return select(readings).where(readings.c.timestamp < end_datetime).subquery()
+
+
+def choose_chart_granularity(start_datetime, end_datetime):
+    """
+    Function that chooses where chart data for a range comes from.
+
+    Returns:
+    - None when the range is short enough for the raw readings, otherwise the coarsest rollup granularity that still
+      gives at least ROLLUP_MIN_POINTS points.
+    """
+    range_length = end_datetime - start_datetime
+    if range_length <= ROLLUP_RAW_MAX_RANGE:
+        return None
+
+    for granularity in reversed(ROLLUP_GRANULARITIES):
+        if range_length / ROLLUP_BUCKET_SIZES[granularity] >= ROLLUP_MIN_POINTS:
+            return granularity
+    return 'minute'
+
+
+def choose_statistics_granularity(start_datetime, end_datetime):
+    """
+    Function that chooses the coarsest rollup granularity whose buckets start exactly at the start and end of the range,
+    so the rollups cover the range without any reading outside of it.
+
+    Returns:
+    - The granularity, or None when the range does not start and end on a whole minute.
+    """
+    for granularity in reversed(ROLLUP_GRANULARITIES):
+        if truncate_timestamp(start_datetime, granularity) == start_datetime and \
+                truncate_timestamp(end_datetime, granularity) == end_datetime:
+            return granularity
+    return None
+
+
+def load_rollup_columns(model, area_id, granularity, start_datetime, end_datetime, columns):
+    """
+    Function that loads the rollup buckets of an area in a range as chart columns. Every point has the start of the bucket as
+    timestamp and the average of every metric in the bucket, calculated by SQLite.
+
+    Returns:
+    - A dictionary with a list per column: "timestamp" and the requested columns. There is no "id" column.
+    """
+    rollup_model = ROLLUP_MODELS[model]
+    averages = [
+        func.round(getattr(rollup_model, f'{column}_sum') * 1.0 / rollup_model.count, 2)
+        for column in columns
+    ]
+    query = select(rollup_model.bucket_start, *averages).where(
+        rollup_model.area_id == area_id,
+        rollup_model.granularity == granularity,
+        rollup_model.bucket_start >= start_datetime,
+        rollup_model.bucket_start < end_datetime
+    ).order_by(rollup_model.bucket_start)
+
+    return rows_to_columns(db.session.execute(query).all(), ['timestamp'] + list(columns))
+
+
+def rows_to_columns(rows, names):
+    """
+    Function that turns a list of row tuples into one list per column in a single pass.
+    """
+    if not rows:
+        return {name: [] for name in names}
+    return dict(zip(names, (list(values) for values in zip(*rows))))
+
+
+def load_chart_columns(model, area_id, start_datetime, end_datetime, columns, since_id=None):
+    """
+    Function that loads the chart data of an area in a range as columns, from the raw readings for short ranges and from the
+    coarsest suitable rollup for long ranges. Only the needed columns are selected and SQLite sorts on timestamp, so
+    no ORM objects are created.
+
+    Parameters:
+    - model: The database model of the readings (WaitingArea or CustomsArea).
+    - area_id: The area of the readings.
+    - start_datetime: Start of the range.
+    - end_datetime: End of the range.
+    - columns: The names of the columns to load, besides the id and timestamp.
+    - since_id: Only load raw readings with a higher id, ignored when the range is served from the rollups.
+
+    Returns:
+    - A dictionary with a list per column: "id" (raw readings only), "timestamp" and the requested columns.
+    """
+    granularity = choose_chart_granularity(start_datetime, end_datetime)
+    if granularity is not None:
+        return load_rollup_columns(model, area_id, granularity, start_datetime, end_datetime, columns)
+
+    # Query only the needed columns of the readings of the area within the specified range, sorted on timestamp. The
+    # (area_id, timestamp) index serves both the filter and the order.
+    query = select(model.id, model.timestamp, *[getattr(model, column) for column in columns]).where(
+        model.area_id == area_id, model.timestamp.between(start_datetime, end_datetime))
+    if since_id is not None:
+        query = query.where(model.id > since_id)
+    query = query.order_by(model.timestamp)
+
+    return rows_to_columns(db.session.execute(query).all(), ['id', 'timestamp'] + list(columns))
+
+
+def load_area_totals(model, area_id, start_datetime, end_datetime):
+    """
+    Function that adds up all readings of an area within a range with a single aggregate query. The query runs on the
+    coarsest rollup that covers the range exactly, or on the raw readings when the range does not start and end on a
+    whole minute.
+
+    Returns:
+    - A dictionary with the number of readings ("count"), the keys "<metric>_sum", "<metric>_min" and "<metric>_max",
+      and the start ("first_timestamp") and end ("last_timestamp") of the period with readings.
+    """
+    rollup_model = ROLLUP_MODELS[model]
+    granularity = choose_statistics_granularity(start_datetime, end_datetime)
+
+    if granularity is None:
+        # Aggregate the raw readings of the range
+        readings = select_rollup_readings(model, start_datetime, end_datetime, area_id)
+        columns = [func.count().label('count')]
+        for metric in rollup_model.metrics:
+            column = readings.c[metric]
+            columns += [func.sum(column).label(f'{metric}_sum'), func.min(column).label(f'{metric}_min'),
+                        func.max(column).label(f'{metric}_max')]
+        columns += [func.sum(readings.c[integral]).label(f'{integral}_sum') for integral in rollup_model.integrals]
+        columns += [func.min(readings.c.timestamp).label('first_timestamp'),
+                    func.max(readings.c.timestamp).label('last_timestamp')]
+
+        totals = db.session.execute(select(*columns)).one()
+        return totals._asdict()
+
+    columns = [func.coalesce(func.sum(rollup_model.count), 0).label('count')]
+    for metric in rollup_model.metrics:
+        columns += [
+            func.sum(getattr(rollup_model, f'{metric}_sum')).label(f'{metric}_sum'),
+            func.min(getattr(rollup_model, f'{metric}_min')).label(f'{metric}_min'),
+            func.max(getattr(rollup_model, f'{metric}_max')).label(f'{metric}_max'),
+        ]
+    columns += [func.sum(getattr(rollup_model, f'{integral}_sum')).label(f'{integral}_sum')
+                for integral in rollup_model.integrals]
+
+    # The minute buckets give the period with readings, also when the totals come from coarser buckets
+    minute_range = (
+        rollup_model.area_id == area_id,
+        rollup_model.granularity == 'minute',
+        rollup_model.bucket_start >= start_datetime,
+        rollup_model.bucket_start < end_datetime,
+    )
+    columns += [
+        select(func.min(rollup_model.bucket_start)).where(*minute_range)
+        .correlate(None).scalar_subquery().label('first_timestamp'),
+        select(func.max(rollup_model.bucket_start)).where(*minute_range)
+        .correlate(None).scalar_subquery().label('last_timestamp'),
+    ]
+
+    totals = db.session.execute(select(*columns).where(
+        rollup_model.area_id == area_id,
+        rollup_model.granularity == granularity,
+        rollup_model.bucket_start >= start_datetime,
+        rollup_model.bucket_start < end_datetime,
+    )).one()._asdict()
+
+    # The period ends at the end of the last minute bucket
+    if totals['last_timestamp'] is not None:
+        totals['last_timestamp'] += ROLLUP_BUCKET_SIZES['minute']
+    return totals
+
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """
+    Recalculate the minute, hour and day rollups from the raw readings.
+    """
+    for model in ROLLUP_MODELS:
+        rebuild_rollups(model)
+        print(f"{ROLLUP_MODELS[model].__tablename__} rebuilt")
+
+
+with app.app_context():
+    db.create_all()
+    migrate_database()
+
+    # Fill the rollups of an existing database the first time it is used with rollup tables
+    for raw_model, rollup_model in ROLLUP_MODELS.items():
+        if rollup_model.query.first() is None and raw_model.query.first() is not None:
+            rebuild_rollups(raw_model)
+
+    # Load the seat state of the waiting area and the state of the customs estimator
+    load_seat_state()
+    load_customs_estimates()
+
+
+################################################################################
+# FUNCTIONS CALCULATIONS
+################################################################################
+
+def calculate_free_seats(taken_seats, total_seats=number_of_seats_in_waiting_area):
+    """
+    Function that calculates the number of unoccupied seats.
+
+    Parameters:
+    - taken_seats: The number of seats that are currently occupied.
+    - total_seats: The total number of seats available in the waiting area (default value obtained from a predefined constant).
+
+    Returns:
+    - calculate_free_seats: The number of unoccupied seats.
+    """
+    calculate_free_seats = total_seats - taken_seats
+    return calculate_free_seats
+
+
+def calculate_total_people_in_waiting_area(taken_seats, total_seats=number_of_seats_in_waiting_area, multiplier=1.3):
+    """
+    Function to calculate the total number of people in the space, assuming not every person in the space is seated (standing, leaning, walking, sitting on the floor).
+
+    Parameters:
+    - taken_seats: The number of seats that are currently occupied.
+    - total_seats: The total number of seats available in the waiting area (default value obtained from a predefined constant).
+    - multiplier: A factor to estimate the total number of people based on the number of taken seats (default value is 1.3, which is an empirical multiplier).
+
+    Returns:
+    - estimated_people_with_multiplier: The estimated total number of people in the waiting area, considering the multiplier.
+    """
+    percentage_taken = (taken_seats / total_seats) * 100
+    estimated_people = int((percentage_taken / 100) * total_seats)
+    estimated_people_with_multiplier = int(estimated_people * multiplier)
+    return estimated_people_with_multiplier
+
+
+def calculate_waiting_area_statistics(totals):
+    """
+    Function to calculate the average and peak occupancy of the Waiting Area from the totals of a range.
+
+    Parameters:
+    - totals: The totals of the Waiting Area, as returned by load_area_totals.
+
+    Returns:
+    - A dictionary with the average and the peak occupancy in percent, empty strings when there is no data in the range.
+    """
+    statistics = {'avg_occupancy_waiting': "", 'peak_occupancy_waiting': ""}
+    if totals['count'] == 0:
+        return statistics
+
+    # Average occupancy is the share of all seats that were taken, over all readings
+    statistics['avg_occupancy_waiting'] = 0
+    if totals['total_seats_sum']:
+        statistics['avg_occupancy_waiting'] = round(totals['taken_seats_sum'] / totals['total_seats_sum'] * 100, 1)
+
+    # Peak occupancy is the highest number of taken seats compared to the number of seats
+    if totals['total_seats_max']:
+        statistics['peak_occupancy_waiting'] = round(totals['taken_seats_max'] / totals['total_seats_max'] * 100, 1)
+
+    return statistics
+
+
+def calculate_customs_area_statistics(totals):
+    """
+    Function to calculate the statistics of the Customs Area from the totals of a range.
+
+    The wait time and turnaround time follow from Little's law (average number of people = throughput * average time
+    spent): the average time spent is the integral of the number of people over time divided by the number of people
+    leaving through the exit point, the increase of its cumulative counter. The integrals are kept in the rollups by the customs estimator, so every count
+    weighs by the time it was held. The wait time uses the people that have not passed passport control yet (entrance
+    point and before passport point), the turnaround time uses everybody in the Customs Area.
+
+    Parameters:
+    - totals: The totals of the Customs Area, as returned by load_area_totals.
+
+    Returns:
+    - A dictionary with the average and peak number of people, and the average wait time and turnaround time in minutes.
+      Figures that can not be calculated are empty strings.
+    """
+    statistics = {
+        'avg_occupancy_custom': "",
+        'peak_occupancy_custom': "",
+        'avg_passenger_turnaround_time': "",
+        'avg_wait_time_custom': "",
+    }
+    if totals['count'] == 0:
+        return statistics
+
+    average_people = totals['current_people_count_sum'] / totals['count']
+    statistics['avg_occupancy_custom'] = average_people
+    statistics['peak_occupancy_custom'] = totals['current_people_count_max']
+
+    # Nobody left or no time between the readings gives no estimate
+    if not totals['departures_sum'] or not totals['people_seconds_sum']:
+        return statistics
+
+    statistics['avg_wait_time_custom'] = round(totals['waiting_seconds_sum'] / totals['departures_sum'] / 60, 1)
+    statistics['avg_passenger_turnaround_time'] = round(totals['people_seconds_sum'] / totals['departures_sum'] / 60, 1)
+    return statistics
+
+
+def calculate_statistics(area_id, start_datetime, end_datetime):
+    """
+    Function that calculates every statistic of "/get_statistics" for an area and range, with one aggregate query for
+    the Waiting Area and one for the Customs Area. For a range that includes today the current estimates of the customs
+    estimator are added, otherwise they are empty strings.
+
+    Returns:
+    - A dictionary with the statistics of both areas.
+    """
+    statistics = calculate_waiting_area_statistics(
+        load_area_totals(WaitingArea, area_id, start_datetime, end_datetime))
+    statistics.update(calculate_customs_area_statistics(
+        load_area_totals(CustomsArea, area_id, start_datetime, end_datetime)))
+
+    if range_includes_today(end_datetime):
+        statistics.update(get_current_customs_estimates(area_id))
+    else:
+        statistics.update({'current_wait_time_custom': "", 'current_passenger_turnaround_time': ""})
+    return statistics
+
+
+################################################################################
+# FUNCTIONS INGEST
+################################################################################
+
+def parse_reading_timestamp(data, default_time):
+    """
+    Function that returns the timestamp of a reading. Gateways that buffer readings can send the original time of the reading
+    as an ISO 8601 string in the "timestamp" field, otherwise the time the reading was received is used.
+
+    Parameters:
+    - data: The reading as received from the sensor or gateway.
+    - default_time: The time to use when the reading does not contain a timestamp.
+
+    Returns:
+    - The timestamp of the reading as a naive datetime.
+    """
+    timestamp = data.get('timestamp')
+    if timestamp is None:
+        return default_time
+
+    # Only strings are accepted, anything else is an invalid reading
+    if not isinstance(timestamp, str):
+        raise ValueError("timestamp must be an ISO 8601 string")
+
+    parsed_timestamp = datetime.fromisoformat(timestamp)
+
+    # The database stores naive times in the timezone of the dashboard, so drop the timezone after converting
+    if parsed_timestamp.tzinfo is not None:
+        parsed_timestamp = parsed_timestamp.astimezone(DASHBOARD_TIMEZONE).replace(tzinfo=None)
+    return parsed_timestamp
+
+
+def parse_reading_area(data, sensor_id=None):
+    """
+    Function that returns the area of a reading: the "area" field of the reading, otherwise the area the seat sensor is
+    configured in, otherwise DEFAULT_AREA.
+
+    Returns:
+    - The id of a configured area, a ValueError is raised for an unknown area.
+    """
+    area_id = data.get('area') or SENSOR_AREAS.get(sensor_id, DEFAULT_AREA)
+    if area_id not in AREAS:
+        raise ValueError(f"unknown area {area_id}")
+    return area_id
+
+
+def build_waiting_area_row(data, current_time):
+    """
+    Function that validates a single Waiting Area reading and turns it into a row for the WaitingArea table. The seat
+    columns are filled in from the seat state when the row is stored, see apply_seat_states. A reading of a sensor that
+    is not a seat sensor of its area is stored without counting as a seat, or rejected when the area is configured with
+    "reject_unknown_sensors" (see load_area_config).
+
+    Parameters:
+    - data: The reading, a dictionary with the keys "Sensor", "Status" and optionally "area".
+    - current_time: The time the reading was received.
+
+    Returns:
+    - A dictionary with the column values of the new WaitingArea row.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("reading must be a JSON object")
+
+    # Extract sensor ID and status from the received data
+    sensor_id = data['Sensor']
+    status = data.get('Status', '')
+    if not isinstance(sensor_id, str) or not sensor_id:
+        raise ValueError("Sensor must be a non-empty string")
+    if not isinstance(status, str):
+        raise ValueError("Status must be a string")
+    status = status.upper()
+    timestamp = parse_reading_timestamp(data, current_time)
+    area_id = parse_reading_area(data, sensor_id)
+    if AREAS[area_id]['reject_unknown_sensors'] and sensor_id not in AREAS[area_id]['seat_sensors']:
+        raise ValueError(f"unknown seat sensor {sensor_id} in area {area_id}")
+
+    return {
+        'area_id': area_id,
+        'total_seats': AREAS[area_id]['total_seats'],
+        'taken_seats': None,
+        'free_seats': None,
+        'total_people': None,
+        'sensor_id': sensor_id,
+        'status': status,
+        'timestamp': timestamp,
+    }
+
+
+def build_customs_area_row(data, current_time):
+    """
+    Function that validates a single Customs Area reading and turns it into a row for the CustomsArea table.
+
+    Parameters:
+    - data: The reading, a dictionary with the counts of the four measuring points and optionally "area".
+    - current_time: The time the reading was received.
+
+    Returns:
+    - A dictionary with the column values of the new CustomsArea row.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("reading must be a JSON object")
+
+    # Every measuring point must be present and contain a whole number that the database can store
+    points = {}
+    for point in ('entrance_point', 'before_passport_point', 'after_passport_point', 'exit_point'):
+        value = data[point]
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ValueError(f"{point} must be an integer")
+        if not 0 <= value <= MAX_READING_COUNT:
+            raise ValueError(f"{point} must be between 0 and {MAX_READING_COUNT}")
+        points[point] = value
+
+    # Calculate the total number of people currently in the customs area
+    current_people_count = points['entrance_point'] + \
+        points['before_passport_point'] + points['after_passport_point']
+    if current_people_count > MAX_READING_COUNT:
+        raise ValueError(f"the number of people must be at most {MAX_READING_COUNT}")
+
+    return {
+        'area_id': parse_reading_area(data),
+        **points,
+        'current_people_count': current_people_count,
+        'timestamp': parse_reading_timestamp(data, current_time),
+    }
+
+
+def store_rows(model, rows):
+    """
+    Function that writes rows to the database in a single transaction with one bulk insert and updates the rollups.
+    This is the only place where readings are written, so the single, batch and write-behind ingest all store their data
+    in the same way.
+
+    Parameters:
+    - model: The database model the rows are written to (WaitingArea or CustomsArea).
+    - rows: A list of dictionaries with the column values, as returned by build_waiting_area_row or build_customs_area_row.
+    """
+    if not rows:
+        return
+
+    try:
+        # Apply seat sensor readings to the seat state in the same transaction
+        if model is WaitingArea:
+            apply_seat_states(rows)
+
+        # Add all rows to the database with a single bulk insert, old data is removed by the retention pruner
+        ids = db.session.execute(
+            insert(model).returning(model.id, sort_by_parameter_order=True), rows).scalars().all()
+
+        # Keep the customs estimator and the rollups up to date in the same transaction
+        rollup_rows = update_customs_estimates(rows) if model is CustomsArea else rows
+        update_rollups(model, add_analytics_integrals(model, rollup_rows, ids))
+
+        # Backfilled readings of a day before today change past ranges that other processes may have cached
+        today = get_today_start()
+        bump_data_versions({row['area_id'] for row in rows if row['timestamp'] < today})
+        commit_start = time.perf_counter()
+        db.session.commit()
+        db_commit_duration.observe(time.perf_counter() - commit_start, (model.__tablename__,))
+
+    except Exception:
+        db.session.rollback()  # Rollback in case of error
+        raise
+
+    # Drop the cached responses of the areas and ranges the readings belong to
+    area_ranges = {}
+    area_rows = collections.Counter()
+    for row in rows:
+        first_timestamp, last_timestamp = area_ranges.get(row['area_id'], (row['timestamp'], row['timestamp']))
+        area_ranges[row['area_id']] = (min(first_timestamp, row['timestamp']), max(last_timestamp, row['timestamp']))
+        area_rows[row['area_id']] += 1
+    for area_id, (first_timestamp, last_timestamp) in area_ranges.items():
+        response_cache.invalidate_range(area_id, first_timestamp, last_timestamp)
+        ingest_rows.inc((model.__tablename__, area_id), area_rows[area_id])
+
+    # Add the stored readings to the live window buffers
+    append_live_readings(model, ids, rows)
+
+    # Push the stored readings to the dashboards connected to "/stream"
+    publish_readings(model, ids, rows)
+
+
+class IngestQueue:
+    """
+    Bounded in-memory queue with a background writer for the write-behind ingest. Readings are stored by the writer in
+    group commits, either every flush_interval seconds or as soon as flush_rows readings are waiting.
+    """
+
+    def __init__(self, maxsize, flush_interval, flush_rows):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """
+        Function that starts the background writer.
+        """
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.run, name='ingest-writer', daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def put(self, model, row):
+        """
+        Function that adds a validated row to the queue without waiting.
+
+        Returns:
+        - True when the row is queued, False when the queue is full.
+        """
+        try:
+            self.queue.put_nowait((model, row))
+            return True
+        except queue.Full:
+            return False
+
+    def depth(self):
+        """
+        Function that returns the number of readings waiting in the queue.
+        """
+        return self.queue.qsize()
+
+    def take(self, pending):
+        """
+        Function that moves readings from the queue to the pending list until flush_rows readings are pending or the
+        flush interval has passed.
+        """
+        deadline = time.monotonic() + self.flush_interval
+        while len(pending) < self.flush_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+    def flush(self, pending):
+        """
+        Function that stores the pending readings, grouped per table, in one transaction per table. When a group commit
+        fails the readings of the group are stored one at a time, so a single bad reading cannot block the writer: a
+        reading that fails on its own is dropped (logged and counted in ingest_rows_dropped). Only readings that failed
+        because the database was unavailable (an OperationalError, for example a lock timeout) are kept for a retry.
+
+        Returns:
+        - The readings that could not be stored because of the database, so they can be retried.
+        """
+        rows_per_model = {}
+        for model, row in pending:
+            rows_per_model.setdefault(model, []).append(row)
+
+        failed = []
+        with app.app_context():
+            for model, rows in rows_per_model.items():
+                try:
+                    store_rows(model, rows)
+                    continue
+                except Exception as e:
+                    log_event(logger, logging.ERROR, 'queued_store_failed',
+                              table=model.__tablename__, rows=len(rows), error=e)
+
+                # Find the readings that cannot be stored by storing them one at a time
+                for row in rows:
+                    try:
+                        store_rows(model, [row])
+                    except OperationalError:
+                        failed.append((model, row))
+                    except Exception as e:
+                        log_event(logger, logging.ERROR, 'queued_reading_dropped',
+                                  table=model.__tablename__, reading=row, error=e)
+                        ingest_rows_dropped.inc((model.__tablename__,))
+        return failed
+
+    def run(self):
+        """
+        Function that runs the background writer until stop() is called.
+        """
+        pending = []
+        while not self.stop_event.is_set():
+            self.take(pending)
+            if pending:
+                pending = self.flush(pending)
+                # Wait before retrying readings that could not be stored, they are kept instead of dropped
+                if pending:
+                    self.stop_event.wait(self.flush_interval)
+
+        # Drain the queue on shutdown
+        self.drain(pending)
+
+    def drain(self, pending):
+        """
+        Function that stores the pending readings and everything left in the queue.
+        """
+        while True:
+            try:
+                pending.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        for attempt in range(3):
+            if not pending:
+                return
+            pending = self.flush(pending)
+        if pending:
+            log_event(logger, logging.ERROR, 'queued_readings_lost', rows=len(pending))
+
+    def stop(self):
+        """
+        Function that stops the background writer after the queue is drained.
+        """
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+
+
+ingest_queue = IngestQueue(
+    maxsize=INGEST_QUEUE_SIZE,
+    flush_interval=INGEST_FLUSH_INTERVAL_MS / 1000,
+    flush_rows=INGEST_FLUSH_ROWS,
+)
+
+if INGEST_WRITE_BEHIND:
+    ingest_queue.start()
+
+
+def enqueue_reading(model, row, area_name):
+    """
+    Function that puts a validated reading in the write-behind queue.
+
+    Returns:
+    - A JSON response with 202 when the reading is queued, or 429 when the queue is full.
+    """
+    if not ingest_queue.put(model, row):
+        response = jsonify({'message': f'{area_name} ingest queue is full, try again later'})
+        response.headers['Retry-After'] = '1'
+        return response, 429
+
+    # The reading and its seat state change are stored by the background writer, the request does not write
+    return jsonify({'message': f'{area_name} data queued'}), 202
+
+
+def parse_batch_readings():
+    """
+    Function that reads a batch of readings from the request body. The body can either be a JSON array of readings
+    or NDJSON (one JSON object per line).
+
+    Returns:
+    - A list with one entry per reading. Lines of an NDJSON body that are not valid JSON are returned as a JSONDecodeError,
+      so they can be reported back to the gateway without rejecting the rest of the batch.
+    """
+    body = request.get_data(as_text=True)
+
+    # A JSON array is parsed as a whole
+    if body.lstrip().startswith('['):
+        readings = json.loads(body)
+        if not isinstance(readings, list):
+            raise ValueError("batch must be a JSON array")
+        return readings
+
+    # Otherwise every non-empty line is a separate reading
+    readings = []
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            readings.append(json.loads(line))
+        except JSONDecodeError as error:
+            readings.append(error)
+    return readings
+
+
+def ingest_batch(model, build_row, area_name):
+    """
+    Function that validates a batch of readings and writes all valid readings to the database in a single transaction
+    with one bulk insert. When that transaction fails the valid readings are stored one at a time, so only the readings
+    that cannot be stored are reported as errors.
+
+    Parameters:
+    - model: The database model the readings are written to (WaitingArea or CustomsArea).
+    - build_row: The function that turns a single reading into a row for the model.
+    - area_name: The name of the area, used in the response messages.
+
+    Returns:
+    - A JSON response with the status of every reading and the HTTP status code.
+    """
+    try:
+        readings = parse_batch_readings()
+    except (JSONDecodeError, ValueError):
+        return jsonify({'message': 'Invalid JSON format'}), 400
+
+    if len(readings) > MAX_BATCH_SIZE:
+        return jsonify({'message': f'A batch can contain at most {MAX_BATCH_SIZE} readings'}), 413
+
+    # Get the current time, shared by every reading without its own timestamp
+    current_time = local_now()
+
+    # Validate every reading, a failing reading does not affect the rest of the batch
+    rows = []
+    results = []
+    for index, reading in enumerate(readings):
+        try:
+            if isinstance(reading, JSONDecodeError):
+                raise ValueError("Invalid JSON format")
+            rows.append(build_row(reading, current_time))
+            results.append({'index': index, 'status': 'ok'})
+        except KeyError as error:
+            results.append({'index': index, 'status': 'error', 'message': f'Missing field {error}'})
+        except (TypeError, ValueError) as error:
+            results.append({'index': index, 'status': 'error', 'message': str(error)})
+
+    store_failed = False
+    try:
+        # Add all valid readings to the database in one transaction
+        store_rows(model, rows)
+
+    except Exception as e:
+        log_event(logger, logging.ERROR, 'batch_store_failed', table=model.__tablename__, rows=len(rows), error=e)
+
+        # Store the readings one at a time, so only the readings that cannot be stored are reported
+        stored_results = [result for result in results if result['status'] == 'ok']
+        for row, result in zip(rows, stored_results):
+            try:
+                store_rows(model, [row])
+            except Exception as row_error:
+                log_event(logger, logging.WARNING, 'batch_reading_failed', table=model.__tablename__,
+                          index=result['index'], error=row_error)
+                result.update(status='error', message='Error storing the reading')
+                store_failed = True
+
+    # 201 when every reading is stored, 207 when only part of the batch is stored, 500 when nothing is stored because
+    # of the database and 400 when nothing is stored because every reading is invalid
+    accepted = sum(1 for result in results if result['status'] == 'ok')
+    rejected = len(results) - accepted
+    if rejected == 0:
+        status_code = 201
+    elif accepted > 0:
+        status_code = 207
+    elif store_failed:
+        status_code = 500
+    else:
+        status_code = 400
+
+    return jsonify({
+        'message': f'{area_name} batch processed',
+        'accepted': accepted,
+        'rejected': rejected,
+        'results': results,
+    }), status_code
+
+
+################################################################################
+# FUNCTIONS DATA RETENTION
+################################################################################
+
+def prune_table(model, retention, chunk_size=RETENTION_CHUNK_SIZE):
+    """
+    Function that deletes the rows of a table that are older than the retention period. Rows are deleted in chunks of
+    chunk_size rows with a commit after every chunk, so ingest never waits long for the write lock.
+
+    Parameters:
+    - model: The database model to prune (WaitingArea or CustomsArea).
+    - retention: A timedelta with how long rows are kept.
+    - chunk_size: The maximum number of rows deleted per transaction.
+
+    Returns:
+    - The total number of deleted rows.
+    """
+    earliest_time_to_keep = local_now() - retention
+    total_deleted = 0
+
+    while True:
+        # Select the ids of one chunk of expired rows and delete them
+        expired_ids = select(model.id).where(
+            model.timestamp < earliest_time_to_keep).limit(chunk_size).scalar_subquery()
+        result = db.session.execute(
+            delete(model).where(model.id.in_(expired_ids)),
+            execution_options={'synchronize_session': False})
+        db.session.commit()
+
+        total_deleted += result.rowcount
+        if result.rowcount < chunk_size:
+            return total_deleted
+
+        # Give waiting writers a chance to take the write lock between chunks
+        time.sleep(0.01)
+
+
+def compact_database(mode=RETENTION_VACUUM):
+    """
+    Function that gives the space of deleted rows back to the file system.
+
+    Parameters:
+    - mode: "incremental" runs PRAGMA incremental_vacuum, "full" runs VACUUM and "none" does nothing.
+    """
+    if mode not in ('incremental', 'full'):
+        return
+
+    # VACUUM can not run inside a transaction
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        if mode == 'incremental':
+            # incremental_vacuum only works when auto_vacuum is INCREMENTAL (2), switching requires one full VACUUM
+            if connection.exec_driver_sql('PRAGMA auto_vacuum').scalar() != 2:
+                connection.exec_driver_sql('PRAGMA auto_vacuum = INCREMENTAL')
+                connection.exec_driver_sql('VACUUM')
+            connection.exec_driver_sql('PRAGMA incremental_vacuum')
+        else:
+            connection.exec_driver_sql('VACUUM')
+
+
+def prune_old_data():
+    """
+    Function that runs one pruning pass over every table with a retention period, followed by the configured compaction.
+
+    Returns:
+    - A dictionary with the number of deleted rows per table.
+    """
+    deleted = {}
+    for model in (WaitingArea, CustomsArea):
+        retention = RETENTION_PERIODS.get(model.__tablename__)
+        if retention is None:
+            continue
+        deleted[model.__tablename__] = prune_table(model, retention)
+
+    # Only compact when something was deleted
+    if any(deleted.values()):
+        bump_data_versions(list(AREAS))
+        db.session.commit()
+        response_cache.clear()
+        compact_database()
+    return deleted
+
+
+class RetentionPruner:
+    """
+    Background thread that runs prune_old_data every interval seconds.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """
+        Function that starts the background pruner.
+        """
+        if self.thread is not None or self.interval <= 0:
+            return
+        self.thread = threading.Thread(target=self.run, name='retention-pruner', daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def run(self):
+        """
+        Function that prunes the database until stop() is called.
+        """
+        while not self.stop_event.wait(self.interval):
+            try:
+                with app.app_context():
+                    deleted = prune_old_data()
+                if any(deleted.values()):
+                    log_event(logger, logging.INFO, 'retention_pruned', **deleted)
+            except Exception as e:
+                log_event(logger, logging.ERROR, 'retention_failed', error=e)
+
+    def stop(self):
+        """
+        Function that stops the background pruner.
+        """
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+
+
+retention_pruner = RetentionPruner(interval=RETENTION_INTERVAL_SECONDS)
+retention_pruner.start()
+
+
+@app.cli.command('prune')
+def prune_command():
+    """
+    Delete readings older than the retention period and compact the database.
+    """
+    if not RETENTION_PERIODS:
+        print("No retention period configured, set MOLDASH_RETENTION_DAYS_WAITING_AREA or "
+              "MOLDASH_RETENTION_DAYS_CUSTOMS_AREA to prune")
+        return
+    deleted = prune_old_data()
+    for table, count in deleted.items():
+        print(f"{table}: {count} rows deleted")
+
+
+################################################################################
+# FUNCTIONS BULK IMPORT
+################################################################################
+
+# Fields of an import file that contain a count, a CSV file has no types so they are turned into integers
+IMPORT_COUNT_FIELDS = ('entrance_point', 'before_passport_point', 'after_passport_point', 'exit_point')
+
+# Column order of the rows written by the bulk import
+IMPORT_COLUMNS = {
+    WaitingArea: ('area_id', 'total_seats', 'taken_seats', 'free_seats', 'total_people', 'sensor_id', 'status',
+                  'timestamp'),
+    CustomsArea: ('area_id', 'entrance_point', 'before_passport_point', 'after_passport_point', 'exit_point',
+                  'current_people_count', 'timestamp'),
+}
+
+
+def read_import_file(import_file, file_format):
+    """
+    Function that reads the readings of an import file one at a time, so a file does not have to fit in memory.
+
+    Parameters:
+    - import_file: The opened text file.
+    - file_format: "ndjson" (one JSON reading per line) or "csv" (a header with the field names of the readings).
+
+    Returns:
+    - A generator of (line number, reading) tuples. The reading is None for a line that is not valid JSON.
+    """
+    if file_format == 'csv':
+        for line_number, reading in enumerate(csv.DictReader(import_file), start=2):
+            # CSV has no types, the whole numbers of the count fields are turned into integers like in JSON
+            yield line_number, {key: int(value) if key in IMPORT_COUNT_FIELDS and value.lstrip('-').isdigit() else value
+                                for key, value in reading.items() if value != ''}
+        return
+
+    for line_number, line in enumerate(import_file, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except JSONDecodeError:
+            yield line_number, None
+
+
+def parse_import_reading(model, reading):
+    """
+    Function that validates a reading of an import file. Unlike the ingest routes a reading must have its own timestamp.
+
+    Returns:
+    - For the Waiting Area a tuple (timestamp, area_id, sensor_id, status), for the Customs Area the row of the reading.
+    """
+    if not isinstance(reading, dict):
+        raise ValueError("reading must be a JSON object")
+    if 'timestamp' not in reading:
+        raise ValueError("timestamp is required for an import")
+
+    if model is CustomsArea:
+        return build_customs_area_row(reading, None)
+
+    sensor_id = reading['Sensor']
+    return (parse_reading_timestamp(reading, None), parse_reading_area(reading, sensor_id), sensor_id,
+            str(reading.get('Status', '')).upper())
+
+
+def load_seat_state_before(timestamp):
+    """
+    Function that returns the status of every configured seat sensor just before a timestamp, from the stored readings.
+
+    Returns:
+    - A dictionary with per (area_id, sensor_id) True when the seat was occupied.
+    """
+    last_ids = select(func.max(WaitingArea.id)).where(
+        WaitingArea.timestamp < timestamp, WaitingArea.sensor_id.in_(SENSOR_AREAS)).group_by(
+        WaitingArea.area_id, WaitingArea.sensor_id)
+    readings = db.session.execute(
+        select(WaitingArea.area_id, WaitingArea.sensor_id, WaitingArea.status).where(WaitingArea.id.in_(last_ids)))
+    return {(area_id, sensor_id): status == SEAT_OCCUPIED_STATUS for area_id, sensor_id, status in readings
+            if sensor_id in AREAS[area_id]['seat_sensors']}
+
+
+def replay_seat_state(readings):
+    """
+    Function that turns Waiting Area readings into rows by replaying the seat state in timestamp order, starting from
+    the state of the stored readings before the first imported reading. Like in update_seat_state only the configured
+    seat sensors of an area count.
+
+    Parameters:
+    - readings: A list of (timestamp, area_id, sensor_id, status) tuples, sorted on timestamp.
+
+    Returns:
+    - A generator of row tuples in the order of IMPORT_COLUMNS, and afterwards the replayed state is in seat_states.
+    """
+    seat_states = load_seat_state_before(readings[0][0]) if readings else {}
+    taken_seats = collections.Counter()
+    for (area_id, sensor_id), occupied in seat_states.items():
+        taken_seats[area_id] += occupied
+
+    for timestamp, area_id, sensor_id, status in readings:
+        occupied = status == SEAT_OCCUPIED_STATUS
+        if sensor_id in AREAS[area_id]['seat_sensors'] and seat_states.get((area_id, sensor_id), False) != occupied:
+            seat_states[(area_id, sensor_id)] = occupied
+            taken_seats[area_id] += 1 if occupied else -1
+
+        total_seats = AREAS[area_id]['total_seats']
+        area_taken_seats = min(taken_seats[area_id], total_seats)
+        yield (area_id, total_seats, area_taken_seats, calculate_free_seats(area_taken_seats, total_seats),
+               calculate_total_people_in_waiting_area(area_taken_seats, total_seats), sensor_id, status, timestamp)
+
+
+def write_import_rows(model, rows, chunk_rows=IMPORT_CHUNK_ROWS):
+    """
+    Function that writes rows with executemany on the database connection, chunk_rows rows per transaction. The rollups
+    are not updated per row, they are rebuilt once after the import. Every transaction raises the past data version of
+    its areas, so the server processes do not keep serving cached past ranges without the imported readings.
+
+    Parameters:
+    - model: The database model the rows are written to.
+    - rows: An iterable of row tuples in the order of IMPORT_COLUMNS.
+    - chunk_rows: The number of rows per transaction.
+
+    Returns:
+    - The number of rows written.
+    """
+    columns = IMPORT_COLUMNS[model]
+    statement = (f"INSERT INTO {model.__tablename__} ({', '.join(columns)}) "
+                 f"VALUES ({', '.join('?' for column in columns)})")
+    timestamp_index = columns.index('timestamp')
+    area_index = columns.index('area_id')
+
+    def write_chunk(chunk):
+        db.session.connection().exec_driver_sql(statement, chunk)
+        bump_data_versions({row[area_index] for row in chunk})
+        db.session.commit()
+
+    written = 0
+    chunk = []
+    for row in rows:
+        # Store the timestamp in the same text format as SQLAlchemy, isoformat is much faster than strftime
+        row = list(row)
+        row[timestamp_index] = row[timestamp_index].isoformat(' ', 'microseconds')
+        chunk.append(tuple(row))
+        if len(chunk) >= chunk_rows:
+            write_chunk(chunk)
+            written += len(chunk)
+            chunk = []
+
+    if chunk:
+        write_chunk(chunk)
+        written += len(chunk)
+    return written
+
+
+def update_seat_state_after_import(seat_readings):
+    """
+    Function that applies the last imported reading of every seat sensor to the seat state, when it is newer than the
+    last flip of the sensor, and recounts the running counters.
+
+    Parameters:
+    - seat_readings: A dictionary with per (area_id, sensor_id) the (timestamp, occupied) of the last imported reading.
+    """
+    for (area_id, sensor_id), (timestamp, occupied) in seat_readings.items():
+        if sensor_id not in AREAS[area_id]['seat_sensors']:
+            continue
+        db.session.execute(sqlite_insert(SeatState).values(
+            area_id=area_id, sensor_id=sensor_id, occupied=occupied, changed_at=timestamp).on_conflict_do_update(
+            index_elements=['area_id', 'sensor_id'], set_={'occupied': occupied, 'changed_at': timestamp},
+            where=SeatState.changed_at <= timestamp))
+    recount_seat_counters()
+
+
+def import_readings(model, import_file, file_format, chunk_rows=IMPORT_CHUNK_ROWS):
+    """
+    Function that imports the readings of a file into a table, keeping their original timestamps.
+
+    Customs Area readings are written while the file is read. Waiting Area readings are first read into memory and
+    sorted, because taken_seats follows from replaying the seat state in timestamp order. Afterwards the rollups of the
+    imported days are rebuilt, the seat state takes the imported readings that are newer than its state and the customs
+    estimator of the imported areas is calculated again.
+
+    Parameters:
+    - model: The database model the readings are imported into (WaitingArea or CustomsArea).
+    - import_file: The opened text file.
+    - file_format: "ndjson" or "csv".
+    - chunk_rows: The number of rows per transaction.
+
+    Returns:
+    - A dictionary with the number of imported and rejected readings and the first rejections.
+    """
+    rejected = []
+    first_timestamp = last_timestamp = None
+    area_ids = set()
+
+    def valid_readings():
+        nonlocal first_timestamp, last_timestamp
+        for line_number, reading in read_import_file(import_file, file_format):
+            try:
+                if reading is None:
+                    raise ValueError("Invalid JSON format")
+                parsed = parse_import_reading(model, reading)
+            except KeyError as error:
+                rejected.append((line_number, f'Missing field {error}'))
+                continue
+            except (TypeError, ValueError) as error:
+                rejected.append((line_number, str(error)))
+                continue
+
+            timestamp = parsed['timestamp'] if model is CustomsArea else parsed[0]
+            area_ids.add(parsed['area_id'] if model is CustomsArea else parsed[1])
+            first_timestamp = timestamp if first_timestamp is None else min(first_timestamp, timestamp)
+            last_timestamp = timestamp if last_timestamp is None else max(last_timestamp, timestamp)
+            yield parsed
+
+    if model is CustomsArea:
+        columns = IMPORT_COLUMNS[CustomsArea]
+        imported = write_import_rows(
+            model, (tuple(row[column] for column in columns) for row in valid_readings()), chunk_rows)
+    else:
+        readings = sorted(valid_readings(), key=lambda reading: reading[0])
+        imported = write_import_rows(model, replay_seat_state(readings), chunk_rows)
+
+        # Last imported reading of every seat sensor
+        seat_readings = {}
+        for timestamp, area_id, sensor_id, status in readings:
+            seat_readings[(area_id, sensor_id)] = (timestamp, status == SEAT_OCCUPIED_STATUS)
+        update_seat_state_after_import(seat_readings)
+
+    # Rebuild the rollups of every imported day. The server processes drop their cached past ranges because the import
+    # raised the past data version, the response cache of this process is cleared as well.
+    if imported:
+        rebuild_rollups(model, first_timestamp, last_timestamp + timedelta(days=1))
+
+    # The estimator only sees the readings of the ingest routes, so it replays the readings of the imported areas
+    if imported and model is CustomsArea:
+        replay_customs_estimates(area_ids)
+        db.session.commit()
+
+    return {'imported': imported, 'rejected': len(rejected), 'rejections': rejected[:20]}
+
+
+@app.cli.command('import-readings')
+@click.argument('import_file', type=click.File('r', encoding='utf-8'))
+@click.option('--table', type=click.Choice(['waiting_area', 'customs_area']), required=True,
+              help='The table the readings are imported into.')
+@click.option('--format', 'file_format', type=click.Choice(['ndjson', 'csv']), default=None,
+              help='The format of the file, by default taken from the file extension.')
+@click.option('--chunk-rows', type=int, default=IMPORT_CHUNK_ROWS, show_default=True,
+              help='Readings written per transaction.')
+def import_readings_command(import_file, table, file_format, chunk_rows):
+    """
+    Import buffered or historical readings from an NDJSON or CSV file, with their original timestamps.
+    """
+    if file_format is None:
+        file_format = 'csv' if import_file.name.lower().endswith('.csv') else 'ndjson'
+    model = WaitingArea if table == 'waiting_area' else CustomsArea
+
+    start = time.perf_counter()
+    result = import_readings(model, import_file, file_format, chunk_rows)
+    elapsed = time.perf_counter() - start
+
+    print(f"{table}: {result['imported']} readings imported, {result['rejected']} rejected in {elapsed:.1f} s")
+    for line_number, message in result['rejections']:
+        print(f"  line {line_number}: {message}")
+
+
+################################################################################
+# APP ROUTES
+################################################################################
+
+@app.route('/')
+def main_page():
+    """
+    Function that provides a route to the "main_page". This page contains the graphs. A snapshot of the charts and
+    statistics of today is embedded in the page, so the graphs are drawn without waiting for a request. The optional
+    "area" query parameter selects the area, like on the other routes.
+    """
+    # Today runs from midnight in the timezone of the dashboard, like the timestamps of the readings
+    start_time = get_today_start()
+    end_time = start_time + timedelta(days=1)
+
+    # Without a snapshot the page loads everything with "/dashboard_snapshot"
+    initial_snapshot = None
+    try:
+        initial_snapshot = get_initial_snapshot(get_area_argument(), start_time, end_time)
+    except ValueError:
+        pass
+    except Exception as e:
+        log_event(logger, logging.ERROR, 'request_failed', exc_info=True, route='/', error=e)
+
+    # Render the dashboard.html template with the snapshot of today
+    return render_template('dashboard.html', initial_snapshot=initial_snapshot)
+
+
+@app.route('/waiting_area', methods=['POST'])
+def receive_waiting_area_data():
+    """
+    Function for receiving data on route: "/waiting_area". This function receives the data, calls other functions to perform necessary calculations, 
+    and inserts the correct data into the Waiting area database.
+    """
+    try:
+        # Receive JSON data from the request
+        data = request.json
+        log_event(logger, logging.DEBUG, 'reading_received', sampled=True, route='/waiting_area', reading=data)
+
+        # Get the current time
+        current_time = local_now()
+
+        # Validate the reading and calculate the seat data
+        new_sensor_data = build_waiting_area_row(data, current_time)
+
+        # In write-behind mode the reading is stored later by the background writer
+        if INGEST_WRITE_BEHIND:
+            return enqueue_reading(WaitingArea, new_sensor_data, 'Waiting Area')
+
+        # Add new data to the database
+        store_rows(WaitingArea, [new_sensor_data])
+
+        # Return success message
+        return jsonify({'message': 'Waiting Area data received successfully'}), 201
+
+    except ValueError as ve:
+        db.session.rollback()  # Rollback in case of error
+        log_event(logger, logging.WARNING, 'invalid_reading', sampled=True, route='/waiting_area', error=ve)
+        return jsonify({'message': 'Error processing the Waiting Area data'}), 400
+    except Exception as e:
+        db.session.rollback()  # Rollback in case of error
+        log_event(logger, logging.ERROR, 'ingest_failed', exc_info=True, route='/waiting_area', error=e)
+        return jsonify({'message': 'Error processing the Waiting Area data'}), 500
+
+
+@app.route('/customs_area', methods=['POST'])
+def receive_customs_area_data():
+    """
+    Function for receiving data on route: "/customs_area". This function receives the data, calls other functions to perform necessary calculations, 
+    and inserts the correct data into the Customs Area database.
+    """
+    try:
+        # Receive JSON data from the request
+        data = request.json
+        log_event(logger, logging.DEBUG, 'reading_received', sampled=True, route='/customs_area', reading=data)
+
+        # Get the current time
+        current_time = local_now()
+
+        # Validate the reading and create a new CustomsArea row
+        customs_area_data = build_customs_area_row(data, current_time)
+
+        # In write-behind mode the reading is stored later by the background writer
+        if INGEST_WRITE_BEHIND:
+            return enqueue_reading(CustomsArea, customs_area_data, 'Customs Area')
+
+        # Add new data to the database
+        store_rows(CustomsArea, [customs_area_data])
+
+        # Return success message
+        return jsonify({'message': 'Customs Area data received successfully'}), 201
+
+    except JSONDecodeError:
+        # Return error message for invalid JSON format
+        return jsonify({'message': 'Invalid JSON format'}), 400
+
+    except ValueError as ve:
+        # Return error message for an invalid reading
+        log_event(logger, logging.WARNING, 'invalid_reading', sampled=True, route='/customs_area', error=ve)
+        return jsonify({'message': 'Error processing the Customs Area data'}), 400
+
+    except Exception as e:
+        # Handle other exceptions and return error message
+        log_event(logger, logging.ERROR, 'ingest_failed', exc_info=True, route='/customs_area', error=e)
+        return jsonify({'message': 'Error'}), 500
+
+
+@app.route('/waiting_area/batch', methods=['POST'])
+def receive_waiting_area_batch():
+    """
+    Function for receiving a batch of readings on route: "/waiting_area/batch". The body is a JSON array or NDJSON with one
+    reading per line, in the same format as "/waiting_area". All valid readings are written in one transaction.
+    """
+    return ingest_batch(WaitingArea, build_waiting_area_row, 'Waiting Area')
+
+
+@app.route('/customs_area/batch', methods=['POST'])
+def receive_customs_area_batch():
+    """
+    Function for receiving a batch of readings on route: "/customs_area/batch". The body is a JSON array or NDJSON with one
+    reading per line, in the same format as "/customs_area". All valid readings are written in one transaction.
+    """
+    return ingest_batch(CustomsArea, build_customs_area_row, 'Customs Area')
+
+
+@app.route('/waiting_area_data')
+def waiting_area_data():
+    """
+    Route for javascript to get Waiting Area data. The optional "area" query parameter selects the area (DEFAULT_AREA when it
+    is missing), the optional "max_points" and "downsample" query parameters limit the number of points in the graph,
+    with the optional "since" cursor only readings newer than the cursor are sent. "format=compact" sends the compact
+    chart format, see build_compact_chart_data.
+    """
+    try:
+        area_id = get_area_argument()
+        max_points, mode = get_downsampling_arguments()
+        since = parse_since_cursor(1)
+        chart_format = get_chart_format_argument()
+    except ValueError as ve:
+        return jsonify({'error': str(ve)}), 400
+
+    # Answer with 304 when nothing changed since the previous request
+    start_time, end_time = get_live_window(WAITING_AREA_LIVE_WINDOW)
+    etag = make_etag(get_live_data_version(WaitingArea, area_id, start_time))
+    response = not_modified(etag)
+    if response is not None:
+        return response
+
+    # Call function to get data for the Waiting Area
+    data = get_waiting_area_data(area_id, max_points, mode, since[0] if since else None, chart_format)
+    response = jsonify(data)
+    response.set_etag(etag)
+    return response
+
+
+@app.route('/customs_area_data')
+def customs_area_data():
+    """
+    Route for javascript to get Customs Area data. The optional "area" query parameter selects the area (DEFAULT_AREA when it
+    is missing), the optional "max_points" and "downsample" query parameters limit the number of points in the graph,
+    with the optional "since" cursor only readings newer than the cursor are sent. "format=compact" sends the compact
+    chart format, see build_compact_chart_data.
+    """
+    try:
+        area_id = get_area_argument()
+        max_points, mode = get_downsampling_arguments()
+        since = parse_since_cursor(1)
+        chart_format = get_chart_format_argument()
+    except ValueError as ve:
+        return jsonify({'error': str(ve)}), 400
+
+    # Answer with 304 when nothing changed since the previous request
+    start_time, end_time = get_live_window(CUSTOMS_AREA_LIVE_WINDOW)
+    etag = make_etag(get_live_data_version(CustomsArea, area_id, start_time))
+    response = not_modified(etag)
+    if response is not None:
+        return response
+
+    # Call function to get data for the Customs Area
+    data = get_customs_area_data(area_id, max_points, mode, since[0] if since else None, chart_format)
+    response = jsonify(data)
+    response.set_etag(etag)
+    return response
+
+
+@app.route('/get_statistics', methods=['GET'])
+def get_statistics():
+    """
+    Function to send the statistics to the webpage. This function is called by our Javascript file. The optional "area"
+    query parameter selects the area, DEFAULT_AREA when it is missing.
+    """
+    try:
+        # Get the area, start_date and end_date from the query parameters
+        area_id = get_area_argument()
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+
+        # Convert start_date and end_date to datetime objects
+        start_datetime = datetime.strptime(start_date, '%Y-%m-%d')
+        # Add one day to include the end_date
+        end_datetime = datetime.strptime(
+            end_date, '%Y-%m-%d') + timedelta(days=1)
+
+        log_event(logger, logging.DEBUG, 'date_range_request', sampled=True,
+                  route=request.path, area=area_id, start=start_datetime, end=end_datetime)
+
+        # Calculate the statistics of both areas, or take them from the cache, and return them as JSON response
+        versions = ()
+        if range_includes_today(end_datetime):
+            versions = (get_data_version(WaitingArea, area_id, start_datetime),
+                        get_data_version(CustomsArea, area_id, start_datetime))
+        statistics = get_cached_response(
+            'get_statistics', area_id, start_datetime, end_datetime, (),
+            lambda: calculate_statistics(area_id, start_datetime, end_datetime), versions)
+        return jsonify(statistics)
+
+    except ValueError as ve:
+        # Handle invalid query parameters
+        log_event(logger, logging.WARNING, 'invalid_request', route='/get_statistics', error=ve)
+        return jsonify({'error': str(ve)}), 400
+
+    except Exception as e:
+        # Handle any exceptions and return an error message
+        log_event(logger, logging.ERROR, 'request_failed', exc_info=True, route='/get_statistics', error=e)
+        return jsonify({'error': 'Internal Server Error'}), 500
+
+
+################################################################################
+# FUNCTIONS AND ROUTES FOR ChartJS
+################################################################################
+
+def get_live_window(duration):
+    """
+    Function that returns the start and end time of a live chart that shows the last "duration" of data.
+    """
+    # The current time in the timezone of the dashboard, like the timestamps of the readings
+    end_time = local_now()
+    return end_time - duration, end_time
+
+
+def parse_since_cursor(number_of_ids):
+    """
+    Function that reads the optional "since" query parameter. The cursor holds the id of the last reading the client
+    already has, one id per chart separated by commas.
+
+    Returns:
+    - A list with number_of_ids ids, or None when no cursor is given.
+    """
+    since = request.args.get('since')
+    if since is None or since == '':
+        return None
+
+    ids = [int(value) for value in since.split(',')]
+    if len(ids) != number_of_ids:
+        raise ValueError(f"since must contain {number_of_ids} id(s)")
+    return ids
+
+
+def get_chart_cursor(chart_columns, since_id):
+    """
+    Function that returns the cursor of a chart, the highest id of the raw readings in it. Points from the rollups have
+    no id, so charts from the rollups have no cursor and are always sent in full.
+    """
+    if 'id' not in chart_columns:
+        return None
+    return max(chart_columns['id'], default=since_id or 0)
+
+
+def get_data_version(model, area_id, start_datetime):
+    """
+    Function that returns a cheap version of the data of an area in a range: the id of the first reading of the area in
+    the range and the highest id of the table. The version changes when a reading is added or when the first reading
+    leaves the range. The highest id is taken over all areas, because it is read from the end of the primary key, so a
+    reading in another area also changes the version.
+    """
+    first_id = db.session.execute(
+        select(model.id).where(model.area_id == area_id, model.timestamp >= start_datetime)
+        .order_by(model.timestamp).limit(1)).scalar()
+    last_id = db.session.execute(select(func.max(model.id))).scalar()
+    return f"{first_id}-{last_id}"
+
+
+def make_etag(*versions):
+    """
+    Function that builds the ETag of a response from the request URL (including the cursor) and the version of the data.
+    """
+    key = '|'.join((request.full_path,) + versions)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def not_modified(etag):
+    """
+    Function that checks the If-None-Match header of the request.
+
+    Returns:
+    - A 304 response when the client already has the response with this ETag, otherwise None. The comparison is weak,
+      so the weak ETag of a compressed response matches as well.
+    """
+    if not request.if_none_match.contains_weak(etag):
+        return None
+
+    response = app.response_class(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def get_area_argument():
+    """
+    Function that reads the optional "area" query parameter of the read routes.
+
+    Returns:
+    - The id of a configured area, DEFAULT_AREA when the parameter is missing. A ValueError is raised for an unknown area.
+    """
+    area_id = request.args.get('area') or DEFAULT_AREA
+    if area_id not in AREAS:
+        raise ValueError(f"Unknown area: {area_id}")
+    return area_id
+
+
+def get_downsampling_arguments():
+    """
+    Function that reads the optional downsampling query parameters of the chart routes.
+
+    Returns:
+    - A tuple with max_points (None when the chart is not downsampled) and the downsampling mode.
+    """
+    max_points = request.args.get('max_points')
+    mode = request.args.get('downsample', 'lttb')
+
+    if mode not in DOWNSAMPLING_MODES:
+        raise ValueError(f"downsample must be one of {', '.join(DOWNSAMPLING_MODES)}")
+
+    if max_points is None or max_points == '':
+        return None, mode
+
+    max_points = int(max_points)
+    if max_points < 3:
+        raise ValueError("max_points must be at least 3")
+    return max_points, mode
+
+
+# Datasets of the charts, every dataset is the Chart.js configuration plus the column it shows
+WAITING_AREA_LIVE_DATASETS = [
+    {'column': 'taken_seats', 'label': 'Taken Seats (Waiting Area)', 'borderColor': 'rgba(75, 192, 192, 1)',
+     'borderWidth': 1, 'backgroundColor': 'rgba(75, 192, 192, 0.9)', 'fill': False},
+    {'column': 'free_seats', 'label': 'Free Seats (Waiting Area)', 'borderColor': 'rgba(255, 99, 132, 1)',
+     'borderWidth': 1, 'backgroundColor': 'rgba(255, 99, 132, 0.9)', 'fill': False},
+    {'column': 'total_seats', 'label': 'Total Seats (Waiting Area)', 'borderColor': 'rgba(255, 0, 178, 1)',
+     'borderWidth': 1, 'backgroundColor': 'rgba(255, 0, 178, 0.9)', 'fill': False},
+    {'column': 'total_people', 'label': 'Total People (Waiting Area)', 'borderColor': 'rgba(51, 255, 51, 1)',
+     'borderWidth': 1, 'backgroundColor': 'rgba(51, 255, 51, 0.9)', 'fill': False},
+]
+
+WAITING_AREA_RANGE_DATASETS = [
+    {'column': 'taken_seats', 'label': 'Taken Seats (Waiting Area)', 'borderColor': 'rgba(75, 192, 192, 1)',
+     'borderWidth': 1, 'fill': False},
+    {'column': 'free_seats', 'label': 'Free Seats (Waiting Area)', 'borderColor': 'rgba(255, 99, 132, 1)',
+     'borderWidth': 1, 'fill': False},
+    {'column': 'total_seats', 'label': 'Total Seats (Waiting Area)', 'borderColor': 'rgba(255, 0, 178, 0.8)',
+     'borderWidth': 1, 'fill': False},
+    {'column': 'total_people', 'label': 'Total People (Waiting Area)', 'borderColor': 'rgba(51, 255, 51, 1)',
+     'borderWidth': 1, 'fill': False},
+]
+
+CUSTOMS_AREA_DATASETS = [
+    {'column': 'exit_point', 'label': 'Exit Point (Customs Area)', 'borderColor': 'rgba(255, 205, 86, 1)',
+     'borderWidth': 1, 'fill': False},
+    {'column': 'current_people_count', 'label': 'Current People Count (Customs Area)',
+     'borderColor': 'rgba(54, 162, 235, 1)', 'borderWidth': 1, 'fill': False},
+    {'column': 'entrance_point', 'label': 'Entrance Point Count (Customs Area)', 'borderColor': 'rgba(255, 99, 71, 1)',
+     'borderWidth': 1, 'fill': False},
+]
+
+
+# Chart styles by name, a compact chart only names its style and "/chart_styles" sends the styles once
+CHART_STYLES = {
+    'waiting_area_live': WAITING_AREA_LIVE_DATASETS,
+    'waiting_area_range': WAITING_AREA_RANGE_DATASETS,
+    'customs_area': CUSTOMS_AREA_DATASETS,
+}
+CHART_STYLES_ETAG = hashlib.sha1(json.dumps(CHART_STYLES, sort_keys=True).encode()).hexdigest()
+
+# Formats of the chart routes: "full" (Chart.js labels and datasets) or "compact" (numeric arrays, see
+# build_compact_chart_data)
+CHART_FORMATS = ('full', 'compact')
+
+# Timestamps of compact charts are milliseconds since this naive epoch, in the local time of the readings
+CHART_EPOCH = datetime(1970, 1, 1)
+
+
+def get_chart_format_argument():
+    """
+    Function that reads the optional "format" query parameter of the chart routes.
+
+    Returns:
+    - "full" when the parameter is missing, otherwise the requested format. A ValueError is raised for an unknown format.
+    """
+    chart_format = request.args.get('format') or 'full'
+    if chart_format not in CHART_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(CHART_FORMATS)}")
+    return chart_format
+
+
+def dataset_columns(datasets):
+    """
+    Function that returns the names of the columns shown by a list of datasets.
+    """
+    return [dataset['column'] for dataset in datasets]
+
+
+def select_chart_points(chart_columns, datasets, max_points=None, mode='lttb'):
+    """
+    Function that selects the points of a chart: every point, or at most max_points points picked by downsampling.
+
+    Returns:
+    - A tuple with the list of timestamps and a list of values per dataset.
+    """
+    timestamps = chart_columns['timestamp']
+    series = [chart_columns[dataset['column']] for dataset in datasets]
+
+    # Reduce the chart to at most max_points points
+    if max_points is not None and len(timestamps) > max_points:
+        x_values = [timestamp.timestamp() for timestamp in timestamps]
+        indices = downsample_indices(x_values, series, max_points, mode)
+        timestamps = [timestamps[index] for index in indices]
+        series = [[values[index] for index in indices] for values in series]
+    return timestamps, series
+
+
+def build_chart_data(chart_columns, datasets, max_points=None, mode='lttb'):
+    """
+    Function that turns chart columns into the labels and datasets for Chart.js. When there are more than max_points
+    points, the points to keep are selected first, so labels are only formatted for the points that are sent.
+
+    Parameters:
+    - chart_columns: A dictionary with a list per column, as returned by load_chart_columns.
+    - datasets: The datasets of the chart, see WAITING_AREA_LIVE_DATASETS.
+    - max_points: The maximum number of points in the chart, None sends every point.
+    - mode: The downsampling mode ("lttb" or "minmax").
+
+    Returns:
+    - A dictionary with "labels" and "datasets".
+    """
+    timestamps, series = select_chart_points(chart_columns, datasets, max_points, mode)
+
+    return {
+        'labels': [timestamp.strftime('%Y-%m-%d %H:%M:%S') for timestamp in timestamps],
+        'datasets': [
+            {**{key: value for key, value in dataset.items() if key != 'column'}, 'data': values}
+            for dataset, values in zip(datasets, series)
+        ],
+    }
+
+
+def build_compact_chart_data(chart_columns, style, max_points=None, mode='lttb'):
+    """
+    Function that turns chart columns into a compact chart: the name of its style (see "/chart_styles") and flat numeric
+    arrays. The timestamps are delta encoded milliseconds since CHART_EPOCH: the first timestamp, then the difference with
+    the previous one, so a client adds them up to get the timestamps.
+
+    Parameters:
+    - chart_columns: A dictionary with a list per column, as returned by load_chart_columns.
+    - style: The name of the chart style in CHART_STYLES.
+    - max_points: The maximum number of points in the chart, None sends every point.
+    - mode: The downsampling mode ("lttb" or "minmax").
+
+    Returns:
+    - A dictionary with "style", "timestamps" and "series", a list of values per dataset of the style.
+    """
+    timestamps, series = select_chart_points(chart_columns, CHART_STYLES[style], max_points, mode)
+
+    # Milliseconds since the epoch, the readings and buckets have naive timestamps
+    millisecond = timedelta(milliseconds=1)
+    milliseconds = [(timestamp - CHART_EPOCH) // millisecond for timestamp in timestamps]
+    deltas = milliseconds[:1] + [current - previous for previous, current in zip(milliseconds, milliseconds[1:])]
+    return {'style': style, 'timestamps': deltas, 'series': series}
+
+
+def build_chart(chart_columns, style, max_points=None, mode='lttb', chart_format='full'):
+    """
+    Function that builds a chart of the style in the requested format, see build_chart_data and build_compact_chart_data.
+    """
+    if chart_format == 'compact':
+        return build_compact_chart_data(chart_columns, style, max_points, mode)
+    return build_chart_data(chart_columns, CHART_STYLES[style], max_points, mode)
+
+
+def get_waiting_area_data(area_id=DEFAULT_AREA, max_points=None, mode='lttb', since_id=None, chart_format='full'):
+    """
+    Function that retrieves data for the "Waiting Area" and displays it in a graph on the web application. The data comes
+    from the live window buffer, or from the database when the buffer does not cover the last 5 minutes.
+
+    Parameters:
+    - area_id: The area to show.
+    - max_points: The maximum number of points in the graph, None sends every reading.
+    - mode: The downsampling mode used when there are more than max_points readings ("lttb" or "minmax").
+    - since_id: Only send readings with a higher id (the cursor of the previous response), None sends the whole graph.
+    - chart_format: "full" or "compact", see build_chart.
+    """
+    # Set the start time to 5 minutes before the current time
+    start_time, end_time = get_live_window(WAITING_AREA_LIVE_WINDOW)
+
+    # Take the Waiting Area data within the time frame from start_time to end_time from the live window buffer
+    waiting_area_data = load_live_chart_columns(
+        WaitingArea, area_id, start_time, end_time, dataset_columns(WAITING_AREA_LIVE_DATASETS), since_id)
+
+    # Prepare data for the graph
+    data = build_chart(waiting_area_data, 'waiting_area_live', max_points, mode, chart_format)
+
+    # Add the cursor for the next request, with "delta" the client knows whether to append or replace
+    data['cursor'] = get_chart_cursor(waiting_area_data, since_id)
+    data['delta'] = since_id is not None
+    return data
+
+
+def get_customs_area_data(area_id=DEFAULT_AREA, max_points=None, mode='lttb', since_id=None, chart_format='full'):
+    """
+    Function that retrieves data for the "Customs Area" and displays it in a graph on the web application. The data comes
+    from the live window buffer, or from the database when the buffer does not cover the last 24 hours.
+
+    Parameters:
+    - area_id: The area to show.
+    - max_points: The maximum number of points in the graph, None sends every reading.
+    - mode: The downsampling mode used when there are more than max_points readings ("lttb" or "minmax").
+    - since_id: Only send readings with a higher id (the cursor of the previous response), None sends the whole graph.
+    - chart_format: "full" or "compact", see build_chart.
+    """
+    # Set the start time to 24 hours before the current time
+    start_time, end_time = get_live_window(CUSTOMS_AREA_LIVE_WINDOW)
+
+    # Take the Customs Area data within the time frame from start_time to end_time from the live window buffer
+    customs_area_data = load_live_chart_columns(
+        CustomsArea, area_id, start_time, end_time, dataset_columns(CUSTOMS_AREA_DATASETS), since_id)
+
+    # Prepare data for the graph
+    data = build_chart(customs_area_data, 'customs_area', max_points, mode, chart_format)
+
+    # Add the cursor for the next request, with "delta" the client knows whether to append or replace
+    data['cursor'] = get_chart_cursor(customs_area_data, since_id)
+    data['delta'] = since_id is not None
+    return data
+
+
+def load_date_range_data(area_id, start_datetime, end_datetime, max_points=None, mode='lttb', since=None,
+                         chart_format='full'):
+    """
+    Function that loads the data of both charts of an area for the selected dates.
+
+    Parameters:
+    - area_id: The area to show.
+    - start_datetime: Start of the range.
+    - end_datetime: End of the range.
+    - max_points: The maximum number of points per chart, None sends every point.
+    - mode: The downsampling mode ("lttb" or "minmax").
+    - since: The cursor of the previous response (waiting area id, customs area id), None loads the whole range.
+    - chart_format: "full" or "compact", see build_chart.
+
+    Returns:
+    - A dictionary with the data of both charts, the cursor for the next request and whether the data is a delta.
+    """
+    since_waiting, since_customs = since if since is not None else (None, None)
+
+    # Load the customs area data within the specified range, long ranges come from the rollups
+    customs_area_data = load_chart_columns(
+        CustomsArea, area_id, start_datetime, end_datetime, dataset_columns(CUSTOMS_AREA_DATASETS), since_customs)
+
+    # Load the waiting area data within the specified range, long ranges come from the rollups
+    waiting_area_data = load_chart_columns(
+        WaitingArea, area_id, start_datetime, end_datetime, dataset_columns(WAITING_AREA_RANGE_DATASETS), since_waiting)
+
+    # Prepare data for both charts, reduced to at most max_points points
+    data_customs_filter_date = build_chart(
+        customs_area_data, 'customs_area', max_points, mode, chart_format)
+    data_waiting_filter_date = build_chart(
+        waiting_area_data, 'waiting_area_range', max_points, mode, chart_format)
+
+    # Cursor for the next request, None when the charts come from the rollups
+    cursor = None
+    waiting_cursor = get_chart_cursor(waiting_area_data, since_waiting)
+    customs_cursor = get_chart_cursor(customs_area_data, since_customs)
+    if waiting_cursor is not None and customs_cursor is not None:
+        cursor = f"{waiting_cursor},{customs_cursor}"
+
+    return {'waiting_area': data_waiting_filter_date, 'customs_area': data_customs_filter_date,
+            'cursor': cursor, 'delta': since is not None}
+
+
+@app.route('/get_date_range', methods=['GET'])
+def get_date_range():
+    """
+    Function that retrieves the appropriate data for the selected dates. These dates are selected on the web page and can range from a single day to multiple days/weeks/months/years, etc.
+    The optional "max_points" and "downsample" query parameters limit the number of points per chart. With the optional
+    "since" cursor ("<waiting area id>,<customs area id>") only readings newer than the cursor are sent, as long as
+    the range is short enough to be served from the raw readings. The optional "area" query parameter selects the area,
+    DEFAULT_AREA when it is missing. "format=compact" sends the compact chart format, see build_compact_chart_data.
+    """
+    try:
+        # Get the area, start_date and end_date from the query parameters
+        area_id = get_area_argument()
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+
+        # Convert start_date and end_date to datetime objects
+        start_datetime = datetime.strptime(start_date, '%Y-%m-%d')
+        # Add one day to include the end_date
+        end_datetime = datetime.strptime(
+            end_date, '%Y-%m-%d') + timedelta(days=1)
+
+        log_event(logger, logging.DEBUG, 'date_range_request', sampled=True,
+                  route=request.path, area=area_id, start=start_datetime, end=end_datetime)
+
+        # Get the optional downsampling parameters and cursor
+        max_points, mode = get_downsampling_arguments()
+        since = parse_since_cursor(2)
+        chart_format = get_chart_format_argument()
+
+        # Answer with 304 when nothing changed since the previous request
+        versions = (get_data_version(WaitingArea, area_id, start_datetime),
+                    get_data_version(CustomsArea, area_id, start_datetime))
+        etag = make_etag(*versions)
+        response = not_modified(etag)
+        if response is not None:
+            return response
+
+        # A cursor only works for raw readings, ranges served from the rollups are always sent in full
+        if since is not None and choose_chart_granularity(start_datetime, end_datetime) is None:
+            data = load_date_range_data(area_id, start_datetime, end_datetime, max_points, mode, since, chart_format)
+        else:
+            # Full responses are the same for every dashboard showing this range, so they are cached
+            data = get_cached_response(
+                'get_date_range', area_id, start_datetime, end_datetime, (max_points, mode, chart_format),
+                lambda: load_date_range_data(area_id, start_datetime, end_datetime, max_points, mode,
+                                             chart_format=chart_format), versions)
+
+        # Return the data for both charts as JSON
+        response = jsonify(data)
+        response.set_etag(etag)
+        return response
+
+    except ValueError as ve:
+        # Handle invalid query parameters
+        log_event(logger, logging.WARNING, 'invalid_request', route='/get_date_range', error=ve)
+        return jsonify({'error': str(ve)}), 400
+
+    except Exception as e:
+        # Handle any exceptions and return an error message
+        log_event(logger, logging.ERROR, 'request_failed', exc_info=True, route='/get_date_range', error=e)
+        return jsonify({'error': 'Internal Server Error'}), 500
+
+
+@app.route('/chart_styles')
+def chart_styles():
+    """
+    Route that returns the Chart.js configuration of every dataset of every chart style, with the column it shows. The
+    styles only change with a new version of the dashboard, so browsers cache them for CHART_STYLES_MAX_AGE seconds.
+    """
+    response = not_modified(CHART_STYLES_ETAG)
+    if response is None:
+        response = jsonify(CHART_STYLES)
+        response.set_etag(CHART_STYLES_ETAG)
+    response.cache_control.public = True
+    response.cache_control.max_age = CHART_STYLES_MAX_AGE
+    return response
+
+
+@app.route('/cache_stats')
+def cache_stats():
+    """
+    Route that returns the hit and miss counters of the response cache.
+    """
+    return jsonify(response_cache.stats())
+
+
+@app.route('/metrics')
+def metrics():
+    """
+    Route that returns the metrics of this process in the Prometheus text exposition format.
+    """
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+################################################################################
+# FUNCTIONS LIVE WINDOW BUFFERS
+################################################################################
+
+# Timestamps are kept in the buffers as microseconds since this naive epoch
+LIVE_BUFFER_EPOCH = datetime(1970, 1, 1)
+
+
+def to_buffer_timestamp(timestamp):
+    """
+    Function that turns a timestamp into microseconds since LIVE_BUFFER_EPOCH. Like in the database the timezone of an
+    aware timestamp is ignored.
+    """
+    return (timestamp.replace(tzinfo=None) - LIVE_BUFFER_EPOCH) // timedelta(microseconds=1)
+
+
+class LiveWindowBuffer:
+    """
+    Fixed size ring buffer with the latest readings of one area of a table. Every column is an array of 64-bit integers
+    that is allocated once: the ids, the timestamps in microseconds and one array per chart column. When the buffer is
+    full the oldest reading is overwritten.
+
+    The buffer knows up to which timestamp it is complete: every synced reading (see sync_live_buffers) that is newer
+    than complete_after is in the buffer. A window that starts later is served from the buffer, otherwise the caller falls
+    back to the database.
+    """
+
+    def __init__(self, columns, capacity):
+        self.columns = tuple(columns)
+        self.capacity = capacity
+        self.ids = array.array('q', bytes(8 * capacity))
+        self.timestamps = array.array('q', bytes(8 * capacity))
+        self.values = {column: array.array('q', bytes(8 * capacity)) for column in self.columns}
+        # 1 for every reading that was older than the newest reading when it was added
+        self.out_of_order = bytearray(capacity)
+        self.number_out_of_order = 0
+        self.head = 0
+        self.size = 0
+        self.newest_timestamp = None
+        self.last_id = 0
+        self.complete_after = None
+        self.lock = threading.Lock()
+
+    def slot(self, index):
+        """
+        Function that returns the position in the arrays of the index-th oldest reading.
+        """
+        return (self.head - self.size + index) % self.capacity
+
+    def append(self, reading_id, timestamp, row):
+        """
+        Function that adds a stored reading to the buffer, overwriting the oldest reading when the buffer is full.
+
+        Parameters:
+        - reading_id: The id of the reading in the database.
+        - timestamp: The timestamp of the reading in microseconds, see to_buffer_timestamp.
+        - row: A dictionary with the column values of the reading.
+        """
+        with self.lock:
+            # Readings from before the complete part of the buffer are never read, for example a late gateway upload
+            if self.complete_after is None or timestamp <= self.complete_after:
+                return
+
+            slot = self.head
+            if self.size == self.capacity:
+                self.complete_after = max(self.complete_after, self.timestamps[slot])
+                self.number_out_of_order -= self.out_of_order[slot]
+            else:
+                self.size += 1
+
+            out_of_order = self.newest_timestamp is not None and timestamp < self.newest_timestamp
+            self.out_of_order[slot] = out_of_order
+            self.number_out_of_order += out_of_order
+            self.newest_timestamp = timestamp if not out_of_order else self.newest_timestamp
+
+            self.ids[slot] = reading_id
+            self.timestamps[slot] = timestamp
+            for column in self.columns:
+                self.values[column][slot] = row[column]
+            self.last_id = max(self.last_id, reading_id)
+            self.head = (slot + 1) % self.capacity
+
+    def fill(self, chart_columns, complete_after):
+        """
+        Function that replaces the content of the buffer with readings loaded from the database, sorted on timestamp.
+
+        Parameters:
+        - chart_columns: A dictionary with a list per column, as returned by load_chart_columns.
+        - complete_after: The timestamp in microseconds after which the loaded readings are complete.
+        """
+        with self.lock:
+            self.head = self.size = self.number_out_of_order = 0
+            self.newest_timestamp = None
+            self.last_id = 0
+            self.complete_after = complete_after
+        for index, reading_id in enumerate(chart_columns['id']):
+            row = {column: chart_columns[column][index] for column in self.columns}
+            self.append(reading_id, to_buffer_timestamp(chart_columns['timestamp'][index]), row)
+
+    def ring_slice(self, column, first, last):
+        """
+        Function that copies the readings first up to last (oldest first) of a column of the buffer.
+        """
+        start = self.slot(first)
+        end = start + last - first
+        if end <= self.capacity:
+            return column[start:end]
+        return column[start:] + column[:end - self.capacity]
+
+    def find_window(self, start, end):
+        """
+        Function that returns the indices (oldest first) of the first reading and the reading after the last one that can
+        be in the window. When the buffer is sorted on timestamp this is found by bisection, otherwise it is the whole
+        buffer. Called with the lock held.
+        """
+        if self.number_out_of_order:
+            return 0, self.size
+
+        def timestamp_at(index):
+            return self.timestamps[self.slot(index)]
+        return (bisect.bisect_left(range(self.size), start, key=timestamp_at),
+                bisect.bisect_right(range(self.size), end, key=timestamp_at))
+
+    def read(self, start_datetime, end_datetime, since_id=None):
+        """
+        Function that returns the readings of a window, sorted on timestamp. Only the readings that can be in the window are
+        copied while the lock is held, they are filtered and converted afterwards.
+
+        Parameters:
+        - start_datetime: Start of the window.
+        - end_datetime: End of the window.
+        - since_id: Only return readings with a higher id.
+
+        Returns:
+        - A dictionary with a list per column like load_chart_columns, or None when the buffer does not cover the window.
+        """
+        start, end = to_buffer_timestamp(start_datetime), to_buffer_timestamp(end_datetime)
+        with self.lock:
+            if self.complete_after is None or start <= self.complete_after:
+                return None
+            first, last = self.find_window(start, end)
+            ids = self.ring_slice(self.ids, first, last)
+            timestamps = self.ring_slice(self.timestamps, first, last)
+            values = {column: self.ring_slice(self.values[column], first, last) for column in self.columns}
+            sort = self.number_out_of_order > 0
+
+        indices = [index for index in range(len(ids)) if start <= timestamps[index] <= end and
+                   (since_id is None or ids[index] > since_id)]
+        if sort:
+            indices.sort(key=timestamps.__getitem__)
+
+        chart_columns = {
+            'id': [ids[index] for index in indices],
+            'timestamp': [LIVE_BUFFER_EPOCH + timedelta(microseconds=timestamps[index]) for index in indices],
+        }
+        for column in self.columns:
+            chart_columns[column] = [values[column][index] for index in indices]
+        return chart_columns
+
+    def version(self, start_datetime):
+        """
+        Function that returns the version of the readings in a window, in the same form as get_data_version: the id of
+        the first reading in the window and the highest id in the buffer.
+
+        Returns:
+        - The version, or None when the buffer does not cover the window.
+        """
+        start = to_buffer_timestamp(start_datetime)
+        with self.lock:
+            if self.complete_after is None or start <= self.complete_after:
+                return None
+
+            if self.number_out_of_order:
+                # The first reading in the window has to be searched for when the buffer is not sorted
+                in_window = [(self.timestamps[self.slot(index)], self.ids[self.slot(index)])
+                             for index in range(self.size) if self.timestamps[self.slot(index)] >= start]
+                first_id = min(in_window)[1] if in_window else None
+            else:
+                first = bisect.bisect_left(range(self.size), start, key=lambda index: self.timestamps[self.slot(index)])
+                first_id = self.ids[self.slot(first)] if first < self.size else None
+            return f"{first_id}-{self.last_id}"
+
+
+# The live window and the buffer of every table, with a buffer per area
+LIVE_BUFFER_TABLES = {
+    WaitingArea: (WAITING_AREA_LIVE_WINDOW, WAITING_AREA_LIVE_DATASETS, WAITING_AREA_LIVE_BUFFER_ROWS),
+    CustomsArea: (CUSTOMS_AREA_LIVE_WINDOW, CUSTOMS_AREA_DATASETS, CUSTOMS_AREA_LIVE_BUFFER_ROWS),
+}
+
+live_buffers = {
+    (model, area_id): LiveWindowBuffer(dataset_columns(datasets), capacity)
+    for model, (window, datasets, capacity) in LIVE_BUFFER_TABLES.items() for area_id in AREAS
+} if LIVE_BUFFER_ENABLED else {}
+
+# Per table the id up to which every reading in the database was added to the buffers, and the ids above it that this
+# process added itself, so the readings of other processes can be caught up without adding a reading twice
+live_buffer_synced_ids = {}
+live_buffer_own_ids = {model: set() for model in LIVE_BUFFER_TABLES}
+live_buffer_sync_lock = threading.Lock()
+
+
+def get_max_id(model):
+    """
+    Function that returns the highest id of a table, a lookup of the last row of the primary key. 0 for an empty table.
+    """
+    return db.session.execute(select(func.max(model.id))).scalar() or 0
+
+
+def warm_up_live_buffers():
+    """
+    Function that fills the live window buffers with the readings of the live windows from the database. Called on
+    startup, afterwards the buffers are kept up to date by store_rows and sync_live_buffers.
+    """
+    with live_buffer_sync_lock:
+        for model in LIVE_BUFFER_TABLES:
+            if live_buffers:
+                warm_up_live_table(model)
+
+
+def warm_up_live_table(model):
+    """
+    Function that fills the live window buffers of all areas of a table from the database. Called with
+    live_buffer_sync_lock held.
+
+    Parameters:
+    - model: The database model of the buffers (WaitingArea or CustomsArea).
+    """
+    window, datasets, capacity = LIVE_BUFFER_TABLES[model]
+    start_time, end_time = get_live_window(window)
+    # Only the readings up to the current highest id are loaded, newer readings are caught up by sync_live_buffers
+    synced_id = get_max_id(model)
+    for area_id in AREAS:
+        # Load the newest readings of the window plus one, to know whether they all fit in the buffer. Readings slightly
+        # in the future are kept as well, so the end of the window is left open.
+        columns = ['id', 'timestamp'] + dataset_columns(datasets)
+        rows = db.session.execute(
+            select(*[getattr(model, column) for column in columns])
+            .where(model.area_id == area_id, model.timestamp >= start_time, model.id <= synced_id)
+            .order_by(model.timestamp.desc()).limit(capacity + 1)).all()
+
+        # The buffer is complete after the start of the window, or after the reading that did not fit
+        complete_after = to_buffer_timestamp(start_time) - 1
+        if len(rows) > capacity:
+            complete_after = to_buffer_timestamp(rows.pop().timestamp)
+        chart_columns = rows_to_columns(rows[::-1], columns)
+        live_buffers[(model, area_id)].fill(chart_columns, complete_after)
+    live_buffer_synced_ids[model] = synced_id
+    live_buffer_own_ids[model].clear()
+
+
+def sync_live_buffers(model):
+    """
+    Function that adds the readings other processes (other workers, import-readings, external writers) stored since the
+    last sync to the live window buffers of a table. The highest id of the table is compared with the synced id on every
+    read, so the buffers are never behind the database. When more readings are missing than the buffers can hold, the
+    buffers are filled again from the database.
+
+    Parameters:
+    - model: The database model of the buffers (WaitingArea or CustomsArea).
+    """
+    max_id = get_max_id(model)
+    with live_buffer_sync_lock:
+        synced_id = live_buffer_synced_ids[model]
+        if max_id <= synced_id:
+            return
+        window, datasets, capacity = LIVE_BUFFER_TABLES[model]
+        if max_id - synced_id > capacity * len(AREAS):
+            warm_up_live_table(model)
+            return
+
+        # Load the missing readings by id and skip the readings this process added itself
+        columns = ['id', 'timestamp', 'area_id'] + dataset_columns(datasets)
+        rows = db.session.execute(
+            select(*[getattr(model, column) for column in columns])
+            .where(model.id > synced_id, model.id <= max_id).order_by(model.id)).all()
+        own_ids = live_buffer_own_ids[model]
+        for row in rows:
+            if row.id not in own_ids and row.area_id in AREAS:
+                live_buffers[(model, row.area_id)].append(row.id, to_buffer_timestamp(row.timestamp), row._mapping)
+        live_buffer_synced_ids[model] = max_id
+        live_buffer_own_ids[model] = {reading_id for reading_id in own_ids if reading_id > max_id}
+
+
+def append_live_readings(model, ids, rows):
+    """
+    Function that adds stored readings to the live window buffers of their areas.
+
+    Parameters:
+    - model: The database model the readings were written to (WaitingArea or CustomsArea).
+    - ids: The ids of the stored readings, in the same order as rows.
+    - rows: A list of dictionaries with the column values of the stored readings.
+    """
+    if not live_buffers:
+        return
+    with live_buffer_sync_lock:
+        synced_id = live_buffer_synced_ids[model]
+        for reading_id, row in zip(ids, rows):
+            # A reading up to the synced id was already caught up by sync_live_buffers
+            if reading_id <= synced_id:
+                continue
+            live_buffer_own_ids[model].add(reading_id)
+            live_buffers[(model, row['area_id'])].append(reading_id, to_buffer_timestamp(row['timestamp']), row)
+
+
+def load_live_chart_columns(model, area_id, start_datetime, end_datetime, columns, since_id=None):
+    """
+    Function that loads the chart data of a live window from the live window buffer of the area, or from the database
+    with load_chart_columns when the buffers are disabled or do not cover the window.
+    """
+    buffer = live_buffers.get((model, area_id))
+    if buffer is not None:
+        sync_live_buffers(model)
+    chart_columns = buffer.read(start_datetime, end_datetime, since_id) if buffer is not None else None
+    if chart_columns is None:
+        return load_chart_columns(model, area_id, start_datetime, end_datetime, columns, since_id)
+    return chart_columns
+
+
+def get_live_data_version(model, area_id, start_datetime):
+    """
+    Function that returns the version of the data of a live window from the live window buffer of the area, or from the
+    database with get_data_version when the buffer does not cover the window.
+    """
+    buffer = live_buffers.get((model, area_id))
+    if buffer is not None:
+        sync_live_buffers(model)
+    version = buffer.version(start_datetime) if buffer is not None else None
+    if version is None:
+        return get_data_version(model, area_id, start_datetime)
+    return version
+
+
+with app.app_context():
+    warm_up_live_buffers()
+
+
+################################################################################
+# FUNCTIONS AND ROUTES FOR ANALYTICS
+################################################################################
+
+def to_epoch_seconds(timestamp):
+    """
+    Function that turns a timestamp into seconds since LIVE_BUFFER_EPOCH, like the timestamps of the analytics arrays.
+    """
+    return (timestamp.replace(tzinfo=None) - LIVE_BUFFER_EPOCH).total_seconds()
+
+
+def load_bucket_series(model, area_id, start_datetime, end_datetime, hours=None):
+    """
+    Function that loads the metric of an area in a range as a BucketSeries from the integrals of the minute rollup
+    buckets, so the cost depends on the length of the range instead of the number of readings. Hour buckets would be
+    cheaper, but their means flatten the percentiles. The buckets are read with the sqlite3 cursor of the session and
+    SQLite returns the bucket starts as seconds, so the rows go straight into a NumPy array.
+
+    Parameters:
+    - model: The database model of the readings (WaitingArea or CustomsArea).
+    - area_id: The area of the readings.
+    - start_datetime: Start of the range.
+    - end_datetime: End of the range.
+    - hours: The selected hours of the day, see daily_window_seconds.
+
+    Returns:
+    - The BucketSeries of the metric.
+    """
+    name, metric, minimum, maximum = ANALYTICS_METRICS[model]
+    rollup_model = ROLLUP_MODELS[model]
+    end = end_datetime.isoformat(' ', 'microseconds')
+
+    # The buckets that overlap the range, served by the (area_id, granularity, bucket_start) index
+    first_bucket = truncate_timestamp(start_datetime, 'minute').isoformat(' ', 'microseconds')
+    connection = db.session.connection().connection.driver_connection
+    rows = connection.execute(
+        f"SELECT (julianday(bucket_start) - 2440587.5) * 86400.0, analytics_value_seconds_sum, "
+        f"analytics_held_seconds_sum, {minimum}, {maximum} FROM {rollup_model.__tablename__} "
+        f"WHERE area_id = ? AND granularity = ? AND bucket_start >= ? AND bucket_start < ?",
+        (area_id, 'minute', first_bucket, end)).fetchall()
+    buckets = np.array(rows, dtype=float).reshape(-1, 5)
+    return BucketSeries(buckets[:, 0], buckets[:, 1], buckets[:, 2], buckets[:, 3], buckets[:, 4],
+                        ROLLUP_BUCKET_SIZES['minute'].total_seconds(), to_epoch_seconds(start_datetime),
+                        to_epoch_seconds(end_datetime), hours)
+
+
+def to_json_value(value, digits=2):
+    """
+    Function that rounds a value for a JSON response, None and NaN become None.
+    """
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def to_json_values(values, digits=2):
+    """
+    Function that rounds the values of an array for a JSON response, NaN becomes None.
+    """
+    return [to_json_value(value, digits) for value in values]
+
+
+def calculate_analytics(model, area_id, start_datetime, end_datetime, hours, percentiles, window_minutes, max_points):
+    """
+    Function that calculates the time-weighted analytics of the metric of an area in a range from the rollup buckets
+    (see load_bucket_series). The percentiles are those of the mean values of the minute buckets.
+
+    Parameters:
+    - model: The database model of the readings (WaitingArea or CustomsArea).
+    - area_id: The area of the readings.
+    - start_datetime: Start of the range.
+    - end_datetime: End of the range, a range that includes today ends now.
+    - hours: The selected hours of the day, see daily_window_seconds.
+    - percentiles: The percentiles to calculate.
+    - window_minutes: The window of the moving average in minutes.
+    - max_points: The number of points of the moving average.
+
+    Returns:
+    - A dictionary with the metric, the time with data, the mean, minimum, maximum and percentiles, the moving average and
+      the hour of the day and day of the week profiles.
+    """
+    end_datetime = min(end_datetime, local_now())
+    series = load_bucket_series(model, area_id, start_datetime, end_datetime, hours)
+
+    # Points of the moving average, spread evenly over the range
+    start, end = to_epoch_seconds(start_datetime), to_epoch_seconds(end_datetime)
+    points = np.linspace(start + (end - start) / max_points, end, max_points) if end > start else np.zeros(0)
+    moving_average = series.moving_average(points, window_minutes * 60)
+
+    minimum, maximum = series.extremes()
+    return {
+        'metric': ANALYTICS_METRICS[model][0],
+        'held_seconds': round(series.held_seconds()),
+        'mean': to_json_value(series.mean()),
+        'min': to_json_value(minimum),
+        'max': to_json_value(maximum),
+        'percentiles': {f'p{percentile:g}': to_json_value(value)
+                        for percentile, value in zip(percentiles, series.percentiles(percentiles))},
+        'moving_average': {
+            'window_minutes': window_minutes,
+            'labels': [(LIVE_BUFFER_EPOCH + timedelta(seconds=float(point))).strftime('%Y-%m-%d %H:%M:%S')
+                       for point in points],
+            'data': to_json_values(moving_average),
+        },
+        **{profile: to_json_values(series.profile(profile)) for profile in PROFILES},
+    }
+
+
+def get_analytics_arguments():
+    """
+    Function that reads the optional query parameters of "/analytics".
+
+    Returns:
+    - A tuple with the hours of the day (None for the whole day), the percentiles, the window of the moving average in
+      minutes and the number of points of the moving average. A ValueError is raised for an invalid parameter.
+    """
+    hours = request.args.get('hours')
+    if hours:
+        first_hour, last_hour = (int(hour) for hour in hours.split('-'))
+        if not (0 <= first_hour <= 24 and 0 <= last_hour <= 24) or first_hour == last_hour:
+            raise ValueError("hours must be two different hours between 0 and 24, for example 6-9")
+        hours = (first_hour, last_hour)
+    else:
+        hours = None
+
+    percentiles = request.args.get('percentiles')
+    percentiles = tuple(float(value) for value in percentiles.split(',')) if percentiles else ANALYTICS_PERCENTILES
+    if not all(0 <= percentile <= 100 for percentile in percentiles):
+        raise ValueError("percentiles must be between 0 and 100")
+
+    window_minutes = int(request.args.get('window', ANALYTICS_WINDOW_MINUTES))
+    max_points = int(request.args.get('max_points', ANALYTICS_MAX_POINTS))
+    if window_minutes < 1:
+        raise ValueError("window must be at least 1 minute")
+    if not 1 <= max_points <= 10000:
+        raise ValueError("max_points must be between 1 and 10000")
+    return hours, percentiles, window_minutes, max_points
+
+
+@app.route('/analytics')
+def analytics():
+    """
+    Route that returns time-weighted analytics of the Waiting Area occupancy and the number of people in the Customs
+    Area: every value counts for the time it was held instead of once per reading. The "area", "start_date" and
+    "end_date" query parameters work like on "/get_statistics". Optional: "hours" limits the analytics to some hours of
+    the day (for example 6-9, the last hour not included), "percentiles" (for example 50,95), "window" (minutes of the
+    moving average) and "max_points" (points of the moving average).
+    """
+    try:
+        area_id = get_area_argument()
+        start_datetime = datetime.strptime(request.args.get('start_date', ''), '%Y-%m-%d')
+        end_datetime = datetime.strptime(request.args.get('end_date', ''), '%Y-%m-%d') + timedelta(days=1)
+        hours, percentiles, window_minutes, max_points = get_analytics_arguments()
+    except ValueError as ve:
+        log_event(logger, logging.WARNING, 'invalid_request', route='/analytics', error=ve)
+        return jsonify({'error': str(ve)}), 400
+
+    try:
+        def compute():
+            return {
+                'area': area_id,
+                'hours': hours,
+                **{model.__tablename__: calculate_analytics(model, area_id, start_datetime, end_datetime, hours,
+                                                            percentiles, window_minutes, max_points)
+                   for model in ANALYTICS_METRICS},
+            }
+
+        # Calculate the analytics of both areas, or take them from the cache
+        versions = ()
+        if range_includes_today(end_datetime):
+            versions = tuple(get_data_version(model, area_id, start_datetime) for model in ANALYTICS_METRICS)
+        return jsonify(get_cached_response(
+            'analytics', area_id, start_datetime, end_datetime, (hours, percentiles, window_minutes, max_points),
+            compute, versions))
+
+    except Exception as e:
+        log_event(logger, logging.ERROR, 'request_failed', exc_info=True, route='/analytics', error=e)
+        return jsonify({'error': 'Internal Server Error'}), 500
+
+
+################################################################################
+# FUNCTIONS AND ROUTES FOR DASHBOARD SNAPSHOT
+################################################################################
+
+def build_dashboard_snapshot(area_id, start_datetime, end_datetime, max_points=None, mode='lttb', chart_format='full'):
+    """
+    Function that builds the charts and statistics of the selected dates of an area. Every table is read once for the
+    chart, from the raw readings or a rollup, and the statistics add up the few rollup buckets that cover the range, so
+    no reading is read twice.
+
+    Returns:
+    - A dictionary like the response of "/get_date_range", plus "statistics" like the response of "/get_statistics".
+    """
+    snapshot = load_date_range_data(area_id, start_datetime, end_datetime, max_points, mode, chart_format=chart_format)
+    snapshot['statistics'] = calculate_statistics(area_id, start_datetime, end_datetime)
+    return snapshot
+
+
+def build_initial_snapshot(area_id, start_datetime, end_datetime, max_points=DASHBOARD_MAX_POINTS):
+    """
+    Function that builds the snapshot that is embedded in the dashboard page. The charts come from the minute rollups
+    instead of the raw readings, so the page costs the same however many readings arrived today: at most 1440 buckets
+    per chart and a few buckets for the statistics. The Waiting Area chart has the style of the live chart, like the
+    charts that are created on page load.
+
+    The cursor holds the highest ids of the tables, read before the rollups, so the page continues with the readings
+    stored after the snapshot instead of loading the range again. A reading stored in between can show twice until the
+    page reloads the range.
+
+    Returns:
+    - A dictionary like the response of "/dashboard_snapshot", without "live", plus the "date" of the snapshot.
+    """
+    cursor = f"{get_max_id(WaitingArea)},{get_max_id(CustomsArea)}"
+    waiting_area_data = load_rollup_columns(WaitingArea, area_id, 'minute', start_datetime, end_datetime,
+                                            dataset_columns(WAITING_AREA_LIVE_DATASETS))
+    customs_area_data = load_rollup_columns(CustomsArea, area_id, 'minute', start_datetime, end_datetime,
+                                            dataset_columns(CUSTOMS_AREA_DATASETS))
+    return {
+        'waiting_area': build_chart(waiting_area_data, 'waiting_area_live', max_points),
+        'customs_area': build_chart(customs_area_data, 'customs_area', max_points),
+        'cursor': cursor,
+        'delta': False,
+        'statistics': calculate_statistics(area_id, start_datetime, end_datetime),
+        'date': start_datetime.strftime('%Y-%m-%d'),
+    }
+
+
+def get_initial_snapshot(area_id, start_datetime, end_datetime):
+    """
+    Function that returns the snapshot of the dashboard page from the response cache, or builds and caches it.
+    """
+    versions = (get_data_version(WaitingArea, area_id, start_datetime),
+                get_data_version(CustomsArea, area_id, start_datetime))
+    return get_cached_response(
+        'main_page', area_id, start_datetime, end_datetime, (DASHBOARD_MAX_POINTS,),
+        lambda: build_initial_snapshot(area_id, start_datetime, end_datetime), versions)
+
+
+@app.route('/dashboard_snapshot')
+def dashboard_snapshot():
+    """
+    Route that returns everything the dashboard shows for the selected dates in one response: the charts of the range
+    and the cursor like "/get_date_range", the statistics like "/get_statistics" under "statistics", and the live charts
+    like "/waiting_area_data" and "/customs_area_data" under "live". The versions of the range are looked up once for
+    the whole snapshot and the live charts come from the live window buffers. The query parameters are the same as on
+    "/get_date_range", without "since".
+    """
+    try:
+        area_id = get_area_argument()
+        start_datetime = datetime.strptime(request.args.get('start_date', ''), '%Y-%m-%d')
+        end_datetime = datetime.strptime(request.args.get('end_date', ''), '%Y-%m-%d') + timedelta(days=1)
+        max_points, mode = get_downsampling_arguments()
+        chart_format = get_chart_format_argument()
+    except ValueError as ve:
+        log_event(logger, logging.WARNING, 'invalid_request', route='/dashboard_snapshot', error=ve)
+        return jsonify({'error': str(ve)}), 400
+
+    try:
+        log_event(logger, logging.DEBUG, 'date_range_request', sampled=True,
+                  route=request.path, area=area_id, start=start_datetime, end=end_datetime)
+
+        # Answer with 304 when neither the range nor the live windows changed since the previous request
+        versions = (get_data_version(WaitingArea, area_id, start_datetime),
+                    get_data_version(CustomsArea, area_id, start_datetime))
+        live_versions = tuple(get_live_data_version(model, area_id, get_live_window(window)[0])
+                              for model, window in ((WaitingArea, WAITING_AREA_LIVE_WINDOW),
+                                                    (CustomsArea, CUSTOMS_AREA_LIVE_WINDOW)))
+        etag = make_etag(*versions, *live_versions)
+        response = not_modified(etag)
+        if response is not None:
+            return response
+
+        # The range part is the same for every dashboard showing this range, so it is cached
+        snapshot = dict(get_cached_response(
+            'dashboard_snapshot', area_id, start_datetime, end_datetime, (max_points, mode, chart_format),
+            lambda: build_dashboard_snapshot(area_id, start_datetime, end_datetime, max_points, mode, chart_format),
+            versions))
+        snapshot['live'] = {
+            'waiting_area': get_waiting_area_data(area_id, max_points, mode, chart_format=chart_format),
+            'customs_area': get_customs_area_data(area_id, max_points, mode, chart_format=chart_format),
+        }
+
+        response = jsonify(snapshot)
+        response.set_etag(etag)
+        return response
+
+    except Exception as e:
+        log_event(logger, logging.ERROR, 'request_failed', exc_info=True, route='/dashboard_snapshot', error=e)
+        return jsonify({'error': 'Internal Server Error'}), 500
+
+
+################################################################################
+# FUNCTIONS AND ROUTES FOR LIVE STREAM
+################################################################################
+
+class StreamClient:
+    """
+    Bounded event buffer of a single client of "/stream". A client that does not keep up and fills its buffer is
+    closed, so a slow screen can never hold back ingest or the other screens.
+    """
+
+    def __init__(self, buffer_size, area_id):
+        self.area_id = area_id
+        self.events = collections.deque()
+        self.buffer_size = buffer_size
+        self.condition = threading.Condition()
+        self.closed = False
+
+    def push(self, event):
+        """
+        Function that adds an event to the buffer.
+
+        Returns:
+        - False when the client is closed, either before or because its buffer is full.
+        """
+        with self.condition:
+            if self.closed:
+                return False
+            if len(self.events) >= self.buffer_size:
+                # Slow client: drop its buffer and let the stream end, the browser reconnects and catches up
+                self.events.clear()
+                self.closed = True
+                self.condition.notify()
+                return False
+            self.events.append(event)
+            self.condition.notify()
+            return True
+
+    def pop(self, timeout):
+        """
+        Function that waits at most timeout seconds for the next event.
+
+        Returns:
+        - The next event, or None when there was no event in time or the client is closed.
+        """
+        with self.condition:
+            if not self.events and not self.closed:
+                self.condition.wait(timeout)
+            if self.events:
+                return self.events.popleft()
+            return None
+
+    def close(self):
+        """
+        Function that closes the client, its stream ends after the next pop.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+
+class EventHub:
+    """
+    In-process fan-out of ingest events to every connected "/stream" client. Every event is serialized once and then
+    put in the buffer of every client.
+    """
+
+    def __init__(self, buffer_size, max_clients):
+        self.buffer_size = buffer_size
+        self.max_clients = max_clients
+        self.clients = set()
+        self.lock = threading.Lock()
+        self.evicted = 0
+
+    def has_clients(self):
+        """
+        Function that checks whether anybody is listening, so ingest can skip building events.
+        """
+        return bool(self.clients)
+
+    def subscribe(self, area_id):
+        """
+        Function that registers a new client for the events of an area.
+
+        Returns:
+        - The StreamClient, or None when the maximum number of clients is reached.
+        """
+        with self.lock:
+            if len(self.clients) >= self.max_clients:
+                return None
+            client = StreamClient(self.buffer_size, area_id)
+            self.clients.add(client)
+            return client
+
+    def unsubscribe(self, client):
+        """
+        Function that removes a client from the hub.
+        """
+        with self.lock:
+            self.clients.discard(client)
+        client.close()
+
+    def publish(self, event_name, payload, area_id):
+        """
+        Function that sends an event to every client of an area. Clients with a full buffer are removed.
+        """
+        message = f"event: {event_name}\ndata: {json.dumps(payload)}\n\n"
+        with self.lock:
+            clients = [client for client in self.clients if client.area_id == area_id]
+
+        for client in clients:
+            if not client.push(message):
+                self.evicted += 1
+                self.unsubscribe(client)
+
+
+event_hub = EventHub(buffer_size=STREAM_CLIENT_BUFFER, max_clients=STREAM_MAX_CLIENTS)
+
+
+def publish_readings(model, ids, rows):
+    """
+    Function that publishes stored readings on "/stream", one event per area. The event has the same labels and datasets
+    as the charts of "/get_date_range", plus the id of every reading so the dashboard can keep its cursor up to date.
+
+    Parameters:
+    - model: The database model the readings were written to (WaitingArea or CustomsArea).
+    - ids: The ids of the stored readings, in the same order as rows.
+    - rows: A list of dictionaries with the column values of the stored readings.
+    """
+    if not event_hub.has_clients():
+        return
+
+    # Readings of a batch can arrive out of order, the charts expect them sorted on timestamp
+    readings = sorted(zip(ids, rows), key=lambda reading: reading[1]['timestamp'])
+
+    if model is WaitingArea:
+        event_name = 'waiting_area'
+        columns = ('taken_seats', 'free_seats', 'total_seats', 'total_people')
+    else:
+        event_name = 'customs_area'
+        columns = ('exit_point', 'current_people_count', 'entrance_point')
+
+    # Split the readings per area, every client only follows a single area
+    area_readings = {}
+    for reading in readings:
+        area_readings.setdefault(reading[1]['area_id'], []).append(reading)
+
+    for area_id, readings in area_readings.items():
+        event_hub.publish(event_name, {
+            'area': area_id,
+            'ids': [reading_id for reading_id, row in readings],
+            'labels': [row['timestamp'].strftime('%Y-%m-%d %H:%M:%S') for reading_id, row in readings],
+            'datasets': [{'data': [row[column] for reading_id, row in readings]} for column in columns],
+        }, area_id)
+
+
+@app.route('/stream')
+def stream():
+    """
+    Route that pushes every ingested Waiting Area and Customs Area reading to the dashboard as Server-Sent Events, so
+    open dashboards do not have to poll the database. Each stream uses one server thread for as long as it is open.
+    The optional "area" query parameter selects the area, DEFAULT_AREA when it is missing.
+    """
+    try:
+        area_id = get_area_argument()
+    except ValueError as ve:
+        return jsonify({'error': str(ve)}), 400
+
+    client = event_hub.subscribe(area_id)
+    if client is None:
+        return jsonify({'message': 'Too many stream clients'}), 503
+
+    def generate():
+        try:
+            # Tell the browser how long to wait before reconnecting
+            yield "retry: 3000\n\n"
+            while True:
+                event = client.pop(STREAM_KEEPALIVE_SECONDS)
+                if event is not None:
+                    yield event
+                elif client.closed:
+                    return
+                else:
+                    # Comment line that keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+        finally:
+            event_hub.unsubscribe(client)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+################################################################################
+# FUNCTIONS FOR CSV EXPORT
+################################################################################
+
+# Columns of the export per area, as (model attribute, column name)
+EXPORT_COLUMNS = {
+    'waiting_area': (WaitingArea, [
+        ('id', 'ID'), ('total_seats', 'Total Seats'), ('taken_seats', 'Taken Seats'),
+        ('free_seats', 'Free Seats'), ('total_people', 'Total People'), ('timestamp', 'Timestamp'),
+    ]),
+    'customs_area': (CustomsArea, [
+        ('id', 'ID'), ('entrance_point', 'Entrance Point'), ('before_passport_point', 'Before Passport Point'),
+        ('after_passport_point', 'After Passport Point'), ('exit_point', 'Exit Point'),
+        ('current_people_count', 'Current People Count'), ('timestamp', 'Timestamp'),
+    ]),
+}
+
+# Supported export formats, "columnar" is Parquet when pyarrow is installed and the typed binary format otherwise
+EXPORT_FORMATS = ('csv', 'columnar', 'parquet', 'arrow', 'binary')
+
+# Magic bytes at the start of the typed binary export format
+BINARY_EXPORT_MAGIC = b'MOLDASH1'
+
+# Value of a missing integer or timestamp in the typed binary export format
+BINARY_EXPORT_NULL = -2 ** 63
+
+
+def iter_export_chunks(model, columns, area_id, start_datetime, end_datetime):
+    """
+    Function that reads the rows of an area for an export in chunks of EXPORT_CHUNK_ROWS rows with a server-side
+    cursor, so only one chunk is in memory at a time.
+
+    Returns:
+    - A generator of lists of row tuples, ordered by timestamp.
+    """
+    query = select(*[getattr(model, attribute) for attribute, name in columns]).where(
+        model.area_id == area_id, model.timestamp.between(start_datetime, end_datetime)
+    ).order_by(model.timestamp).execution_options(yield_per=EXPORT_CHUNK_ROWS)
+
+    result = db.session.execute(query)
+    for partition in result.partitions():
+        yield partition
+
+
+def generate_csv_export(chunks, columns):
+    """
+    Function that turns the chunks of an export into CSV, one encoded block per chunk.
+    """
+    buffer = io.StringIO()
+    csv_writer = csv.writer(buffer)
+    csv_writer.writerow([name for attribute, name in columns])  # Write column names to CSV
+
+    for chunk in chunks:
+        csv_writer.writerows(chunk)  # Write data rows to CSV
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    # Header of an empty export
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def generate_binary_export(chunks, columns):
+    """
+    Function that turns the chunks of an export into the typed binary format, used when pyarrow is not installed.
+
+    Layout (all numbers little-endian):
+    - the magic bytes "MOLDASH1"
+    - a uint32 with the length of a UTF-8 JSON header, followed by the header: a list of {"name": ..., "type": ...}
+      where type is "int64" or "timestamp_us" (microseconds since the Unix epoch, naive local time)
+    - per chunk: a uint32 with the number of rows, followed by one packed int64 array per column
+    - a uint32 0 that ends the file
+    Missing values are stored as -2**63.
+    """
+    header = json.dumps([
+        {'name': name, 'type': 'timestamp_us' if attribute == 'timestamp' else 'int64'}
+        for attribute, name in columns
+    ]).encode()
+    yield BINARY_EXPORT_MAGIC + struct.pack('<I', len(header)) + header
+
+    epoch = datetime(1970, 1, 1)
+    for chunk in chunks:
+        parts = [struct.pack('<I', len(chunk))]
+        for index, (attribute, name) in enumerate(columns):
+            if attribute == 'timestamp':
+                values = array.array('q', (
+                    BINARY_EXPORT_NULL if row[index] is None else (row[index] - epoch) // timedelta(microseconds=1)
+                    for row in chunk))
+            else:
+                values = array.array('q', (
+                    BINARY_EXPORT_NULL if row[index] is None else row[index] for row in chunk))
+            if sys.byteorder != 'little':
+                values.byteswap()
+            parts.append(values.tobytes())
+        yield b''.join(parts)
+
+    yield struct.pack('<I', 0)
+
+
+class ExportSink:
+    """
+    Write-only file object that collects what pyarrow writes, so the written bytes can be sent after every chunk.
+    """
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+        self.closed = False
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def take(self):
+        """
+        Function that returns and clears the bytes written so far.
+        """
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+
+def generate_arrow_export(chunks, columns, export_format):
+    """
+    Function that turns the chunks of an export into Parquet (one row group per chunk) or an Arrow IPC stream
+    (one record batch per chunk).
+    """
+    schema = pyarrow.schema([
+        (name, pyarrow.timestamp('us') if attribute == 'timestamp' else pyarrow.int64())
+        for attribute, name in columns
+    ])
+    sink = ExportSink()
+    if export_format == 'parquet':
+        writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    else:
+        writer = pyarrow.ipc.new_stream(sink, schema)
+
+    for chunk in chunks:
+        # Turn the row tuples of the chunk into columns
+        column_values = list(zip(*chunk))
+        batch = pyarrow.record_batch(
+            [pyarrow.array(values, type=field.type) for values, field in zip(column_values, schema)], schema=schema)
+        writer.write_batch(batch)
+        data = sink.take()
+        if data:
+            yield data
+
+    writer.close()
+    yield sink.take()
+
+
+def gzip_chunks(chunks):
+    """
+    Function that compresses a stream of byte blocks into a single gzip stream.
+    """
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@app.route('/export_data_to_csv')
+def export_data_to_csv():
+    """
+    Function to export the data to CSV format for further calculations. The export is streamed in chunks, so the memory
+    used does not depend on the size of the range.
+
+    Optional query parameters:
+    - format: "csv" (default), "parquet" or "arrow" (needs pyarrow), "binary" (typed binary format) or "columnar"
+      (Parquet when pyarrow is installed, otherwise the typed binary format).
+    - compression: "gzip" to compress the download.
+    - area_id: The area (gate) to export, DEFAULT_AREA when it is missing. "area" already selects the table.
+    """
+    try:
+        # Get start_date, end_date, and area from the query parameters
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        area = request.args.get('area')
+        export_format = request.args.get('format', 'csv')
+        compression = request.args.get('compression')
+        area_id = request.args.get('area_id') or DEFAULT_AREA
+
+        # Convert start_date and end_date to datetime objects
         start_datetime = datetime.strptime(start_date, '%m/%d/%Y')
         end_datetime = datetime.strptime(
             end_date, '%m/%d/%Y') + timedelta(days=1)
 
         # Filter data based on the area
-        if area == 'waiting_area':
-            # Query WaitingArea table for data within the specified range
-            data = WaitingArea.query.filter(
-                WaitingArea.timestamp.between(start_datetime, end_datetime)).all()
-            # Define column names for CSV file
-            column_names = ['ID', 'Total Seats', 'Taken Seats',
-                            'Free Seats', 'Total People', 'Timestamp']
-            # Create CSV data
-            csv_data = [[getattr(d, column) for column in [
-                'id', 'total_seats', 'taken_seats', 'free_seats', 'total_people', 'timestamp']] for d in data]
-        elif area == 'customs_area':
-            # Query CustomsArea table for data within the specified range
-            data = CustomsArea.query.filter(
-                CustomsArea.timestamp.between(start_datetime, end_datetime)).all()
-            # Define column names for CSV file
-            column_names = ['ID', 'Entrance Point', 'Before Passport Point',
-                            'After Passport Point', 'Exit Point', 'Current People Count', 'Timestamp']
-            # Create CSV data
-            csv_data = [[getattr(d, column) for column in ['id', 'entrance_point', 'before_passport_point',
-                                                           'after_passport_point', 'exit_point', 'current_people_count', 'timestamp']] for d in data]
-        else:
+        if area not in EXPORT_COLUMNS:
             return jsonify({'error': 'Invalid area specified'}), 400
+        model, columns = EXPORT_COLUMNS[area]
+        if area_id not in AREAS:
+            return jsonify({'error': 'Invalid area_id specified'}), 400
+
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'error': 'Invalid format specified'}), 400
+        if compression not in (None, '', 'gzip'):
+            return jsonify({'error': 'Invalid compression specified'}), 400
+
+        # "columnar" picks the best columnar format that is available
+        if export_format == 'columnar':
+            export_format = 'parquet' if pyarrow is not None else 'binary'
+        if export_format in ('parquet', 'arrow') and pyarrow is None:
+            return jsonify({'error': f'The {export_format} format requires pyarrow'}), 400
+
+        # Build the stream of the export
+        chunks = iter_export_chunks(model, columns, area_id, start_datetime, end_datetime)
+        if export_format == 'csv':
+            body = generate_csv_export(chunks, columns)
+            mimetype, extension = 'text/csv', 'csv'
+        elif export_format == 'binary':
+            body = generate_binary_export(chunks, columns)
+            mimetype, extension = 'application/octet-stream', 'bin'
+        elif export_format == 'parquet':
+            body = generate_arrow_export(chunks, columns, export_format)
+            mimetype, extension = 'application/vnd.apache.parquet', 'parquet'
+        else:
+            body = generate_arrow_export(chunks, columns, export_format)
+            mimetype, extension = 'application/vnd.apache.arrow.stream', 'arrows'
 
-        # Create a string buffer to write CSV data
-        buffer = io.StringIO()
-        csv_writer = csv.writer(buffer)
-        csv_writer.writerow(column_names)  # Write column names to CSV
-        csv_writer.writerows(csv_data)     # Write data rows to CSV
-        buffer.seek(0)
+        if compression == 'gzip':
+            body = gzip_chunks(body)
+            mimetype, extension = 'application/gzip', f'{extension}.gz'
 
-        # Send the CSV file as a download
-        return send_file(
-            io.BytesIO(buffer.getvalue().encode()),
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=f"{area}_{start_date}_to_{end_date}.csv"
-        )
+        # Send the file as a download, the request context stays available while the rows are read
+        download_name = f"{area_id}_{area}_{start_date}_to_{end_date}.{extension}".replace('/', '-')
+        response = Response(stream_with_context(body), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+        return response
+
+    except ValueError as ve:
+        # Handle invalid dates
+        log_event(logger, logging.WARNING, 'invalid_request', route='/export_data_to_csv', error=ve)
+        return jsonify({'error': str(ve)}), 400
 
     except Exception as e:
         # Handle any exceptions and return an error message
-        error_message = f"An error occurred: {str(e)}"
-        print(error_message)
-        traceback.print_exc()
+        log_event(logger, logging.ERROR, 'request_failed', exc_info=True, route='/export_data_to_csv', error=e)
         return jsonify({'error': 'Internal Server Error'}), 500
 
 
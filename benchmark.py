@@ -0,0 +1,327 @@
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+################################################################################
+# CONFIG
+################################################################################
+
+# Ranges every read route is timed over, ending at the last seeded reading
+BENCHMARK_RANGES = {
+    'day': timedelta(days=1),
+    'week': timedelta(days=7),
+    'month': timedelta(days=30),
+}
+
+# Tables that must never be read with a full scan
+LARGE_TABLES = ('waiting_area', 'customs_area', 'waiting_area_rollup', 'customs_area_rollup')
+
+# Number of readings inserted per executemany call while seeding
+SEED_CHUNK_ROWS = 50000
+
+
+################################################################################
+# SEEDING
+################################################################################
+
+def seed_database(app_module, database_path, rows, days, areas):
+    """
+    Function that fills the raw tables of the benchmark database with rows readings per table, spread evenly over the
+    last days days and over the areas. The readings are written with plain sqlite3 executemany calls without syncing,
+    afterwards the rollups, the seat state and the live window buffers are built by the app itself.
+
+    Parameters:
+    - app_module: The imported app module, its database is the benchmark database.
+    - database_path: The path of the benchmark database.
+    - rows: The number of readings per table.
+    - days: The number of days the readings are spread over.
+    - areas: The area ids the readings are spread over.
+    """
+    end_time = app_module.local_now()
+    start_time = end_time - timedelta(days=days)
+    step = (end_time - start_time) / rows
+    sensors = [f'druksensor_{number}' for number in range(1, 11)]
+
+    connection = sqlite3.connect(database_path)
+    connection.execute("PRAGMA synchronous = OFF")
+
+    for first_row in range(0, rows, SEED_CHUNK_ROWS):
+        waiting_area_rows = []
+        customs_area_rows = []
+        for row in range(first_row, min(first_row + SEED_CHUNK_ROWS, rows)):
+            timestamp = (start_time + step * row).strftime('%Y-%m-%d %H:%M:%S.%f')
+            area_id = areas[row % len(areas)]
+            taken_seats = random.randint(0, 10)
+            waiting_area_rows.append((area_id, 10, taken_seats, 10 - taken_seats, int(taken_seats * 1.3),
+                                      random.choice(sensors), random.choice(("AAN", "UIT")), timestamp))
+            points = [random.randint(0, 5) for _ in range(4)]
+            customs_area_rows.append((area_id, *points, points[0] + points[1] + points[2], timestamp))
+
+        connection.executemany(
+            "INSERT INTO waiting_area (area_id, total_seats, taken_seats, free_seats, total_people, sensor_id, status, "
+            "timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", waiting_area_rows)
+        connection.executemany(
+            "INSERT INTO customs_area (area_id, entrance_point, before_passport_point, after_passport_point, "
+            "exit_point, current_people_count, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)", customs_area_rows)
+        connection.commit()
+
+    connection.execute("ANALYZE")
+    connection.close()
+
+    with app_module.app.app_context():
+        for model in app_module.ROLLUP_MODELS:
+            app_module.rebuild_rollups(model)
+        app_module.load_seat_state()
+        # The buffers were filled on import, before the readings were seeded
+        app_module.warm_up_live_buffers()
+    return end_time
+
+
+################################################################################
+# MEASUREMENT
+################################################################################
+
+class QueryRecorder:
+    """
+    Records the SQL statements executed by the benchmark thread, so their query plans can be checked afterwards.
+    Statements of background threads are ignored.
+    """
+
+    def __init__(self):
+        self.thread_id = threading.get_ident()
+        self.statements = []
+        self.enabled = False
+
+    def __call__(self, connection, cursor, statement, parameters, context, executemany):
+        if self.enabled and not executemany and threading.get_ident() == self.thread_id:
+            self.statements.append((statement, parameters))
+
+
+def find_full_scans(database_path, statements):
+    """
+    Function that runs EXPLAIN QUERY PLAN for every recorded statement.
+
+    Returns:
+    - A list of (statement, plan line) tuples of every full scan of one of the LARGE_TABLES. A scan of an index in
+      index order (for example for ORDER BY) also reads the whole table and counts as a full scan.
+    """
+    connection = sqlite3.connect(database_path)
+    full_scans = []
+    for statement, parameters in statements:
+        if not statement.lstrip().upper().startswith('SELECT'):
+            continue
+        for row in connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters):
+            detail = row[-1]
+            words = detail.split()
+            if len(words) >= 2 and words[0] == 'SCAN' and words[1] in LARGE_TABLES:
+                full_scans.append((statement, detail))
+    connection.close()
+    return full_scans
+
+
+def build_requests(end_time, range_length, areas):
+    """
+    Function that builds the URL of every read route for a range that ends at end_time.
+    """
+    start_time = end_time - range_length + timedelta(days=1)
+    start_date, end_date = start_time.strftime('%Y-%m-%d'), end_time.strftime('%Y-%m-%d')
+    export_dates = f"start_date={start_time.strftime('%m/%d/%Y')}&end_date={end_time.strftime('%m/%d/%Y')}"
+    area = f"&area={areas[0]}"
+    return {
+        '/get_date_range': f"/get_date_range?start_date={start_date}&end_date={end_date}&max_points=500{area}",
+        '/get_date_range compact': f"/get_date_range?start_date={start_date}&end_date={end_date}&max_points=500"
+                                   f"&format=compact{area}",
+        '/get_statistics': f"/get_statistics?start_date={start_date}&end_date={end_date}{area}",
+        '/dashboard_snapshot': f"/dashboard_snapshot?start_date={start_date}&end_date={end_date}&max_points=500{area}",
+        '/analytics': f"/analytics?start_date={start_date}&end_date={end_date}{area}",
+        '/analytics hours': f"/analytics?start_date={start_date}&end_date={end_date}&hours=6-9&window=15{area}",
+        '/waiting_area_data': f"/waiting_area_data?max_points=500{area}",
+        '/customs_area_data': f"/customs_area_data?max_points=500{area}",
+        '/export_data_to_csv': f"/export_data_to_csv?{export_dates}&area=waiting_area&area_id={areas[0]}",
+    }
+
+
+def measure(app_module, client, url, repeat, warm):
+    """
+    Function that times a request repeat times, then measures its peak memory once with tracemalloc.
+
+    Parameters:
+    - app_module: The imported app module.
+    - client: The Flask test client.
+    - url: The URL of the request.
+    - repeat: The number of timed requests.
+    - warm: False clears the response cache before every request, so the database work is measured.
+
+    Returns:
+    - A dictionary with the median and maximum time in milliseconds, the response size and the peak memory.
+    """
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        if not warm:
+            app_module.response_cache.clear()
+        start = time.perf_counter()
+        response = client.get(url)
+        body = response.get_data()
+        timings.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f"{url} answered {response.status_code}: {body[:200]!r}")
+        size = len(body)
+
+    if not warm:
+        app_module.response_cache.clear()
+    tracemalloc.start()
+    client.get(url).get_data()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'median_ms': round(statistics.median(timings) * 1000, 2),
+        'max_ms': round(max(timings) * 1000, 2),
+        'response_bytes': size,
+        'peak_memory_kib': round(peak_memory / 1024, 1),
+    }
+
+
+def check_live_buffers(app_module, client, urls):
+    """
+    Function that checks that the live routes send the same payload from the live window buffers as from the database,
+    so the live routes are not timed against buffers that miss readings. A RuntimeError is raised when they differ.
+
+    Parameters:
+    - app_module: The imported app module.
+    - client: The Flask test client.
+    - urls: The URLs of the live routes.
+    """
+    live_buffers = app_module.live_buffers
+    for url in urls:
+        app_module.response_cache.clear()
+        buffered_size = len(client.get(url).get_data())
+        app_module.response_cache.clear()
+        app_module.live_buffers = {}
+        try:
+            database_size = len(client.get(url).get_data())
+        finally:
+            app_module.live_buffers = live_buffers
+        if buffered_size != database_size:
+            raise RuntimeError(f"{url} sent {buffered_size} bytes from the live buffers and {database_size} bytes from "
+                               f"the database")
+    app_module.response_cache.clear()
+
+
+def run_benchmark(options):
+    """
+    Function that seeds the benchmark database, times every read route over every range and checks the query plans.
+
+    Returns:
+    - The report as a dictionary, with the full scans that were found.
+    """
+    database_path = options.database or os.path.join(tempfile.mkdtemp(prefix='moldash-benchmark-'), 'benchmark.db')
+    reuse = options.database is not None and os.path.exists(database_path)
+
+    # The app reads its configuration on import, so the environment is set first
+    os.environ['MOLDASH_DATABASE_URI'] = f'sqlite:///{os.path.abspath(database_path)}'
+    os.environ.setdefault('MOLDASH_RETENTION_INTERVAL_SECONDS', '0')
+    os.environ.setdefault('MOLDASH_LOG_LEVEL', 'WARNING')
+    if options.areas_file:
+        os.environ['MOLDASH_AREAS_FILE'] = options.areas_file
+    import app as app_module
+    from sqlalchemy import event
+
+    areas = list(app_module.AREAS)
+    seed_seconds = None
+    if reuse:
+        with app_module.app.app_context():
+            end_time = app_module.db.session.execute(
+                app_module.select(app_module.func.max(app_module.WaitingArea.timestamp))).scalar()
+    else:
+        seed_start = time.perf_counter()
+        end_time = seed_database(app_module, database_path, options.rows, options.days, areas)
+        seed_seconds = round(time.perf_counter() - seed_start, 1)
+
+    recorder = QueryRecorder()
+    with app_module.app.app_context():
+        event.listen(app_module.db.engine, 'before_cursor_execute', recorder)
+    client = app_module.app.test_client()
+
+    live_urls = [url for route, url in build_requests(end_time, BENCHMARK_RANGES['day'], areas).items()
+                 if route in ('/waiting_area_data', '/customs_area_data')]
+    check_live_buffers(app_module, client, live_urls)
+
+    results = {}
+    for range_name in options.ranges:
+        for route, url in build_requests(end_time, BENCHMARK_RANGES[range_name], areas).items():
+            recorder.enabled = True
+            results[f'{route} {range_name}'] = measure(app_module, client, url, options.repeat, options.warm)
+            recorder.enabled = False
+
+    full_scans = find_full_scans(database_path, recorder.statements)
+    return {
+        'database': database_path,
+        'rows_per_table': options.rows if not reuse else None,
+        'seed_seconds': seed_seconds,
+        'results': results,
+        'full_scans': sorted({detail for statement, detail in full_scans}),
+        'full_scan_statements': sorted({statement for statement, detail in full_scans}),
+    }
+
+
+def print_report(report):
+    """
+    Function that prints the report as a table.
+    """
+    print(f"Database: {report['database']}, rows per table: {report['rows_per_table']}, "
+          f"seeded in {report['seed_seconds']} s")
+    print(f"{'route and range':<32}{'median_ms':>11}{'max_ms':>11}{'bytes':>12}{'peak_kib':>11}")
+    for name, result in report['results'].items():
+        print(f"{name:<32}{result['median_ms']:>11}{result['max_ms']:>11}{result['response_bytes']:>12}"
+              f"{result['peak_memory_kib']:>11}")
+    if report['full_scans']:
+        print("\nFull table scans found:")
+        for statement in report['full_scan_statements']:
+            print(f"  {' '.join(statement.split())}")
+        for detail in report['full_scans']:
+            print(f"  -> {detail}")
+    else:
+        print("\nNo full table scans.")
+
+
+def parse_arguments():
+    """
+    Function that reads the command line options of the benchmark.
+    """
+    parser = argparse.ArgumentParser(description="Read path benchmark on a seeded database.")
+    parser.add_argument('--rows', type=int, default=1000000,
+                        help="readings per table to seed (default: %(default)s)")
+    parser.add_argument('--days', type=int, default=60,
+                        help="days the readings are spread over (default: %(default)s)")
+    parser.add_argument('--database', help="database file, an existing file is reused without seeding "
+                                           "(default: a new temporary file)")
+    parser.add_argument('--areas-file', help="area configuration to seed the readings over (MOLDASH_AREAS_FILE)")
+    parser.add_argument('--ranges', nargs='*', choices=list(BENCHMARK_RANGES), default=list(BENCHMARK_RANGES),
+                        help="ranges to time (default: all)")
+    parser.add_argument('--repeat', type=int, default=5, help="timed requests per route and range (default: %(default)s)")
+    parser.add_argument('--warm', action='store_true', help="keep the response cache between requests")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    options = parse_arguments()
+    report = run_benchmark(options)
+    if options.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    # A query that regressed into a full scan fails the run
+    sys.exit(1 if report['full_scans'] else 0)
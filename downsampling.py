@@ -0,0 +1,135 @@
+################################################################################
+# DOWNSAMPLING
+################################################################################
+
+# Supported downsampling modes
+DOWNSAMPLING_MODES = ('lttb', 'minmax')
+
+
+def lttb_indices(x_values, series, max_points):
+    """
+    Function that selects at most max_points points with the Largest-Triangle-Three-Buckets algorithm. The points are
+    divided into buckets and from every bucket the point that forms the largest triangle with the previously selected
+    point and the average of the next bucket is kept, which preserves the visual shape of the chart.
+
+    All series of a chart share the same labels, so the triangle areas of every series are added up (each series scaled
+    by its own range) and the same points are kept for all series.
+
+    Parameters:
+    - x_values: A list with the x value (for example the timestamp in seconds) of every point, in ascending order.
+    - series: A list of lists with the y values, every list has the same length as x_values.
+    - max_points: The maximum number of points to keep, at least 3.
+
+    Returns:
+    - A list with the indices of the points to keep, in ascending order.
+    """
+    number_of_points = len(x_values)
+    if max_points >= number_of_points or max_points < 3:
+        return list(range(number_of_points))
+
+    # Scale every series by its range, so a series with large values does not dominate the selection
+    scales = []
+    for values in series:
+        value_range = max(values) - min(values)
+        scales.append(value_range if value_range else 1)
+
+    bucket_size = (number_of_points - 2) / (max_points - 2)
+    indices = [0]
+    previous_index = 0
+
+    for bucket in range(max_points - 2):
+        # Range of the current bucket
+        bucket_start = int(bucket * bucket_size) + 1
+        bucket_end = int((bucket + 1) * bucket_size) + 1
+
+        # Average point of the next bucket, the last point is used for the last bucket
+        next_start = bucket_end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, number_of_points)
+        next_count = next_end - next_start
+        average_x = sum(x_values[next_start:next_end]) / next_count
+        average_ys = [sum(values[next_start:next_end]) / next_count for values in series]
+
+        # Keep the point of the bucket that forms the largest triangle
+        previous_x = x_values[previous_index]
+        largest_area = -1
+        largest_index = bucket_start
+        for index in range(bucket_start, bucket_end):
+            area = 0
+            for values, average_y, scale in zip(series, average_ys, scales):
+                previous_y = values[previous_index]
+                area += abs((previous_x - average_x) * (values[index] - previous_y) -
+                            (previous_x - x_values[index]) * (average_y - previous_y)) / scale
+            if area > largest_area:
+                largest_area = area
+                largest_index = index
+
+        indices.append(largest_index)
+        previous_index = largest_index
+
+    indices.append(number_of_points - 1)
+    return indices
+
+
+def minmax_indices(series, max_points):
+    """
+    Function that selects at most max_points points by dividing the points into buckets and keeping the minimum and the
+    maximum of every series in every bucket, plus the first and the last point. Unlike LTTB this never hides a peak,
+    which matters for occupancy charts.
+
+    Parameters:
+    - series: A list of lists with the y values, all lists have the same length.
+    - max_points: The maximum number of points to keep, at least 2.
+
+    Returns:
+    - A list with the indices of the points to keep, in ascending order.
+    """
+    number_of_points = len(series[0]) if series else 0
+    if max_points >= number_of_points or max_points < 2:
+        return list(range(number_of_points))
+
+    # The first and the last point are always kept, like LTTB does, so the chart covers the same range
+    budget = max_points - 2
+    if budget < 2:
+        return sorted({0, number_of_points - 1})
+
+    # Every bucket keeps up to two points per series. When the budget is too small for two points of every series,
+    # only the first series that fit decide which points are kept
+    series = series[:budget // 2]
+    number_of_buckets = max(1, budget // (2 * len(series)))
+    bucket_size = number_of_points / number_of_buckets
+
+    indices = {0, number_of_points - 1}
+    for bucket in range(number_of_buckets):
+        bucket_start = int(bucket * bucket_size)
+        bucket_end = int((bucket + 1) * bucket_size)
+        for values in series:
+            bucket_values = values[bucket_start:bucket_end]
+            indices.add(bucket_start + bucket_values.index(min(bucket_values)))
+            indices.add(bucket_start + bucket_values.index(max(bucket_values)))
+
+    return sorted(indices)
+
+
+def downsample_indices(x_values, series, max_points, mode='lttb'):
+    """
+    Function that selects the points to keep when a chart is reduced to at most max_points points.
+
+    Parameters:
+    - x_values: A list with the x value of every point, in ascending order.
+    - series: A list of lists with the y values.
+    - max_points: The maximum number of points to keep, None keeps every point.
+    - mode: "lttb" (shape preserving) or "minmax" (minimum and maximum per bucket).
+
+    Returns:
+    - A list with the indices of the points to keep, in ascending order.
+    """
+    if mode not in DOWNSAMPLING_MODES:
+        raise ValueError(f"Unknown downsampling mode: {mode}")
+
+    if max_points is None or max_points >= len(x_values):
+        return list(range(len(x_values)))
+
+    if mode == 'minmax':
+        return minmax_indices(series, max_points)
+    return lttb_indices(x_values, series, max_points)
+
@@ -0,0 +1,154 @@
+################################################################################
+# LOGGING
+################################################################################
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+# Formats of the log records: "logfmt" (key=value pairs) or "json" (one JSON object per line)
+LOG_FORMATS = ('logfmt', 'json')
+
+
+def log_event(logger, level, event, sampled=False, exc_info=False, **fields):
+    """
+    Function that logs a structured record: an event name plus key/value fields. Nothing is formatted when the level is
+    disabled, and the fields are only turned into text by the listener thread, never in the request.
+
+    Parameters:
+    - logger: The logger to log to.
+    - level: The level of the record, for example logging.DEBUG.
+    - event: The name of the event, for example "reading_received".
+    - sampled: True for events that happen for every reading, these are rate limited by RateLimitFilter.
+    - exc_info: True to add the traceback of the exception that is being handled.
+    - fields: The key/value fields of the record.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, event, exc_info=exc_info, extra={'fields': fields, 'sampled': sampled})
+
+
+class KeyValueFormatter(logging.Formatter):
+    """
+    Formatter that writes the time, level, logger, event and fields of a record as key=value pairs or as JSON.
+    """
+
+    def __init__(self, log_format='logfmt'):
+        super().__init__()
+        self.log_format = log_format
+
+    def format(self, record):
+        """
+        Function that turns a record into a single line.
+        """
+        values = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        values.update(getattr(record, 'fields', {}))
+        if getattr(record, 'suppressed', 0):
+            values['suppressed'] = record.suppressed
+        if record.exc_info:
+            values['exception'] = self.formatException(record.exc_info)
+
+        if self.log_format == 'json':
+            return json.dumps(values, default=str)
+        return ' '.join(f'{key}={self.format_value(value)}' for key, value in values.items())
+
+    @staticmethod
+    def format_value(value):
+        """
+        Function that quotes a value when it contains spaces, quotes or an equals sign. Dictionaries and lists are
+        written as JSON.
+        """
+        text = json.dumps(value, default=str) if isinstance(value, (dict, list)) else str(value)
+        if text == '' or any(character in text for character in ' "=\n'):
+            return json.dumps(text)
+        return text
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Filter that lets at most max_per_second sampled records of every event through per second. The number of records
+    that were dropped is added as "suppressed" to the next record of the event that gets through.
+    """
+
+    def __init__(self, max_per_second):
+        super().__init__()
+        self.max_per_second = max_per_second
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        """
+        Function that decides whether a record is logged.
+        """
+        if not getattr(record, 'sampled', False):
+            return True
+
+        second = int(record.created)
+        with self.lock:
+            window_second, count, suppressed = self.windows.get(record.msg, (second, 0, 0))
+            if window_second != second:
+                window_second, count = second, 0
+
+            if count >= self.max_per_second:
+                self.windows[record.msg] = (window_second, count, suppressed + 1)
+                return False
+
+            self.windows[record.msg] = (window_second, count + 1, 0)
+        record.suppressed = suppressed
+        return True
+
+
+class InProcessQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that puts records in the queue as they are. The default handler formats the message first, which is
+    only needed when the queue crosses a process boundary.
+    """
+
+    def prepare(self, record):
+        """
+        Function that returns the record unchanged, it is formatted by the listener thread.
+        """
+        return record
+
+
+def setup_logging(name, level='INFO', log_format='logfmt', max_sampled_per_second=10):
+    """
+    Function that configures a logger that never blocks the caller: records are put in an unbounded in-memory queue by a
+    QueueHandler and written to stderr by a QueueListener thread. The rate limit is applied before a record is queued.
+
+    Parameters:
+    - name: The name of the logger.
+    - level: The minimum level that is logged, for example "INFO" or "DEBUG".
+    - log_format: "logfmt" or "json".
+    - max_sampled_per_second: The maximum number of records per second of every sampled event.
+
+    Returns:
+    - The logger.
+    """
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"log format must be one of {', '.join(LOG_FORMATS)}")
+
+    output_handler = logging.StreamHandler()
+    output_handler.setFormatter(KeyValueFormatter(log_format))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = InProcessQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(max_sampled_per_second))
+
+    listener = logging.handlers.QueueListener(log_queue, output_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    logger = logging.getLogger(name)
+    logger.setLevel(level.upper())
+    logger.handlers = [queue_handler]
+    logger.propagate = False
+    return logger
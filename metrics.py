@@ -0,0 +1,213 @@
+################################################################################
+# METRICS
+################################################################################
+
+import bisect
+import math
+import threading
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds of the histogram buckets of counts, for example the number of database queries per request
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def format_value(value):
+    """
+    Function that formats a sample value for the Prometheus text exposition format.
+    """
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def format_labels(labelnames, labelvalues, extra=()):
+    """
+    Function that formats the labels of a sample, for example {route="/stream",method="GET"}.
+    """
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label_value(value)}"' for name, value in pairs) + '}'
+
+
+def escape_label_value(value):
+    """
+    Function that escapes backslashes, double quotes and newlines in a label value.
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Counter:
+    """
+    Value per label combination that only goes up. Increments take a single lock, so they are cheap enough for the
+    ingest path.
+    """
+    metric_type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labelvalues=(), amount=1):
+        """
+        Function that adds amount to the counter of a label combination.
+        """
+        with self.lock:
+            self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        """
+        Function that returns the samples of the counter as (name, labels, value) tuples.
+        """
+        with self.lock:
+            values = list(self.values.items())
+        return [(f'{self.name}_total', format_labels(self.labelnames, labelvalues), value)
+                for labelvalues, value in values]
+
+
+class Histogram:
+    """
+    Distribution of observed values per label combination in cumulative buckets, plus the sum and count.
+    """
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, labelvalues=()):
+        """
+        Function that adds an observed value to the histogram of a label combination. Only the bucket the value falls
+        in is incremented, the cumulative counts are calculated when the metrics are rendered.
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(labelvalues)
+            if state is None:
+                state = self.values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        """
+        Function that returns the samples of the histogram as (name, labels, value) tuples.
+        """
+        with self.lock:
+            values = [(labelvalues, list(counts), total, count)
+                      for labelvalues, (counts, total, count) in self.values.items()]
+
+        samples = []
+        for labelvalues, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                labels = format_labels(self.labelnames, labelvalues, [('le', format_value(float(bound)))])
+                samples.append((f'{self.name}_bucket', labels, cumulative))
+            labels = format_labels(self.labelnames, labelvalues)
+            samples.append((f'{self.name}_sum', labels, total))
+            samples.append((f'{self.name}_count', labels, count))
+        return samples
+
+
+class Gauge:
+    """
+    Value that is read from the application when the metrics are rendered, so nothing is tracked in between.
+    """
+    metric_type = 'gauge'
+
+    def __init__(self, name, documentation, function, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        """
+        Function that returns the samples of the gauge as (name, labels, value) tuples. The function returns a number,
+        or a dictionary with a number per label combination.
+        """
+        value = self.function()
+        if not isinstance(value, dict):
+            return [(self.name, '', value)]
+        return [(self.name, format_labels(self.labelnames, labelvalues), sample)
+                for labelvalues, sample in value.items()]
+
+
+class FunctionCounter(Gauge):
+    """
+    Counter whose value is read from the application when the metrics are rendered, for totals the application already
+    keeps. The function must only go up.
+    """
+    metric_type = 'counter'
+
+    def samples(self):
+        """
+        Function that returns the samples of the counter as (name, labels, value) tuples.
+        """
+        return [(f'{name}_total', labels, value) for name, labels, value in super().samples()]
+
+
+class Registry:
+    """
+    Collection of metrics that is rendered in the Prometheus text exposition format. Every process has its own
+    registry, so with several worker processes every worker is scraped separately.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        """
+        Function that creates and registers a Counter.
+        """
+        return self.register(Counter(f'{self.prefix}_{name}', documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        """
+        Function that creates and registers a Histogram.
+        """
+        return self.register(Histogram(f'{self.prefix}_{name}', documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, function, labelnames=()):
+        """
+        Function that creates and registers a Gauge.
+        """
+        return self.register(Gauge(f'{self.prefix}_{name}', documentation, function, labelnames))
+
+    def function_counter(self, name, documentation, function, labelnames=()):
+        """
+        Function that creates and registers a FunctionCounter.
+        """
+        return self.register(FunctionCounter(f'{self.prefix}_{name}', documentation, function, labelnames))
+
+    def register(self, metric):
+        """
+        Function that adds a metric to the registry.
+        """
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Function that renders every metric in the Prometheus text exposition format (version 0.0.4).
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.metric_type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
@@ -1,44 +1,435 @@
-import random
-import requests
+import argparse
+import asyncio
 import json
-from faker import Faker
-from datetime import datetime, timedelta
-
 import random
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+################################################################################
+# CONFIG
+################################################################################
+
+# Server the readings are sent to
+DEFAULT_URL = 'http://localhost:80'
+
+# Routes of the single and the batch ingest per area
+INGEST_ROUTES = {
+    'waiting_area': ('/waiting_area', '/waiting_area/batch'),
+    'customs_area': ('/customs_area', '/customs_area/batch'),
+}
+
+# Percentiles of the latency report
+REPORT_PERCENTILES = (50, 95, 99)
+
+
+################################################################################
+# READINGS
+################################################################################
 
+def generate_waiting_area_data(number_of_sensors=11, area=None):
+    """
+    Function that generates a random seat sensor reading.
 
-def generate_waiting_area_data():
-    return {
-        'Sensor': 'Pressuresensor' + str(random.randint(0, 10)),
+    Parameters:
+    - number_of_sensors: The number of different seat sensors the reading can come from.
+    - area: The area of the reading, None leaves it to the server.
+    """
+    # The sensor ids of the default configuration: druksensor, druksensor_1, druksensor_2, ...
+    sensor_number = random.randrange(number_of_sensors)
+    data = {
+        'Sensor': 'druksensor_' + str(sensor_number) if sensor_number else 'druksensor',
         'Status': random.choice(["AAN", "UIT"])
     }
+    if area is not None:
+        data['area'] = area
+    return data
 
 
-def generate_customs_area_data():
-    return {
+def generate_customs_area_data(area=None):
+    """
+    Function that generates a Customs Area reading with one person at the entrance point.
+
+    Parameters:
+    - area: The area of the reading, None leaves it to the server.
+    """
+    data = {
         'entrance_point': 1,
         'before_passport_point': 0,
         'after_passport_point': 0,
         'exit_point': 0,
     }
+    if area is not None:
+        data['area'] = area
+    return data
+
+
+def generate_invalid_data():
+    """
+    Function that generates a reading the server must reject, to measure the error path.
+    """
+    return {'entrance_point': 'not a number'}
+
+
+def post_json(url, data):
+    """
+    Function that sends a single reading and returns the status code.
+    """
+    request = urllib.request.Request(
+        url, data=json.dumps(data).encode(), headers={'Content-Type': 'application/json'}, method='POST')
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status
+    except urllib.error.HTTPError as error:
+        return error.code
+
+
+def send_waiting_area_data(base_url=DEFAULT_URL):
+    status_code = post_json(base_url + '/waiting_area', generate_waiting_area_data())
+    print(f"Waiting Area Data Sent: {status_code}")
+
+
+def send_customs_area_data(base_url=DEFAULT_URL):
+    status_code = post_json(base_url + '/customs_area', generate_customs_area_data())
+    print(f"Customs Area Data Sent: {status_code}")
+
+
+################################################################################
+# TRANSPORTS
+################################################################################
+
+class HttpConnection:
+    """
+    Minimal asyncio HTTP/1.1 client for a single keep-alive connection, so the load generator needs no third-party
+    packages. The connection is opened again when the server closes it after a response.
+    """
+
+    def __init__(self, base_url):
+        parsed_url = urllib.parse.urlsplit(base_url)
+        if parsed_url.scheme != 'http':
+            raise ValueError("only http:// urls are supported")
+        self.host = parsed_url.hostname
+        self.port = parsed_url.port or 80
+        self.reader = None
+        self.writer = None
+
+    async def post(self, path, body):
+        """
+        Function that posts a JSON body and returns the status code and the body of the response.
+        """
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        try:
+            self.writer.write(
+                f"POST {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n".encode() + body)
+            await self.writer.drain()
+
+            # Status line and headers
+            status_line = await self.reader.readline()
+            if not status_line:
+                raise ConnectionError("connection closed by the server")
+            version, status_code = status_line.decode().split(' ', 2)[:2]
+            headers = {}
+            while True:
+                line = await self.reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, value = line.decode().split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+            # Body, the connection can only be reused when the length of the body is known
+            keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+            if 'content-length' in headers:
+                response_body = await self.reader.readexactly(int(headers['content-length']))
+            else:
+                response_body = await self.reader.read()
+                keep_alive = False
+
+            if not keep_alive:
+                await self.close()
+            return int(status_code), response_body
+
+        except Exception:
+            await self.close()
+            raise
+
+    async def close(self):
+        """
+        Function that closes the connection.
+        """
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        self.reader = self.writer = None
+
+
+class TestClientConnection:
+    """
+    Connection that calls the Flask app in this process through its test client, so the ingest path can be measured
+    without a server or network. Requests run in a worker thread, so the event loop keeps its schedule.
+    """
+
+    def __init__(self, flask_app):
+        self.client = flask_app.test_client()
+
+    async def post(self, path, body):
+        """
+        Function that posts a JSON body and returns the status code and the body of the response.
+        """
+        response = await asyncio.to_thread(
+            self.client.post, path, data=body, headers={'Content-Type': 'application/json'})
+        return response.status_code, response.data
 
+    async def close(self):
+        pass
 
-def send_waiting_area_data():
-    url = 'http://localhost:80/waiting_area'
-    data = generate_waiting_area_data()
-    response = requests.post(url, json=data)
-    print(f"Waiting Area Data Sent: {response.status_code}")
 
+################################################################################
+# LOAD GENERATOR
+################################################################################
 
-def send_customs_area_data():
-    url = 'http://localhost:80/customs_area'
-    data = generate_customs_area_data()
-    response = requests.post(url, json=data)
-    print(f"Customs Area Data Sent: {response.status_code}")
+class LatencyRecorder:
+    """
+    Latencies, status codes and errors of the requests, per route.
+    """
+
+    def __init__(self):
+        self.latencies = {}
+        self.status_codes = {}
+        self.errors = {}
+        self.readings = 0
+
+    def record(self, route, latency, status_code, readings):
+        """
+        Function that records a finished request.
+
+        Parameters:
+        - route: The route of the request.
+        - latency: The latency in seconds.
+        - status_code: The status code of the response.
+        - readings: The number of readings the server stored.
+        """
+        self.latencies.setdefault(route, []).append(latency)
+        codes = self.status_codes.setdefault(route, {})
+        codes[status_code] = codes.get(status_code, 0) + 1
+        if 200 <= status_code < 300:
+            self.readings += readings
+
+    def record_error(self, route, error):
+        """
+        Function that records a request that failed without a response.
+        """
+        name = type(error).__name__
+        errors = self.errors.setdefault(route, {})
+        errors[name] = errors.get(name, 0) + 1
+
+    def report(self, elapsed):
+        """
+        Function that summarizes the run.
+
+        Parameters:
+        - elapsed: The duration of the run in seconds.
+
+        Returns:
+        - A dictionary with the achieved throughput and per route the latency percentiles in milliseconds, the status
+          codes and the error rate.
+        """
+        routes = {}
+        total_requests = 0
+        for route in sorted(set(self.latencies) | set(self.errors)):
+            latencies = sorted(self.latencies.get(route, []))
+            status_codes = self.status_codes.get(route, {})
+            errors = self.errors.get(route, {})
+            requests = len(latencies) + sum(errors.values())
+            failed = sum(count for code, count in status_codes.items() if not 200 <= code < 300) + sum(errors.values())
+            total_requests += requests
+
+            summary = {'requests': requests, 'error_rate': round(failed / requests, 4) if requests else 0,
+                       'status_codes': {str(code): count for code, count in sorted(status_codes.items())},
+                       'errors': errors}
+            for percentile in REPORT_PERCENTILES:
+                summary[f'p{percentile}_ms'] = round(percentile_of(latencies, percentile) * 1000, 2)
+            summary['max_ms'] = round(latencies[-1] * 1000, 2) if latencies else 0
+            routes[route] = summary
+
+        return {
+            'duration_s': round(elapsed, 2),
+            'requests': total_requests,
+            'requests_per_s': round(total_requests / elapsed, 1) if elapsed else 0,
+            'readings_stored': self.readings,
+            'readings_per_s': round(self.readings / elapsed, 1) if elapsed else 0,
+            'routes': routes,
+        }
+
+
+def percentile_of(sorted_values, percentile):
+    """
+    Function that returns a percentile of sorted values with the nearest-rank method, 0 when there are no values.
+    """
+    if not sorted_values:
+        return 0
+    rank = max(1, -(-percentile * len(sorted_values) // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def build_request(options):
+    """
+    Function that builds the next request of the payload mix.
+
+    Returns:
+    - A tuple with the route, the JSON body and the number of readings in it.
+    """
+    area_name = 'waiting_area' if random.random() < options.waiting_share else 'customs_area'
+    area = random.choice(options.areas) if options.areas else None
+
+    def reading():
+        if random.random() < options.invalid_share:
+            return generate_invalid_data()
+        if area_name == 'waiting_area':
+            return generate_waiting_area_data(options.sensors, area)
+        return generate_customs_area_data(area)
+
+    single_route, batch_route = INGEST_ROUTES[area_name]
+    if options.batch_size > 1:
+        return batch_route, json.dumps([reading() for _ in range(options.batch_size)]).encode(), options.batch_size
+    return single_route, json.dumps(reading()).encode(), 1
+
+
+async def run_load(options, connection_factory):
+    """
+    Function that sends readings for options.duration seconds and records every request.
+
+    With a target rate the requests are scheduled open-loop at options.rate requests per second and the latency is
+    measured from the scheduled start, so a server that falls behind shows up in the tail latency instead of lowering
+    the rate. Without a target rate every worker sends its next request as soon as the previous one is answered.
+
+    Parameters:
+    - options: The parsed command line options.
+    - connection_factory: A function that returns a new connection, one per worker.
+
+    Returns:
+    - The LatencyRecorder and the elapsed time in seconds.
+    """
+    recorder = LatencyRecorder()
+    jobs = asyncio.Queue(maxsize=options.concurrency * 2)
+    start = time.perf_counter()
+    deadline = start + options.duration
+
+    async def schedule():
+        # Put the scheduled start of every request in the queue
+        sent = 0
+        while True:
+            scheduled = start + sent / options.rate
+            if scheduled >= deadline:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await jobs.put(scheduled)
+            sent += 1
+        for _ in range(options.concurrency):
+            await jobs.put(None)
+
+    async def worker():
+        connection = connection_factory()
+        try:
+            while True:
+                if options.rate:
+                    scheduled = await jobs.get()
+                    if scheduled is None:
+                        return
+                else:
+                    scheduled = time.perf_counter()
+                    if scheduled >= deadline:
+                        return
+
+                route, body, readings = build_request(options)
+                try:
+                    status_code, response_body = await connection.post(route, body)
+                    latency = time.perf_counter() - scheduled
+
+                    # A batch can be stored partly, the response tells how many readings were accepted
+                    if readings > 1 and 200 <= status_code < 300:
+                        readings = json.loads(response_body).get('accepted', 0)
+                    recorder.record(route, latency, status_code, readings)
+                except Exception as error:
+                    recorder.record_error(route, error)
+        finally:
+            await connection.close()
+
+    tasks = [asyncio.create_task(worker()) for _ in range(options.concurrency)]
+    if options.rate:
+        tasks.append(asyncio.create_task(schedule()))
+    await asyncio.gather(*tasks)
+    return recorder, time.perf_counter() - start
+
+
+def print_report(report):
+    """
+    Function that prints the report as a table.
+    """
+    print(f"Duration: {report['duration_s']} s, requests: {report['requests']} ({report['requests_per_s']}/s), "
+          f"readings stored: {report['readings_stored']} ({report['readings_per_s']}/s)")
+    percentile_names = [f'p{percentile}_ms' for percentile in REPORT_PERCENTILES]
+    print(f"{'route':<22}{'requests':>10}{'errors':>9}" + ''.join(f"{name:>10}" for name in percentile_names) +
+          f"{'max_ms':>10}  status codes")
+    for route, summary in report['routes'].items():
+        print(f"{route:<22}{summary['requests']:>10}{summary['error_rate']:>9.2%}" +
+              ''.join(f"{summary[name]:>10}" for name in percentile_names) +
+              f"{summary['max_ms']:>10}  {summary['status_codes']} {summary['errors'] or ''}")
+
+
+def parse_arguments():
+    """
+    Function that reads the command line options of the load generator.
+    """
+    parser = argparse.ArgumentParser(description="Ingest load generator and latency benchmark.")
+    parser.add_argument('--url', default=DEFAULT_URL, help="server to send to (default: %(default)s)")
+    parser.add_argument('--local', action='store_true',
+                        help="call the Flask app in this process through its test client, without a server")
+    parser.add_argument('--duration', type=float, default=10, help="seconds to send readings (default: %(default)s)")
+    parser.add_argument('--rate', type=float, default=0,
+                        help="target requests per second, 0 sends as fast as the workers can (default: %(default)s)")
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help="number of requests in flight (default: %(default)s)")
+    parser.add_argument('--sensors', type=int, default=11, help="number of seat sensors (default: %(default)s)")
+    parser.add_argument('--areas', nargs='*', default=[], help="areas to spread the readings over")
+    parser.add_argument('--waiting-share', type=float, default=0.5,
+                        help="share of requests for the Waiting Area, the rest is for the Customs Area "
+                             "(default: %(default)s)")
+    parser.add_argument('--invalid-share', type=float, default=0,
+                        help="share of readings that are invalid (default: %(default)s)")
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help="readings per request, more than 1 uses the batch routes (default: %(default)s)")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    parser.add_argument('--sequential', type=int, metavar='N',
+                        help="only send N Waiting Area and N Customs Area readings one by one and print the status codes")
+    return parser.parse_args()
 
 
 if __name__ == '__main__':
+    options = parse_arguments()
+
+    if options.sequential:
+        for x in range(options.sequential):
+            send_waiting_area_data(options.url)
+            send_customs_area_data(options.url)
+    else:
+        if options.local:
+            from app import app as flask_app
+            connection_factory = lambda: TestClientConnection(flask_app)
+        else:
+            connection_factory = lambda: HttpConnection(options.url)
 
-    for x in range(75):
-        send_waiting_area_data()
-        send_customs_area_data()
+        recorder, elapsed = asyncio.run(run_load(options, connection_factory))
+        report = recorder.report(elapsed)
+        if options.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print_report(report)
@@ -1,3 +1,31 @@
+// Maximum number of points per chart, the server downsamples longer ranges to this size
+var CHART_MAX_POINTS = 500;
+
+// Cursor and ETag of the last /get_date_range response. The periodic update sends them back, so the server only
+// returns the new readings, or 304 when nothing changed.
+var dateRangeCursor = null;
+var dateRangeETag = null;
+
+// ETag of the last full /get_date_range response of the reload next to the live stream
+var dateRangeReloadETag = null;
+
+// Milliseconds between the reloads of the selected date range next to the live stream. The stream only carries the
+// readings stored by the server process the browser is connected to, and ranges served from the rollups have no
+// cursor, so the whole range is reloaded now and then. The server answers 304 when nothing changed.
+var LIVE_STREAM_RELOAD_INTERVAL = 30000;
+
+// Area (gate) shown on the dashboard, taken from the "area" query parameter of the page. Without it the server shows
+// its default area.
+var DASHBOARD_AREA = new URLSearchParams(window.location.search).get("area");
+
+// Function to add the area of the dashboard to the query parameters of a request
+function withArea(params) {
+  if (DASHBOARD_AREA) {
+    params.area = DASHBOARD_AREA;
+  }
+  return params;
+}
+
 // Function to initialize charts
 function initializeChart(chartId, chartData) {
   // Get the canvas element by its ID
@@ -87,36 +115,20 @@ function initializeChart(chartId, chartData) {
   return chart; // Return the created chart instance
 }
 
-// Function to fetch and initialize charts on page load
-function fetchAndInitializeCharts() {
-  // Fetch chart data for Waiting Area and Customs Area
-  fetchChartData("/waiting_area_data", "waitingAreaChart");
-  fetchChartData("/customs_area_data", "customsAreaChart");
-}
-
-// Function to fetch chart data from the server
-function fetchChartData(url, chartId) {
-  // Fetch data from the specified URL
-  fetch(url)
-    .then((response) => response.json()) // Parse response as JSON
-    .then((chartData) => {
-      // Initialize the chart using the fetched data
-      window[chartId] = initializeChart(chartId, chartData);
-    });
-  applyDateFilter(); // Apply date filter after fetching chart data
-}
-
 // Apply Date Filter function
 function updateCharts(data) {
   console.log("Received data:", data);
 
+  // A delta response only contains new readings, which are appended to the charts
+  var update = data.delta ? appendChart : updateChart;
+
   // Update waiting area chart
   console.log("Updating waitingAreaChart");
-  updateChart(window.waitingAreaChart, data.waiting_area);
+  update(window.waitingAreaChart, data.waiting_area);
 
   // Update customs area chart
   console.log("Updating customsAreaChart");
-  updateChart(window.customsAreaChart, data.customs_area);
+  update(window.customsAreaChart, data.customs_area);
 }
 
 // Function to update HTML elements with statistics data
@@ -153,6 +165,20 @@ function updateHtmlElements(statistics) {
       "#peakCustomOccupancyValue",
       statistics.peak_occupancy_custom + "%"
     );
+
+    // Wait and turnaround times are empty when nobody left the customs area yet
+    updateHtmlElement(
+      "#avgCustomWaitTimeValue",
+      statistics.avg_wait_time_custom === ""
+        ? "No Data Yet"
+        : statistics.avg_wait_time_custom + " min"
+    );
+    updateHtmlElement(
+      "#avgCustomPassengerTurnaroundTimeValue",
+      statistics.avg_passenger_turnaround_time === ""
+        ? "No Data Yet"
+        : statistics.avg_passenger_turnaround_time + " min"
+    );
   }
 }
 
@@ -181,68 +207,193 @@ function applyDateFilter() {
 }
 
 function fetchDataAndUpdate(startDate, endDate) {
-  // AJAX request for updating charts
+  // One AJAX request for the charts, the statistics and the live charts of the selected date range
   $.ajax({
-    url: "/get_date_range", // Endpoint for fetching data for the selected date range
+    url: "/dashboard_snapshot", // Endpoint for fetching everything the dashboard shows for the selected date range
     method: "GET",
-    data: { start_date: startDate, end_date: endDate }, // Data containing the selected date range
+    data: withArea({ start_date: startDate, end_date: endDate, max_points: CHART_MAX_POINTS }), // Data containing the selected date range
     success: function (data) {
-      // If the AJAX request is successful, update the charts with the received data
+      // Remember the cursor for the periodic updates. The ETag of the snapshot is not the ETag of /get_date_range,
+      // so the first update is sent without one.
+      dateRangeCursor = data.cursor;
+      dateRangeETag = null;
+      dateRangeReloadETag = null;
+
+      // On page load the charts are created with the live charts, which also bring the colors of the bars
+      if (!window.waitingAreaChart) {
+        window.waitingAreaChart = initializeChart("waitingAreaChart", data.live.waiting_area);
+      }
+      if (!window.customsAreaChart) {
+        window.customsAreaChart = initializeChart("customsAreaChart", data.live.customs_area);
+      }
+
+      // If the AJAX request is successful, update the charts and the HTML elements with the received data
       updateCharts(data);
+      updateHtmlElements(data.statistics);
     },
     error: function (error) {
       // If there is an error in the AJAX request, log the error to the console
       console.error("Error applying filter:", error);
     },
   });
+}
+
+// Function to fetch the readings of the selected date range that are newer than the cursor
+function refreshCharts() {
+  // Get start and end dates from the DateRangePicker
+  var startDate = $("#dateRangeFilter")
+    .data("daterangepicker")
+    .startDate.format("YYYY-MM-DD");
+  var endDate = $("#dateRangeFilter")
+    .data("daterangepicker")
+    .endDate.format("YYYY-MM-DD");
+
+  // Only ask for readings newer than the cursor of the previous response
+  var requestData = withArea({ start_date: startDate, end_date: endDate, max_points: CHART_MAX_POINTS });
+  if (dateRangeCursor) {
+    requestData.since = dateRangeCursor;
+  }
 
-  // AJAX request for updating HTML elements with statistics
+  // AJAX request to update charts with data for the selected date range
   $.ajax({
-    url: "/get_statistics", // Endpoint for fetching statistics data
+    url: "/get_date_range",
     method: "GET",
-    data: { start_date: startDate, end_date: endDate }, // Data containing the selected date range
-    success: function (statistics) {
-      // If the AJAX request is successful, update the HTML elements with the received statistics
-      updateHtmlElements(statistics);
+    data: requestData,
+    headers: dateRangeETag ? { "If-None-Match": dateRangeETag } : {},
+    success: function (data, textStatus, xhr) {
+      // Nothing changed since the previous update
+      if (xhr.status === 304) {
+        return;
+      }
+
+      // Remember the cursor and ETag for the next update
+      dateRangeCursor = data.cursor;
+      dateRangeETag = xhr.getResponseHeader("ETag");
+
+      // If the AJAX request is successful, update the charts
+      updateCharts(data);
     },
     error: function (error) {
       // If there is an error in the AJAX request, log the error to the console
-      console.error("Error fetching statistics:", error);
+      console.error("Error updating charts:", error);
     },
   });
 }
 
-// Function to periodically update charts
+// Function to periodically update charts, used when the browser does not support Server-Sent Events
 function updateChartsPeriodically() {
   // Call this function once to initialize periodic updates
-  setInterval(function () {
-    // Get start and end dates from the DateRangePicker
-    var startDate = $("#dateRangeFilter")
-      .data("daterangepicker")
-      .startDate.format("YYYY-MM-DD");
-    var endDate = $("#dateRangeFilter")
-      .data("daterangepicker")
-      .endDate.format("YYYY-MM-DD");
-
-    // AJAX request to update charts with data for the selected date range
-    $.ajax({
-      url: "/get_date_range",
-      method: "GET",
-      data: { start_date: startDate, end_date: endDate },
-      success: function (data) {
-        // If the AJAX request is successful, update the charts
-        updateCharts(data);
-      },
-      error: function (error) {
-        // If there is an error in the AJAX request, log the error to the console
-        console.error("Error updating charts:", error);
-      },
-    });
-  }, 5000); // Update every 5 seconds
+  setInterval(refreshCharts, 5000); // Update every 5 seconds
+}
+
+// Function to reload the whole selected date range when it includes today, next to the live stream
+function reloadCharts() {
+  if (!rangeIncludesToday()) {
+    return;
+  }
+
+  // Get start and end dates from the DateRangePicker
+  var startDate = $("#dateRangeFilter")
+    .data("daterangepicker")
+    .startDate.format("YYYY-MM-DD");
+  var endDate = $("#dateRangeFilter")
+    .data("daterangepicker")
+    .endDate.format("YYYY-MM-DD");
+
+  // A request without cursor returns the whole range, or 304 when nothing changed since the previous reload
+  $.ajax({
+    url: "/get_date_range",
+    method: "GET",
+    data: withArea({ start_date: startDate, end_date: endDate, max_points: CHART_MAX_POINTS }),
+    headers: dateRangeReloadETag ? { "If-None-Match": dateRangeReloadETag } : {},
+    success: function (data, textStatus, xhr) {
+      // Nothing changed since the previous reload
+      if (xhr.status === 304) {
+        return;
+      }
+
+      // The charts are replaced, so the live stream and the updates continue from the cursor of the reload
+      dateRangeCursor = data.cursor;
+      dateRangeETag = null;
+      dateRangeReloadETag = xhr.getResponseHeader("ETag");
+      updateCharts(data);
+    },
+    error: function (error) {
+      // If there is an error in the AJAX request, log the error to the console
+      console.error("Error reloading charts:", error);
+    },
+  });
+}
+
+// Function to check whether the selected date range includes today
+function rangeIncludesToday() {
+  return $("#dateRangeFilter")
+    .data("daterangepicker")
+    .endDate.isSameOrAfter(moment(), "day");
+}
+
+// Function to append readings received from the live stream to a chart
+function appendLiveReadings(chart, readings, cursorIndex) {
+  // Live readings only belong in the charts when they show the raw readings up to today
+  if (!dateRangeCursor || !rangeIncludesToday()) {
+    return;
+  }
+
+  // Skip readings the chart already has
+  var cursor = dateRangeCursor.split(",").map(Number);
+  var newIndexes = [];
+  readings.ids.forEach((id, index) => {
+    if (id > cursor[cursorIndex]) {
+      newIndexes.push(index);
+    }
+  });
+  if (newIndexes.length === 0) {
+    return;
+  }
+
+  appendChart(chart, {
+    labels: newIndexes.map((index) => readings.labels[index]),
+    datasets: readings.datasets.map((dataset) => ({
+      data: newIndexes.map((index) => dataset.data[index]),
+    })),
+  });
+
+  // Move the cursor past the appended readings
+  cursor[cursorIndex] = Math.max(...newIndexes.map((index) => readings.ids[index]));
+  dateRangeCursor = cursor.join(",");
+}
+
+// Function to receive new readings from the server as soon as they are stored
+function startLiveUpdates() {
+  // Fall back to polling in browsers without Server-Sent Events
+  if (!window.EventSource) {
+    updateChartsPeriodically();
+    return;
+  }
+
+  var source = new EventSource("/stream?" + $.param(withArea({})));
+
+  source.addEventListener("waiting_area", function (event) {
+    appendLiveReadings(window.waitingAreaChart, JSON.parse(event.data), 0);
+  });
+
+  source.addEventListener("customs_area", function (event) {
+    appendLiveReadings(window.customsAreaChart, JSON.parse(event.data), 1);
+  });
+
+  // After a (re)connect, fetch the readings that were stored while the stream was down
+  source.onopen = function () {
+    if (dateRangeCursor) {
+      refreshCharts();
+    }
+  };
+
+  // Reload the range now and then for the readings the stream does not carry
+  setInterval(reloadCharts, LIVE_STREAM_RELOAD_INTERVAL);
 }
 
-// Initialize periodic chart updates
-updateChartsPeriodically();
+// Initialize live chart updates
+startLiveUpdates();
 
 // Event listener for Apply Filter button
 $(".applyButton").click(function () {
@@ -267,13 +418,36 @@ $(".resetButton").click(function () {
 $(function () {
   $("#dateRangeFilter").daterangepicker();
 
-  // Apply date filter on page load
-  applyDateFilter();
+  // Draw the charts and statistics of today that are embedded in the page. When they cover the selected range, the
+  // updates continue from the cursor of the snapshot and the range is not fetched again.
+  if (typeof INITIAL_SNAPSHOT !== "undefined" && INITIAL_SNAPSHOT) {
+    showInitialSnapshot(INITIAL_SNAPSHOT);
+    if (snapshotCoversSelectedRange(INITIAL_SNAPSHOT)) {
+      dateRangeCursor = INITIAL_SNAPSHOT.cursor;
+      return;
+    }
+  }
 
-  // Fetch and initialize charts on page load
-  fetchAndInitializeCharts();
+  // Apply date filter on page load, this creates the charts when there is no embedded snapshot
+  applyDateFilter();
 });
 
+// Function to create the charts and fill in the statistics from the snapshot embedded in the page
+function showInitialSnapshot(snapshot) {
+  window.waitingAreaChart = initializeChart("waitingAreaChart", snapshot.waiting_area);
+  window.customsAreaChart = initializeChart("customsAreaChart", snapshot.customs_area);
+  updateHtmlElements(snapshot.statistics);
+}
+
+// Function to check whether the snapshot embedded in the page is the snapshot of the selected date range
+function snapshotCoversSelectedRange(snapshot) {
+  var picker = $("#dateRangeFilter").data("daterangepicker");
+  return (
+    picker.startDate.format("YYYY-MM-DD") === snapshot.date &&
+    picker.endDate.format("YYYY-MM-DD") === snapshot.date
+  );
+}
+
 // Function to update charts with new data
 function updateChart(chart, newData) {
   if (newData && newData.labels && newData.datasets) {
@@ -289,6 +463,28 @@ function updateChart(chart, newData) {
   }
 }
 
+// Function to append new readings to a chart
+function appendChart(chart, newData) {
+  if (!chart) {
+    return;
+  }
+  if (newData && newData.labels && newData.datasets) {
+    // Nothing new to show
+    if (newData.labels.length === 0) {
+      return;
+    }
+    chart.data.labels.push(...newData.labels);
+    chart.data.datasets.forEach((dataset, index) => {
+      if (newData.datasets[index] && newData.datasets[index].data) {
+        dataset.data.push(...newData.datasets[index].data);
+      }
+    });
+    chart.update();
+  } else {
+    console.error("Invalid newData object:", newData);
+  }
+}
+
 // Function to export data to CSV format
 function exportData(area) {
   // Get start and end dates from the DateRangePicker
@@ -299,6 +495,9 @@ function exportData(area) {
 
   // Construct export URL
   let exportUrl = `/export_data_to_csv?start_date=${startDate}&end_date=${endDate}&area=${area}`;
+  if (DASHBOARD_AREA) {
+    exportUrl += `&area_id=${encodeURIComponent(DASHBOARD_AREA)}`;
+  }
 
   // Redirect to export URL
   window.location.href = exportUrl;
@@ -0,0 +1,28 @@
+"""
+The tests run against a copy of the shipped database (instance/passenger_tracking.db), so the shipped database is never
+modified.
+"""
+import os
+import shutil
+import tempfile
+
+import pytest
+
+PACKAGE_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHIPPED_DATABASE = os.path.join(PACKAGE_DIRECTORY, 'instance', 'passenger_tracking.db')
+
+# The app reads its configuration on import, so the copy of the database is configured before the tests import it
+DATABASE_COPY = os.path.join(tempfile.mkdtemp(prefix='moldash-test-'), 'passenger_tracking.db')
+shutil.copyfile(SHIPPED_DATABASE, DATABASE_COPY)
+os.environ['MOLDASH_DATABASE_URI'] = f'sqlite:///{DATABASE_COPY}'
+os.environ['MOLDASH_RETENTION_INTERVAL_SECONDS'] = '0'
+os.environ['MOLDASH_INGEST_WRITE_BEHIND'] = 'false'
+os.environ['MOLDASH_LOG_LEVEL'] = 'ERROR'
+os.environ.pop('MOLDASH_AREAS_FILE', None)
+
+
+@pytest.fixture
+def client():
+    import app as app_module
+    with app_module.app.app_context():
+        yield app_module.app.test_client()
@@ -0,0 +1,54 @@
+"""
+The analytics are calculated from the integrals in the rollups, which are kept up to date on ingest and recalculated
+when the rollups are rebuilt.
+"""
+from datetime import datetime, timedelta
+
+import app as app_module
+
+
+def test_analytics_integrals_on_ingest_and_rebuild(client):
+    # Ten readings 30 seconds apart with 0 up to 9 people, every count is held until the next reading
+    start = datetime(2025, 6, 1, 12)
+    rows = [app_module.build_customs_area_row(
+        {'entrance_point': people, 'before_passport_point': 0, 'after_passport_point': 0, 'exit_point': 0,
+         'timestamp': (start + timedelta(seconds=30 * people)).isoformat()}, None) for people in range(10)]
+    app_module.store_rows(app_module.CustomsArea, rows)
+
+    def load_series():
+        return app_module.load_bucket_series(app_module.CustomsArea, app_module.DEFAULT_AREA, start,
+                                             start + timedelta(hours=1))
+
+    for rebuild in (False, True):
+        if rebuild:
+            app_module.rebuild_rollups(app_module.CustomsArea)
+        series = load_series()
+        assert round(series.held_seconds()) == 9 * 30
+        assert round(series.mean(), 3) == 4.0
+        assert series.extremes() == (0.0, 9.0)
+
+
+def test_held_interval_belongs_to_the_bucket_of_the_held_reading(client, monkeypatch):
+    # An area of its own without a live window buffer, so the readings of the other tests are not the previous reading
+    monkeypatch.setattr(app_module, 'append_live_readings', lambda model, ids, rows: None)
+    start = datetime(2025, 6, 2, 12)
+    rows = [{'area_id': 'analytics_test', 'entrance_point': people, 'before_passport_point': 0,
+             'after_passport_point': 0, 'exit_point': 0, 'current_people_count': people,
+             'timestamp': start + timedelta(seconds=seconds)} for seconds, people in ((30, 5), (70, 0), (80, 3))]
+    for row in rows:
+        app_module.store_rows(app_module.CustomsArea, [row])
+
+    def load_minutes():
+        rollup_model = app_module.CustomsAreaRollup
+        buckets = app_module.db.session.execute(
+            app_module.select(rollup_model.bucket_start, rollup_model.analytics_value_seconds_sum,
+                              rollup_model.analytics_held_seconds_sum)
+            .where(rollup_model.area_id == 'analytics_test', rollup_model.granularity == 'minute')).all()
+        return {bucket_start: (round(value_seconds, 3), round(held_seconds, 3))
+                for bucket_start, value_seconds, held_seconds in buckets}
+
+    # 5 people were held for 40 seconds from the reading in the first minute, nobody for 10 seconds in the second
+    for rebuild in (False, True):
+        if rebuild:
+            app_module.rebuild_rollups(app_module.CustomsArea)
+        assert load_minutes() == {start: (200.0, 40.0), start + timedelta(minutes=1): (0.0, 10.0)}
@@ -0,0 +1,51 @@
+"""
+A batch reports the status of every reading, an invalid or unstorable reading does not reject the rest of the batch.
+"""
+import app as app_module
+
+
+def customs_reading(entrance_point):
+    return {'entrance_point': entrance_point, 'before_passport_point': 0, 'after_passport_point': 0, 'exit_point': 0}
+
+
+def count_rows():
+    return app_module.db.session.execute(
+        app_module.select(app_module.func.count()).select_from(app_module.CustomsArea)).scalar()
+
+
+def test_batch_reports_every_reading(client):
+    before = count_rows()
+
+    response = client.post('/customs_area/batch',
+                           json=[customs_reading(1), customs_reading(-1), customs_reading(10 ** 20), customs_reading(2)])
+
+    assert response.status_code == 207
+    body = response.get_json()
+    assert (body['accepted'], body['rejected']) == (2, 2)
+    assert [result['status'] for result in body['results']] == ['ok', 'error', 'error', 'ok']
+    assert count_rows() == before + 2
+
+
+def test_count_outside_the_integer_range_is_rejected(client):
+    assert client.post('/customs_area', json=customs_reading(-1)).status_code == 400
+    assert client.post('/customs_area', json=customs_reading(2 ** 63)).status_code == 400
+    assert client.post('/customs_area/batch', json=[customs_reading(-1)]).status_code == 400
+
+
+def test_failed_group_commit_is_stored_per_reading(client, monkeypatch):
+    store_rows = app_module.store_rows
+
+    # The group commit fails and the reading with 13 people cannot be stored on its own either
+    def failing_store_rows(model, rows):
+        if len(rows) > 1 or rows[0]['entrance_point'] == 13:
+            raise RuntimeError("store failed")
+        return store_rows(model, rows)
+
+    monkeypatch.setattr(app_module, 'store_rows', failing_store_rows)
+    before = count_rows()
+
+    response = client.post('/customs_area/batch', json=[customs_reading(1), customs_reading(13), customs_reading(2)])
+
+    assert response.status_code == 207
+    assert [result['status'] for result in response.get_json()['results']] == ['ok', 'error', 'ok']
+    assert count_rows() == before + 2
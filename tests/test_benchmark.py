@@ -0,0 +1,22 @@
+"""
+The read benchmark seeds a database, times every read route and finds no full scans of the large tables.
+"""
+import json
+import subprocess
+import sys
+
+from conftest import PACKAGE_DIRECTORY
+
+
+def test_small_benchmark_run(tmp_path):
+    output = subprocess.run(
+        [sys.executable, 'benchmark.py', '--rows', '2000', '--days', '2', '--ranges', 'day', '--repeat', '1',
+         '--database', str(tmp_path / 'benchmark.db'), '--json'],
+        cwd=PACKAGE_DIRECTORY, capture_output=True, text=True, timeout=300, check=True).stdout
+    report = json.loads(output)
+
+    assert report['rows_per_table'] == 2000
+    assert report['full_scans'] == []
+    assert {'/get_date_range day', '/get_statistics day', '/dashboard_snapshot day'} <= set(report['results'])
+    for result in report['results'].values():
+        assert result['response_bytes'] > 0 and result['median_ms'] <= result['max_ms']
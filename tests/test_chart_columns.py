@@ -0,0 +1,44 @@
+"""
+The projected chart queries load only the requested columns, with the same values as the ORM objects.
+"""
+from datetime import datetime
+
+import app as app_module
+
+START = datetime(2024, 2, 5)
+END = datetime(2024, 2, 6)
+
+
+def load_readings():
+    model = app_module.CustomsArea
+    return app_module.db.session.execute(app_module.select(model).where(
+        model.area_id == app_module.DEFAULT_AREA, model.timestamp.between(START, END)
+    ).order_by(model.timestamp)).scalars().all()
+
+
+def test_chart_columns_match_the_readings(client):
+    readings = load_readings()
+    assert readings
+
+    columns = app_module.load_chart_columns(app_module.CustomsArea, app_module.DEFAULT_AREA, START, END,
+                                            ['exit_point', 'current_people_count'])
+
+    assert list(columns) == ['id', 'timestamp', 'exit_point', 'current_people_count']
+    assert columns['id'] == [reading.id for reading in readings]
+    assert columns['timestamp'] == [reading.timestamp for reading in readings]
+    assert columns['exit_point'] == [reading.exit_point for reading in readings]
+    assert columns['current_people_count'] == [reading.current_people_count for reading in readings]
+
+
+def test_since_id_only_loads_newer_readings(client):
+    readings = load_readings()
+    since_id = sorted(reading.id for reading in readings)[len(readings) // 2]
+
+    columns = app_module.load_chart_columns(app_module.CustomsArea, app_module.DEFAULT_AREA, START, END,
+                                            ['exit_point'], since_id)
+    assert sorted(columns['id']) == sorted(reading.id for reading in readings if reading.id > since_id)
+
+
+def test_rows_to_columns():
+    assert app_module.rows_to_columns([], ['id', 'timestamp']) == {'id': [], 'timestamp': []}
+    assert app_module.rows_to_columns([(1, 'a'), (2, 'b')], ['id', 'name']) == {'id': [1, 2], 'name': ['a', 'b']}
@@ -0,0 +1,75 @@
+"""
+The compact chart format holds the same points as the full format, and large JSON responses are compressed.
+"""
+import gzip
+import itertools
+import json
+from datetime import timedelta
+
+import pytest
+
+import app as app_module
+
+QUERY = '/get_date_range?start_date=2024-02-05&end_date=2024-02-05'
+
+
+def decode_compact_chart(chart, styles):
+    # The timestamps are milliseconds since the epoch, every one after the first as the difference with the previous
+    timestamps = [app_module.CHART_EPOCH + timedelta(milliseconds=milliseconds)
+                  for milliseconds in itertools.accumulate(chart['timestamps'])]
+    return {
+        'labels': [timestamp.strftime('%Y-%m-%d %H:%M:%S') for timestamp in timestamps],
+        'datasets': [{'label': dataset['label'], 'data': values}
+                     for dataset, values in zip(styles[chart['style']], chart['series'])],
+    }
+
+
+@pytest.mark.parametrize('parameters', ['', '&max_points=10&downsample=minmax'])
+def test_compact_charts_hold_the_same_points(client, parameters):
+    styles = client.get('/chart_styles').get_json()
+    full = client.get(f'{QUERY}{parameters}').get_json()
+    compact = client.get(f'{QUERY}{parameters}&format=compact').get_json()
+
+    assert compact['cursor'] == full['cursor']
+    for chart in ('waiting_area', 'customs_area'):
+        decoded = decode_compact_chart(compact[chart], styles)
+        assert decoded['labels'] == full[chart]['labels']
+        assert decoded['datasets'] == [{'label': dataset['label'], 'data': dataset['data']}
+                                       for dataset in full[chart]['datasets']]
+
+    assert len(json.dumps(compact)) < len(json.dumps(full))
+
+
+def test_large_responses_are_compressed_with_gzip(client):
+    plain = client.get(QUERY)
+    assert 'Content-Encoding' not in plain.headers
+
+    response = client.get(QUERY, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert json.loads(gzip.decompress(response.data)) == plain.get_json()
+
+    # The ETag of the compressed response is weak and still answers 304
+    etag, weak = response.get_etag()
+    assert weak and etag == plain.get_etag()[0]
+    assert client.get(QUERY, headers={'Accept-Encoding': 'gzip', 'If-None-Match': f'W/"{etag}"'}).status_code == 304
+
+
+def test_small_responses_and_unsupported_encodings_are_not_compressed(client):
+    small = client.get('/get_statistics?start_date=2024-02-05&end_date=2024-02-05', headers={'Accept-Encoding': 'gzip'})
+    assert len(small.data) < app_module.RESPONSE_COMPRESSION_MIN_BYTES
+    assert 'Content-Encoding' not in small.headers
+
+    if app_module.brotli is None:
+        assert 'Content-Encoding' not in client.get(QUERY, headers={'Accept-Encoding': 'br'}).headers
+
+
+def test_brotli_is_preferred_when_installed(client):
+    brotli = pytest.importorskip('brotli')
+    response = client.get(QUERY, headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert json.loads(brotli.decompress(response.data)) == client.get(QUERY).get_json()
+
+
+def test_unknown_chart_format(client):
+    assert client.get(f'{QUERY}&format=csv').status_code == 400
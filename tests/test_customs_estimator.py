@@ -0,0 +1,55 @@
+"""
+The customs estimator calculates the departures from the cumulative exit point counter, on ingest and when the rollups
+are rebuilt.
+"""
+from datetime import datetime, timedelta
+
+import app as app_module
+
+# An area of its own, so the readings of the other tests are not the previous reading
+AREA = 'estimator_test'
+
+
+def customs_row(timestamp, waiting, exit_point):
+    return {'area_id': AREA, 'entrance_point': waiting, 'before_passport_point': 0, 'after_passport_point': 0,
+            'exit_point': exit_point, 'current_people_count': waiting, 'timestamp': timestamp}
+
+
+def load_totals(start):
+    return app_module.load_area_totals(app_module.CustomsArea, AREA, start, start + timedelta(days=1))
+
+
+def test_departures_from_the_cumulative_exit_counter(client, monkeypatch):
+    # The area is not configured, so it has no live window buffer
+    monkeypatch.setattr(app_module, 'append_live_readings', lambda model, ids, rows: None)
+
+    # The counter goes up by 5 and 3, is reset and counts 2 again, a minute apart with 6 people waiting
+    start = datetime(2025, 5, 1, 12)
+    rows = [customs_row(start + timedelta(minutes=minute), 6, exit_point)
+            for minute, exit_point in enumerate((0, 5, 8, 2))]
+    rollup_rows = app_module.update_customs_estimates(rows)
+    assert [row['departures'] for row in rollup_rows] == [0, 5, 3, 2]
+    app_module.db.session.rollback()
+
+    for row in rows:
+        app_module.store_rows(app_module.CustomsArea, [row])
+        assert app_module.db.session.get(app_module.CustomsEstimate, AREA).last_exit == row['exit_point']
+
+    for rebuild in (False, True):
+        if rebuild:
+            app_module.rebuild_rollups(app_module.CustomsArea)
+        totals = load_totals(start)
+        assert totals['departures_sum'] == 10
+
+        # 6 people waited for 3 minutes while 10 people left: 1.8 minutes each
+        statistics = app_module.calculate_customs_area_statistics(totals)
+        assert statistics['avg_wait_time_custom'] == 1.8
+
+
+def test_reading_after_a_long_gap_adds_no_departures(client):
+    start = datetime(2025, 5, 2, 12)
+    rows = [customs_row(start, 6, 10),
+            customs_row(start + app_module.CUSTOMS_ESTIMATE_MAX_GAP + timedelta(minutes=1), 6, 20)]
+    rollup_rows = app_module.update_customs_estimates(rows)
+    assert rollup_rows[1]['departures'] == 0
+    app_module.db.session.rollback()
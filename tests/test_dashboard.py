@@ -0,0 +1,40 @@
+"""
+The dashboard page embeds the snapshot of today, so the page does not have to load the range again.
+"""
+import json
+import re
+
+import app as app_module
+
+
+def load_initial_snapshot(client):
+    page = client.get('/').get_data(as_text=True)
+    return json.loads(re.search(r'var INITIAL_SNAPSHOT = (.*);', page).group(1))
+
+
+def test_initial_snapshot_continues_from_its_cursor(client):
+    snapshot = load_initial_snapshot(client)
+    assert snapshot['cursor'] == f"{app_module.get_max_id(app_module.WaitingArea)}," \
+                                 f"{app_module.get_max_id(app_module.CustomsArea)}"
+    assert snapshot['date'] == app_module.get_today_start().strftime('%Y-%m-%d')
+
+    # A reading stored after the page was rendered is sent by the update from the cursor
+    reading = {'entrance_point': 3, 'before_passport_point': 0, 'after_passport_point': 0, 'exit_point': 0}
+    assert client.post('/customs_area', json=reading).status_code == 201
+    response = client.get('/get_date_range', query_string={
+        'start_date': snapshot['date'], 'end_date': snapshot['date'], 'since': snapshot['cursor']})
+    data = response.get_json()
+    assert data['delta'] is True
+    assert len(data['customs_area']['labels']) == 1
+
+
+def test_today_follows_the_timezone_of_the_readings(client, monkeypatch):
+    # Half a day ahead of the server, today on the page is the day of the timestamps that ingest stores
+    monkeypatch.setattr(app_module, 'DASHBOARD_TIMEZONE', app_module.ZoneInfo('Pacific/Auckland'))
+    reading = {'entrance_point': 3, 'before_passport_point': 0, 'after_passport_point': 0, 'exit_point': 0}
+    assert client.post('/customs_area', json=reading).status_code == 201
+
+    last_timestamp = app_module.db.session.execute(app_module.select(app_module.CustomsArea.timestamp).order_by(
+        app_module.CustomsArea.id.desc()).limit(1)).scalar()
+    assert load_initial_snapshot(client)['date'] == last_timestamp.strftime('%Y-%m-%d')
+    assert app_module.range_includes_today(last_timestamp + app_module.timedelta(seconds=1))
@@ -0,0 +1,42 @@
+"""
+"/dashboard_snapshot" holds the same charts and statistics as the separate routes, and answers 304 while nothing changed.
+"""
+from datetime import datetime
+
+import app as app_module
+
+
+def test_snapshot_holds_the_responses_of_the_separate_routes(client):
+    dates = 'start_date=2024-02-03&end_date=2024-02-05'
+    snapshot = client.get(f'/dashboard_snapshot?{dates}&max_points=20').get_json()
+
+    date_range = client.get(f'/get_date_range?{dates}&max_points=20').get_json()
+    for key in ('waiting_area', 'customs_area', 'cursor', 'delta'):
+        assert snapshot[key] == date_range[key]
+    assert snapshot['statistics'] == client.get(f'/get_statistics?{dates}').get_json()
+
+    assert snapshot['live']['waiting_area']['labels'] == client.get('/waiting_area_data').get_json()['labels']
+    assert snapshot['live']['customs_area']['labels'] == client.get('/customs_area_data').get_json()['labels']
+
+
+def test_snapshot_answers_304_until_the_range_changes(client):
+    query = '/dashboard_snapshot?start_date=2024-03-11&end_date=2024-03-11'
+    first = client.get(query)
+    assert first.get_json()['customs_area']['labels'] == []
+    etag = first.headers['ETag']
+    assert client.get(query, headers={'If-None-Match': etag}).status_code == 304
+
+    # A day without shipped readings, so only the reading of this test is in the range
+    app_module.store_rows(app_module.CustomsArea, [
+        {'area_id': app_module.DEFAULT_AREA, 'entrance_point': 2, 'before_passport_point': 1,
+         'after_passport_point': 0, 'exit_point': 0, 'current_people_count': 3, 'timestamp': datetime(2024, 3, 11, 8)}])
+
+    second = client.get(query, headers={'If-None-Match': etag})
+    assert second.status_code == 200
+    assert second.get_json()['customs_area']['labels'] == ['2024-03-11 08:00:00']
+    assert second.get_json()['statistics']['peak_occupancy_custom'] == 3
+
+
+def test_snapshot_of_invalid_arguments(client):
+    assert client.get('/dashboard_snapshot?start_date=2024-02-05').status_code == 400
+    assert client.get('/dashboard_snapshot?start_date=2024-02-05&end_date=2024-02-05&area=lounge').status_code == 400
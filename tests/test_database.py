@@ -0,0 +1,20 @@
+"""
+Every connection gets the SQLite connection profile, and the time-series queries are served by the indexes.
+"""
+import app as app_module
+
+
+def test_connections_use_the_connection_profile(client):
+    connection = app_module.db.session.connection()
+    assert connection.exec_driver_sql('PRAGMA journal_mode').scalar().upper() == 'WAL'
+    assert connection.exec_driver_sql('PRAGMA busy_timeout').scalar() == app_module.SQLITE_PRAGMAS['busy_timeout']
+    assert connection.exec_driver_sql('PRAGMA cache_size').scalar() == app_module.SQLITE_PRAGMAS['cache_size']
+
+
+def test_range_queries_use_the_area_timestamp_index(client):
+    # The shipped database was created before the indexes, migrate_database added them on startup
+    for table in ('waiting_area', 'customs_area'):
+        plan = ' '.join(row[-1] for row in app_module.db.session.connection().exec_driver_sql(
+            f"EXPLAIN QUERY PLAN SELECT timestamp FROM {table} "
+            f"WHERE area_id = 'main' AND timestamp >= '2024-01-01' ORDER BY timestamp"))
+        assert f'ix_{table}_area_id_timestamp' in plan
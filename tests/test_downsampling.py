@@ -0,0 +1,66 @@
+"""
+Downsampling keeps at most max_points points of a chart, without losing its first and last point or its peaks.
+"""
+import math
+
+import pytest
+
+from downsampling import downsample_indices
+
+
+def make_series(number_of_points):
+    # A wave and a series with a single peak in the middle
+    wave = [round(10 + 10 * math.sin(index / 7), 3) for index in range(number_of_points)]
+    peak = [100 if index == number_of_points // 2 + 3 else index % 5 for index in range(number_of_points)]
+    return list(range(number_of_points)), [wave, peak]
+
+
+@pytest.mark.parametrize('max_points', [3, 10, 57, 250])
+def test_lttb_keeps_exactly_max_points(max_points):
+    x_values, series = make_series(1000)
+    indices = downsample_indices(x_values, series, max_points, 'lttb')
+
+    assert len(indices) == max_points
+    assert indices == sorted(set(indices))
+    assert indices[0] == 0 and indices[-1] == 999
+
+
+@pytest.mark.parametrize('max_points', [3, 4, 10, 57, 250])
+def test_minmax_keeps_at_most_max_points_and_the_peaks(max_points):
+    x_values, series = make_series(1000)
+    indices = downsample_indices(x_values, series, max_points, 'minmax')
+
+    assert 0 < len(indices) <= max_points
+    assert indices == sorted(set(indices))
+    assert indices[0] == 0 and indices[-1] == 999
+    # Besides the first and last point, the minimum and maximum of every series fitting in the rest are kept
+    checked_series = series[:(max_points - 2) // 2]
+    for values in checked_series:
+        assert values.index(min(values)) in indices
+        assert values.index(max(values)) in indices
+
+
+def test_short_charts_and_unknown_modes():
+    x_values, series = make_series(20)
+    assert downsample_indices(x_values, series, None) == list(range(20))
+    assert downsample_indices(x_values, series, 50, 'minmax') == list(range(20))
+
+    with pytest.raises(ValueError):
+        downsample_indices(x_values, series, 10, 'average')
+
+
+def test_date_range_route_limits_the_points(client):
+    query = '/get_date_range?start_date=2024-02-05&end_date=2024-02-05'
+    full = client.get(query).get_json()
+    assert len(full['customs_area']['labels']) > 10
+
+    for mode in ('lttb', 'minmax'):
+        data = client.get(f'{query}&max_points=10&downsample={mode}').get_json()
+        for chart in ('waiting_area', 'customs_area'):
+            labels = data[chart]['labels']
+            assert len(labels) <= 10
+            assert labels[0] == full[chart]['labels'][0] and labels[-1] == full[chart]['labels'][-1]
+            assert all(len(dataset['data']) == len(labels) for dataset in data[chart]['datasets'])
+
+    assert client.get(f'{query}&max_points=2').status_code == 400
+    assert client.get(f'{query}&downsample=average').status_code == 400
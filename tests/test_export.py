@@ -0,0 +1,98 @@
+"""
+Every export format holds the same rows, also when the export is streamed in many chunks.
+"""
+import csv
+import gzip
+import io
+import json
+import struct
+from datetime import datetime
+
+import pytest
+
+import app as app_module
+
+QUERY = '/export_data_to_csv?area=customs_area&start_date=02/05/2024&end_date=02/05/2024'
+
+
+def expected_rows():
+    model, columns = app_module.EXPORT_COLUMNS['customs_area']
+    return [tuple(row) for row in app_module.db.session.execute(
+        app_module.select(*[getattr(model, attribute) for attribute, name in columns]).where(
+            model.area_id == app_module.DEFAULT_AREA,
+            model.timestamp.between(datetime(2024, 2, 5), datetime(2024, 2, 6))).order_by(model.timestamp))]
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    # Small chunks, so the day is streamed in several blocks
+    monkeypatch.setattr(app_module, 'EXPORT_CHUNK_ROWS', 10)
+
+
+def test_csv_export_is_streamed_in_chunks(client, small_chunks):
+    rows = expected_rows()
+    assert len(rows) > 10
+
+    response = client.get(QUERY)
+    assert response.status_code == 200
+    assert response.is_streamed
+    blocks = list(response.response)
+    assert len(blocks) > 1
+
+    lines = list(csv.reader(io.StringIO(b''.join(blocks).decode())))
+    assert lines[0] == [name for attribute, name in app_module.EXPORT_COLUMNS['customs_area'][1]]
+    assert lines[1:] == [[str(value) for value in row] for row in rows]
+
+
+def test_gzip_export_holds_the_csv(client, small_chunks):
+    plain = client.get(QUERY).data
+    response = client.get(f'{QUERY}&compression=gzip')
+    assert response.mimetype == 'application/gzip'
+    assert response.headers['Content-Disposition'].endswith('.csv.gz"')
+    assert gzip.decompress(response.data) == plain
+
+
+def test_binary_export(client, small_chunks):
+    rows = expected_rows()
+    data = client.get(f'{QUERY}&format=binary').data
+    assert data.startswith(app_module.BINARY_EXPORT_MAGIC)
+
+    offset = len(app_module.BINARY_EXPORT_MAGIC)
+    header_length, = struct.unpack_from('<I', data, offset)
+    header = json.loads(data[offset + 4:offset + 4 + header_length])
+    assert [column['type'] for column in header][-1] == 'timestamp_us'
+    offset += 4 + header_length
+
+    # Read the chunks column by column until the closing zero
+    exported = []
+    while True:
+        number_of_rows, = struct.unpack_from('<I', data, offset)
+        offset += 4
+        if number_of_rows == 0:
+            break
+        column_values = []
+        for column in header:
+            column_values.append(struct.unpack_from(f'<{number_of_rows}q', data, offset))
+            offset += 8 * number_of_rows
+        exported.extend(zip(*column_values))
+
+    assert offset == len(data)
+    epoch = datetime(1970, 1, 1)
+    assert exported == [row[:-1] + ((row[-1] - epoch) // app_module.timedelta(microseconds=1),) for row in rows]
+
+
+def test_parquet_export(client, small_chunks):
+    parquet = pytest.importorskip('pyarrow.parquet')
+    rows = expected_rows()
+
+    response = client.get(f'{QUERY}&format=columnar')
+    assert response.mimetype == 'application/vnd.apache.parquet'
+    table = parquet.read_table(io.BytesIO(response.data))
+    assert table.num_rows == len(rows)
+    assert [tuple(row.values()) for row in table.to_pylist()] == rows
+
+
+def test_invalid_export_arguments(client):
+    assert client.get(f'{QUERY}&format=xlsx').status_code == 400
+    assert client.get(f'{QUERY}&compression=zip').status_code == 400
+    assert client.get(QUERY.replace('customs_area', 'lounge')).status_code == 400
@@ -0,0 +1,38 @@
+"""
+The bulk import writes readings with their original timestamps, and updates what the ingest routes update per reading.
+"""
+import json
+
+import app as app_module
+
+
+def test_import_command_updates_the_customs_estimator(client, tmp_path, monkeypatch):
+    # An area of its own, so the readings of the other tests are not in its estimator state
+    monkeypatch.setitem(app_module.AREAS, 'import_test', dict(app_module.AREAS[app_module.DEFAULT_AREA]))
+    readings = [{'area': 'import_test', 'entrance_point': 4, 'before_passport_point': 0, 'after_passport_point': 0,
+                 'exit_point': exit_point, 'timestamp': f'2025-03-01T12:0{minute}:00'}
+                for minute, exit_point in enumerate((10, 14, 20))]
+    import_file = tmp_path / 'customs.ndjson'
+    import_file.write_text('\n'.join(json.dumps(reading) for reading in readings) + '\n{"exit_point": 1}\n')
+
+    result = app_module.app.test_cli_runner().invoke(args=['import-readings', str(import_file), '--table', 'customs_area'])
+    assert result.exit_code == 0
+    assert '3 readings imported, 1 rejected' in result.output
+
+    state = app_module.db.session.get(app_module.CustomsEstimate, 'import_test')
+    assert state.last_exit == 20
+    assert state.last_timestamp.isoformat() == '2025-03-01T12:02:00'
+    assert state.departures > 0
+
+
+def test_csv_import_only_turns_counts_into_integers(client, tmp_path):
+    import_file = tmp_path / 'waiting.csv'
+    import_file.write_text('Sensor,Status,timestamp\n0042,OCCUPIED,2025-03-02T12:00:00\n')
+
+    result = app_module.import_readings(app_module.WaitingArea, import_file.open(encoding='utf-8'), 'csv')
+    assert result['imported'] == 1
+
+    sensor_ids = app_module.db.session.execute(
+        app_module.select(app_module.WaitingArea.sensor_id).where(
+            app_module.WaitingArea.timestamp == app_module.datetime(2025, 3, 2, 12))).scalars().all()
+    assert sensor_ids == ['0042']
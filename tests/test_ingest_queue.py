@@ -0,0 +1,60 @@
+"""
+The write-behind writer stores queued readings in group commits, a reading that cannot be stored must not block it.
+"""
+from datetime import datetime
+
+import app as app_module
+
+
+def customs_row(entrance_point):
+    return {'area_id': app_module.DEFAULT_AREA, 'entrance_point': entrance_point, 'before_passport_point': 0,
+            'after_passport_point': 0, 'exit_point': 0, 'current_people_count': entrance_point,
+            'timestamp': datetime(2025, 7, 1, 12)}
+
+
+def count_rows():
+    return app_module.db.session.execute(
+        app_module.select(app_module.func.count()).select_from(app_module.CustomsArea)).scalar()
+
+
+def dropped_rows():
+    return app_module.ingest_rows_dropped.values.get(('customs_area',), 0)
+
+
+def test_poison_reading_does_not_block_the_writer(client):
+    ingest_queue = app_module.IngestQueue(maxsize=10, flush_interval=0.01, flush_rows=10)
+    before, dropped_before = count_rows(), dropped_rows()
+
+    # A value SQLite cannot store fails the group commit, the good readings around it are stored one at a time
+    pending = [(app_module.CustomsArea, customs_row(1)), (app_module.CustomsArea, customs_row(10 ** 20)),
+               (app_module.CustomsArea, customs_row(2))]
+    assert ingest_queue.flush(pending) == []
+    assert count_rows() == before + 2
+    assert dropped_rows() == dropped_before + 1
+
+    # Later readings are stored with a group commit again
+    assert ingest_queue.flush([(app_module.CustomsArea, customs_row(3))]) == []
+    assert count_rows() == before + 3
+
+
+def test_full_queue_pushes_back_and_the_writer_stores_the_queue(client, monkeypatch):
+    # A writer that is not started, so the readings stay in the queue until it is flushed below
+    ingest_queue = app_module.IngestQueue(maxsize=2, flush_interval=0.01, flush_rows=10)
+    monkeypatch.setattr(app_module, 'ingest_queue', ingest_queue)
+    monkeypatch.setattr(app_module, 'INGEST_WRITE_BEHIND', True)
+    reading = {'entrance_point': 4, 'before_passport_point': 0, 'after_passport_point': 0, 'exit_point': 0}
+    before = count_rows()
+
+    assert client.post('/customs_area', json=reading).status_code == 202
+    assert client.post('/customs_area', json=reading).status_code == 202
+    response = client.post('/customs_area', json=reading)
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1'
+    assert count_rows() == before
+
+    # The writer takes both queued readings and stores them in one group commit
+    pending = []
+    ingest_queue.take(pending)
+    assert len(pending) == 2 and ingest_queue.depth() == 0
+    assert ingest_queue.flush(pending) == []
+    assert count_rows() == before + 2
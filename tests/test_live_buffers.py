@@ -0,0 +1,45 @@
+"""
+The live window buffers must serve the readings of other processes as well, which are written to the database without
+passing through store_rows of this process.
+"""
+import app as app_module
+
+
+def live_timestamp():
+    # The live windows are in the timezone of the dashboard, like the timestamps of the readings
+    return app_module.get_live_window(app_module.WAITING_AREA_LIVE_WINDOW)[1]
+
+
+def load_live_ids():
+    start_time, end_time = app_module.get_live_window(app_module.WAITING_AREA_LIVE_WINDOW)
+    columns = app_module.dataset_columns(app_module.WAITING_AREA_LIVE_DATASETS)
+    return app_module.load_live_chart_columns(
+        app_module.WaitingArea, app_module.DEFAULT_AREA, start_time, end_time, columns)['id']
+
+
+def store_row_of_other_process():
+    # Another worker writes the reading straight to the database
+    row = app_module.build_waiting_area_row({'Sensor': 'druksensor', 'Status': 'UIT'}, live_timestamp())
+    row.update(taken_seats=0, free_seats=row['total_seats'], total_people=0)
+    reading_id = app_module.db.session.execute(
+        app_module.insert(app_module.WaitingArea).returning(app_module.WaitingArea.id), [row]).scalar_one()
+    app_module.db.session.commit()
+    return reading_id
+
+
+def test_readings_of_other_processes_are_served(client):
+    assert app_module.live_buffers
+    other_id = store_row_of_other_process()
+    assert client.post('/waiting_area', json={'Sensor': 'druksensor_1', 'Status': 'UIT', 'timestamp': live_timestamp().isoformat()}).status_code == 201
+    own_id = app_module.get_max_id(app_module.WaitingArea)
+
+    ids = load_live_ids()
+    assert other_id in ids and own_id in ids
+    # Every reading is in the buffer once, also the readings this process stored itself
+    assert len(ids) == len(set(ids))
+
+    # The version changes with a reading of another process, so the cached responses are refreshed
+    start_time, _ = app_module.get_live_window(app_module.WAITING_AREA_LIVE_WINDOW)
+    version = app_module.get_live_data_version(app_module.WaitingArea, app_module.DEFAULT_AREA, start_time)
+    store_row_of_other_process()
+    assert app_module.get_live_data_version(app_module.WaitingArea, app_module.DEFAULT_AREA, start_time) != version
@@ -0,0 +1,59 @@
+"""
+Sampled events are rate limited per event and second, and records are written as logfmt or JSON lines.
+"""
+import json
+import logging
+
+import pytest
+
+from logs import KeyValueFormatter, RateLimitFilter, log_event, setup_logging
+
+
+def make_record(event, created, sampled=True, **fields):
+    record = logging.LogRecord('moldash', logging.DEBUG, __file__, 1, event, None, None)
+    record.created, record.msecs = created, 0
+    record.fields, record.sampled = fields, sampled
+    return record
+
+
+def test_sampled_events_are_rate_limited_per_second():
+    rate_limit = RateLimitFilter(max_per_second=2)
+
+    # Three of the five records in the first second are dropped, other events and unsampled records are not limited
+    assert [rate_limit.filter(make_record('reading_received', 100.1)) for _ in range(5)] == [True] * 2 + [False] * 3
+    assert rate_limit.filter(make_record('date_range_request', 100.2))
+    assert rate_limit.filter(make_record('reading_received', 100.3, sampled=False))
+
+    # The first record of the next second reports how many records were dropped
+    record = make_record('reading_received', 101.0)
+    assert rate_limit.filter(record)
+    assert record.suppressed == 3
+    second = make_record('reading_received', 101.5)
+    assert rate_limit.filter(second) and second.suppressed == 0
+
+
+def test_records_are_formatted_as_logfmt_and_json():
+    record = make_record('invalid_reading', 100.0, route='/customs_area', error='bad value', reading={'a': 1})
+    record.suppressed = 4
+
+    line = KeyValueFormatter('logfmt').format(record)
+    assert 'level=DEBUG logger=moldash event=invalid_reading route=/customs_area' in line
+    assert 'error="bad value"' in line and 'reading="{\\"a\\": 1}"' in line and line.endswith('suppressed=4')
+
+    values = json.loads(KeyValueFormatter('json').format(record))
+    assert values['event'] == 'invalid_reading' and values['reading'] == {'a': 1} and values['suppressed'] == 4
+
+
+def test_disabled_events_are_not_formatted():
+    class Unformattable:
+        def __str__(self):
+            raise AssertionError("formatted a disabled record")
+
+    logger = logging.getLogger('moldash-test-disabled')
+    logger.setLevel(logging.ERROR)
+    log_event(logger, logging.DEBUG, 'reading_received', sampled=True, reading=Unformattable())
+
+
+def test_unknown_log_format():
+    with pytest.raises(ValueError):
+        setup_logging('moldash-test-format', log_format='xml')
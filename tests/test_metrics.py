@@ -0,0 +1,10 @@
+"""
+The response cache totals are exposed as counters, so rate() works on them.
+"""
+
+
+def test_response_cache_totals_are_counters(client):
+    metrics = client.get('/metrics').get_data(as_text=True)
+    for name in ('moldash_response_cache_hits', 'moldash_response_cache_misses'):
+        assert f'# TYPE {name} counter' in metrics
+        assert f'\n{name}_total ' in metrics
@@ -0,0 +1,57 @@
+"""
+Cached responses of past ranges must be refreshed in every process when another process changes the past data.
+"""
+import io
+import json
+from datetime import datetime, timedelta
+
+import app as app_module
+
+
+def test_past_ranges_follow_the_data_version(client):
+    computed = []
+
+    def compute():
+        computed.append(1)
+        return {'computed': len(computed)}
+
+    def get_response():
+        return app_module.get_cached_response(
+            'test', app_module.DEFAULT_AREA, datetime(2024, 1, 1), datetime(2024, 1, 2), (), compute)
+
+    assert get_response() == get_response() == {'computed': 1}
+
+    # Another process backfills a reading of that day, which raises the version in its transaction
+    app_module.bump_data_versions([app_module.DEFAULT_AREA])
+    app_module.db.session.commit()
+    assert get_response() == {'computed': 2}
+
+
+def test_new_data_version_replaces_the_live_entry(client):
+    today = app_module.get_today_start()
+    entries = len(app_module.response_cache.entries)
+
+    # Every ingest raises the data version of a live range, the newer response takes the place of the older one
+    for version in range(1, 4):
+        payload = app_module.get_cached_response(
+            'test', app_module.DEFAULT_AREA, today, today + timedelta(days=1), (), lambda: {'version': version},
+            (str(version),))
+        assert payload == {'version': version}
+    assert len(app_module.response_cache.entries) == entries + 1
+
+
+def test_backfilled_readings_raise_the_data_version(client):
+    version = app_module.get_past_data_version(app_module.DEFAULT_AREA)
+    reading = {'entrance_point': 1, 'before_passport_point': 0, 'after_passport_point': 0, 'exit_point': 0,
+               'timestamp': '2024-01-01T12:00:00'}
+    assert client.post('/customs_area', json=reading).status_code == 201
+    assert app_module.get_past_data_version(app_module.DEFAULT_AREA) != version
+
+
+def test_imported_readings_raise_the_data_version(client):
+    version = app_module.get_past_data_version(app_module.DEFAULT_AREA)
+    reading = {'entrance_point': 2, 'before_passport_point': 0, 'after_passport_point': 0, 'exit_point': 0,
+               'timestamp': '2024-01-02T12:00:00'}
+    result = app_module.import_readings(app_module.CustomsArea, io.StringIO(json.dumps(reading) + '\n'), 'ndjson')
+    assert result['imported'] == 1
+    assert app_module.get_past_data_version(app_module.DEFAULT_AREA) != version
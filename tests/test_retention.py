@@ -0,0 +1,43 @@
+"""
+Readings are only deleted when a retention period is configured, and then only the readings older than the period.
+"""
+from datetime import datetime, timedelta
+
+import app as app_module
+
+
+def count_rows(area_id):
+    return app_module.db.session.execute(
+        app_module.select(app_module.func.count()).select_from(app_module.CustomsArea).where(
+            app_module.CustomsArea.area_id == area_id)).scalar()
+
+
+def store_readings(area_id, timestamps):
+    rows = [{'area_id': area_id, 'entrance_point': 1, 'before_passport_point': 0, 'after_passport_point': 0,
+             'exit_point': 0, 'current_people_count': 1, 'timestamp': timestamp} for timestamp in timestamps]
+    app_module.store_rows(app_module.CustomsArea, rows)
+
+
+def test_nothing_is_pruned_by_default(client):
+    assert app_module.RETENTION_PERIODS == {}
+    assert app_module.prune_old_data() == {}
+
+
+def test_only_readings_older_than_the_retention_period_are_pruned(client, monkeypatch):
+    # An area of its own without a live window buffer, so the readings of the other tests are not counted
+    monkeypatch.setattr(app_module, 'append_live_readings', lambda model, ids, rows: None)
+
+    # The retention period ends before the shipped readings, so the other tests keep them
+    now = app_module.local_now()
+    retention = now - datetime(2024, 1, 1)
+    monkeypatch.setattr(app_module, 'RETENTION_PERIODS', {'customs_area': retention})
+    store_readings('retention_test', [now - retention - timedelta(days=10), now - retention - timedelta(days=1),
+                                      now - retention + timedelta(days=10)])
+
+    # A chunk size of one deletes the expired readings in several transactions
+    assert app_module.prune_table(app_module.CustomsArea, retention, chunk_size=1) == 2
+    assert count_rows('retention_test') == 1
+
+    store_readings('retention_test', [now - retention - timedelta(days=5)])
+    assert app_module.prune_old_data()['customs_area'] == 1
+    assert count_rows('retention_test') == 1
@@ -0,0 +1,50 @@
+"""
+The rollups give the same charts and totals as the raw readings they are calculated from.
+"""
+from datetime import datetime, timedelta
+
+import app as app_module
+
+START = datetime(2025, 4, 1)
+
+
+def store_readings(monkeypatch, area_id):
+    # The area is not configured, so it has no live window buffer
+    monkeypatch.setattr(app_module, 'append_live_readings', lambda model, ids, rows: None)
+
+    # Two days of readings every 20 minutes, and one reading exactly at the end of the second day
+    rows = [{'area_id': area_id, 'entrance_point': index % 7, 'before_passport_point': index % 3,
+             'after_passport_point': 0, 'exit_point': index, 'current_people_count': index % 7 + index % 3,
+             'timestamp': START + timedelta(minutes=20 * index)} for index in range(2 * 72 + 1)]
+    app_module.store_rows(app_module.CustomsArea, rows)
+    return rows
+
+
+def test_rollup_chart_matches_the_raw_readings(client, monkeypatch):
+    # An area of its own, so only the readings of this test are in its rollups
+    rows = store_readings(monkeypatch, 'rollup_chart_test')
+
+    # The first day in hour buckets, without the bucket that starts at the end of the range
+    end = START + timedelta(days=1)
+    chart = app_module.load_rollup_columns(app_module.CustomsArea, 'rollup_chart_test', 'hour', START, end,
+                                           ['current_people_count'])
+    assert chart['timestamp'] == [START + timedelta(hours=hour) for hour in range(24)]
+
+    for hour_start, average in zip(chart['timestamp'], chart['current_people_count']):
+        counts = [row['current_people_count'] for row in rows
+                  if hour_start <= row['timestamp'] < hour_start + timedelta(hours=1)]
+        assert average == round(sum(counts) / len(counts), 2)
+
+
+def test_rollup_totals_match_the_raw_readings(client, monkeypatch):
+    rows = store_readings(monkeypatch, 'rollup_totals_test')
+    end = START + timedelta(days=2)
+    raw_counts = [row['current_people_count'] for row in rows if row['timestamp'] < end]
+
+    # Whole days come from the day buckets, a range ending on a minute from the minute buckets, others from the readings
+    for range_end in (end, end - timedelta(minutes=1), end - timedelta(seconds=1)):
+        totals = app_module.load_area_totals(app_module.CustomsArea, 'rollup_totals_test', START, range_end)
+        counts = [count for row, count in zip(rows, raw_counts) if row['timestamp'] < range_end]
+        assert totals['count'] == len(counts)
+        assert totals['current_people_count_sum'] == sum(counts)
+        assert totals['current_people_count_max'] == max(counts)
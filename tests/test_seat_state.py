@@ -0,0 +1,69 @@
+"""
+Replays the shipped database (instance/passenger_tracking.db) through the seat state on a copy. The database contains
+readings of old "Pressuresensor" sensors that are not configured, they must not count as taken seats.
+"""
+from datetime import datetime
+
+import pytest
+
+import app as app_module
+
+
+def taken_seats():
+    return app_module.db.session.get(app_module.SeatCounter, app_module.DEFAULT_AREA).taken_seats
+
+
+def test_unconfigured_sensors_are_not_seeded(client):
+    # Only configured sensors are in the seat state, and none of them has a reading in the shipped database
+    sensors = {sensor_id for area_id, sensor_id in app_module.db.session.execute(
+        app_module.select(app_module.SeatState.area_id, app_module.SeatState.sensor_id))}
+    assert sensors <= set(app_module.SENSOR_AREAS)
+    assert taken_seats() == 0
+
+
+def test_unconfigured_sensor_is_stored_without_a_seat(client):
+    before = taken_seats()
+    unknown_before = app_module.ingest_unknown_sensors.values.get((app_module.DEFAULT_AREA,), 0)
+    response = client.post('/waiting_area', json={'Sensor': 'Pressuresensor5', 'Status': 'AAN'})
+    assert response.status_code == 201
+    assert taken_seats() == before
+    assert app_module.ingest_unknown_sensors.values[(app_module.DEFAULT_AREA,)] == unknown_before + 1
+
+
+def test_unconfigured_sensor_is_rejected_when_configured(client, monkeypatch):
+    monkeypatch.setitem(app_module.AREAS[app_module.DEFAULT_AREA], 'reject_unknown_sensors', True)
+    before = taken_seats()
+    response = client.post('/waiting_area', json={'Sensor': 'Pressuresensor5', 'Status': 'AAN'})
+    assert response.status_code == 400
+    assert taken_seats() == before
+
+
+def test_taken_seats_never_exceed_total_seats(client):
+    # Occupy every configured seat, then replay the statuses of the shipped readings on top
+    for sensor_id in app_module.AREAS[app_module.DEFAULT_AREA]['seat_sensors']:
+        assert client.post('/waiting_area', json={'Sensor': sensor_id, 'Status': 'AAN'}).status_code == 201
+    readings = app_module.db.session.execute(app_module.select(
+        app_module.WaitingArea.sensor_id, app_module.WaitingArea.status).where(
+        app_module.WaitingArea.timestamp < datetime(2025, 1, 1)).order_by(app_module.WaitingArea.id)).all()
+    for sensor_id, status in readings:
+        assert client.post('/waiting_area', json={'Sensor': sensor_id, 'Status': status}).status_code == 201
+
+    # The default area has more seat sensors than seats, the stored readings never have more taken seats than seats
+    total_seats = app_module.AREAS[app_module.DEFAULT_AREA]['total_seats']
+    assert taken_seats() == len(app_module.AREAS[app_module.DEFAULT_AREA]['seat_sensors'])
+    last_row = app_module.db.session.execute(app_module.select(app_module.WaitingArea).order_by(
+        app_module.WaitingArea.id.desc()).limit(1)).scalar_one()
+    assert last_row.taken_seats == total_seats
+    assert last_row.free_seats == 0
+
+    today = app_module.get_today_start().strftime('%Y-%m-%d')
+    statistics = client.get(f'/get_statistics?start_date={today}&end_date={today}').get_json()
+    assert statistics['avg_occupancy_waiting'] <= 100
+    assert statistics['peak_occupancy_waiting'] <= 100
+
+
+def test_area_without_seats_is_rejected(tmp_path):
+    areas_file = tmp_path / 'areas.json'
+    areas_file.write_text('{"gate_d4": {"total_seats": 0, "seat_sensors": ["d4_seat_1"]}}')
+    with pytest.raises(ValueError):
+        app_module.load_area_config(str(areas_file))
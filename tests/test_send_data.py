@@ -0,0 +1,29 @@
+"""
+The load generator reports the latency and status codes of every route, including the invalid readings it sends.
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+from conftest import PACKAGE_DIRECTORY, SHIPPED_DATABASE
+
+
+def test_local_load_run_reports_every_route(tmp_path):
+    # A database of its own, the load run stores readings of today
+    database = tmp_path / 'passenger_tracking.db'
+    shutil.copyfile(SHIPPED_DATABASE, database)
+    environment = dict(os.environ, MOLDASH_DATABASE_URI=f'sqlite:///{database}')
+
+    output = subprocess.run(
+        [sys.executable, 'send_data.py', '--local', '--duration', '0.5', '--concurrency', '2', '--batch-size', '3',
+         '--invalid-share', '0.2', '--json'],
+        cwd=PACKAGE_DIRECTORY, env=environment, capture_output=True, text=True, timeout=120, check=True).stdout
+    report = json.loads(output)
+
+    assert report['requests'] > 0
+    assert set(report['routes']) == {'/waiting_area/batch', '/customs_area/batch'}
+    for route in report['routes'].values():
+        assert set(route['status_codes']) <= {'201', '207', '400'}
+        assert route['p50_ms'] <= route['p95_ms'] <= route['p99_ms'] <= route['max_ms']
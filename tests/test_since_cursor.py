@@ -0,0 +1,52 @@
+"""
+The chart routes answer 304 while the data of a range is unchanged, and with a "since" cursor only send newer readings.
+"""
+from datetime import datetime
+
+import app as app_module
+
+QUERY = '/get_date_range?start_date=2024-03-10&end_date=2024-03-10'
+
+
+def store_customs_reading(timestamp):
+    # A day without shipped readings, so only the readings of this test are in the range
+    app_module.store_rows(app_module.CustomsArea, [
+        {'area_id': app_module.DEFAULT_AREA, 'entrance_point': 3, 'before_passport_point': 2,
+         'after_passport_point': 1, 'exit_point': 1, 'current_people_count': 5, 'timestamp': timestamp}])
+
+
+def test_etag_answers_304_until_a_reading_is_stored(client):
+    first = client.get(QUERY)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    assert client.get(QUERY, headers={'If-None-Match': etag}).status_code == 304
+
+    store_customs_reading(datetime(2024, 3, 10, 9))
+    second = client.get(QUERY, headers={'If-None-Match': etag})
+    assert second.status_code == 200
+    assert second.headers['ETag'] != etag
+    assert second.get_json()['customs_area']['labels'][-1] == '2024-03-10 09:00:00'
+
+
+def test_since_cursor_only_sends_newer_readings(client):
+    full = client.get(QUERY).get_json()
+    assert full['delta'] is False
+    cursor = full['cursor']
+
+    store_customs_reading(datetime(2024, 3, 10, 10))
+    delta = client.get(f'{QUERY}&since={cursor}').get_json()
+    assert delta['delta'] is True
+    assert delta['customs_area']['labels'] == ['2024-03-10 10:00:00']
+    assert delta['waiting_area']['labels'] == []
+    assert delta['cursor'] != cursor
+
+    # Nothing is newer than the cursor of the delta
+    empty = client.get(f"{QUERY}&since={delta['cursor']}").get_json()
+    assert empty['customs_area']['labels'] == []
+    assert empty['cursor'] == delta['cursor']
+
+
+def test_invalid_cursor(client):
+    assert client.get(f'{QUERY}&since=12').status_code == 400
+    assert client.get(f'{QUERY}&since=a,b').status_code == 400
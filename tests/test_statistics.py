@@ -0,0 +1,48 @@
+"""
+"/get_statistics" only uses the readings of the selected days and gives the same figures as the raw readings.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as app_module
+
+
+def load_readings(model, start_date, end_date):
+    start = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
+    return app_module.db.session.execute(app_module.select(model).where(
+        model.area_id == app_module.DEFAULT_AREA, model.timestamp >= start, model.timestamp < end)).scalars().all()
+
+
+@pytest.mark.parametrize('start_date, end_date', [
+    ('2024-02-04', '2024-02-04'), ('2024-02-05', '2024-02-05'), ('2024-02-03', '2024-02-05')])
+def test_statistics_match_the_readings_of_the_range(client, start_date, end_date):
+    response = client.get(f'/get_statistics?start_date={start_date}&end_date={end_date}')
+    assert response.status_code == 200
+    statistics = response.get_json()
+
+    waiting = load_readings(app_module.WaitingArea, start_date, end_date)
+    taken = sum(reading.taken_seats for reading in waiting)
+    total = sum(reading.total_seats for reading in waiting)
+    assert statistics['avg_occupancy_waiting'] == round(taken / total * 100, 1)
+    peak = max(reading.taken_seats for reading in waiting) / max(reading.total_seats for reading in waiting)
+    assert statistics['peak_occupancy_waiting'] == round(peak * 100, 1)
+
+    customs = load_readings(app_module.CustomsArea, start_date, end_date)
+    if not customs:
+        assert statistics['avg_occupancy_custom'] == statistics['peak_occupancy_custom'] == ""
+        return
+    counts = [reading.current_people_count for reading in customs]
+    assert statistics['avg_occupancy_custom'] == pytest.approx(sum(counts) / len(counts))
+    assert statistics['peak_occupancy_custom'] == max(counts)
+
+
+def test_statistics_of_a_day_without_readings(client):
+    statistics = client.get('/get_statistics?start_date=2024-02-02&end_date=2024-02-02').get_json()
+    assert statistics['avg_occupancy_waiting'] == statistics['avg_occupancy_custom'] == ""
+    assert statistics['current_wait_time_custom'] == ""
+
+
+def test_statistics_of_invalid_dates(client):
+    assert client.get('/get_statistics?start_date=05-02-2024&end_date=2024-02-05').status_code == 400
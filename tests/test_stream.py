@@ -0,0 +1,58 @@
+"""
+Stored readings reach the "/stream" clients of their area, and a client that does not keep up is dropped.
+"""
+import json
+
+import app as app_module
+
+
+def read_event(chunks):
+    # Skip the keep-alive comments until the next event
+    for chunk in chunks:
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if chunk.startswith('event:'):
+            name, data = chunk.strip().split('\n')
+            return name[len('event: '):], json.loads(data[len('data: '):])
+    return None
+
+
+def test_stored_reading_is_pushed_to_the_stream(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'STREAM_KEEPALIVE_SECONDS', 0.1)
+    response = client.get('/stream')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+
+    chunks = iter(response.response)
+    try:
+        assert next(chunks).decode().startswith('retry:')
+
+        reading = {'entrance_point': 4, 'before_passport_point': 3, 'after_passport_point': 2, 'exit_point': 1}
+        assert client.post('/customs_area', json=reading).status_code == 201
+
+        name, payload = read_event(chunks)
+        assert name == 'customs_area'
+        assert payload['area'] == app_module.DEFAULT_AREA
+        assert len(payload['ids']) == len(payload['labels']) == 1
+        # exit_point, current_people_count and entrance_point, like the datasets of the customs area chart
+        assert [dataset['data'] for dataset in payload['datasets']] == [[1], [9], [4]]
+    finally:
+        response.close()
+
+    assert not app_module.event_hub.has_clients()
+
+
+def test_slow_client_is_dropped():
+    hub = app_module.EventHub(buffer_size=2, max_clients=1)
+    slow = hub.subscribe('area')
+    assert hub.subscribe('area') is None
+
+    # Events of other areas are not sent to the client
+    hub.publish('customs_area', {'n': 0}, 'other_area')
+    assert slow.events == app_module.collections.deque()
+
+    for number in range(3):
+        hub.publish('customs_area', {'n': number}, 'area')
+
+    assert slow.closed and hub.evicted == 1
+    assert not hub.has_clients()
+    assert slow.pop(0) is None